@@ -0,0 +1,97 @@
+import logging
+from contextvars import ContextVar
+from functools import partial
+
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.db import transaction
+
+from apps.main import tasks
+from apps.main.models import ActivityEvent
+
+logger = logging.getLogger(__name__)
+
+# write the buffered events from the background pool instead of the request
+ACTIVITY_FLUSH_IN_BACKGROUND = getattr(settings, 'ACTIVITY_FLUSH_IN_BACKGROUND', False)
+
+# events of the current request, set up by ActivityLogMiddleware when it is
+# in MIDDLEWARE
+_buffer = ContextVar('activity_buffer', default=None)
+
+
+def _actor(request):
+    user = getattr(request, 'user', None)
+    if user is None or not user.is_authenticated:
+        return None
+    return user
+
+
+def log_activity(request, verb, obj, changes=None):
+    """
+    Record that the current user did ``verb`` to ``obj``.
+
+    The event only counts once the surrounding transaction commits, so
+    rolled back changes leave no trail. Inside a request it is buffered
+    and written with the request's other events in one insert; elsewhere
+    it is written on its own.
+    """
+    actor = _actor(request) if request is not None else None
+    event = ActivityEvent(
+        actor=actor,
+        actor_username=actor.get_username() if actor else '',
+        verb=verb,
+        content_type=ContentType.objects.get_for_model(obj),
+        object_id=str(obj.pk),
+        object_repr=str(obj)[:255],
+        changes=changes or {},
+    )
+    buffer = _buffer.get()
+    if buffer is None:
+        transaction.on_commit(partial(write_events, [event]))
+    else:
+        transaction.on_commit(partial(buffer.append, event))
+    return event
+
+
+def form_changes(form):
+    """
+    Old and new values of the fields a bound model form changed, for
+    ``log_activity(changes=...)``.
+    """
+    return {
+        field: [_json_value(form.initial.get(field)), _json_value(form.cleaned_data.get(field))]
+        for field in form.changed_data
+    }
+
+
+def _json_value(value):
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    return str(getattr(value, 'pk', value))
+
+
+def write_events(events):
+    if events:
+        ActivityEvent.objects.bulk_create(events)
+
+
+def start_buffer():
+    return _buffer.set([])
+
+
+def flush_buffer(token):
+    """
+    Write the events buffered since ``start_buffer`` with one bulk insert.
+    """
+    events = _buffer.get()
+    _buffer.reset(token)
+    if not events:
+        return
+    if ACTIVITY_FLUSH_IN_BACKGROUND:
+        tasks.submit(write_events, events)
+        return
+    try:
+        write_events(events)
+    except Exception:
+        # losing an audit entry must not fail a request that already succeeded
+        logger.exception('Could not write %d activity events', len(events))
@@ -8,7 +8,9 @@ from .models import (
     Vendor,
     Product,
     Document,
-    Comment
+    Comment,
+    ReportJob,
+    ActivityEvent
 )
 
 
@@ -144,3 +146,27 @@ class CommentAdmin(admin.ModelAdmin):
     list_display = ('commented_by', 'vendor', 'product', 'content', 'rating', 'timestamp')
     search_fields = ('commented_by__username', 'vendor__vendor_name', 'product__name', 'content')
     list_filter = ('rating', 'timestamp')
+
+
+@admin.register(ReportJob)
+class ReportJobAdmin(admin.ModelAdmin):
+    list_display = ('report', 'status', 'data_version', 'requested_by', 'created_at', 'finished_at')
+    list_filter = ('report', 'status', 'created_at')
+    readonly_fields = ('data_version', 'started_at', 'finished_at')
+
+
+@admin.register(ActivityEvent)
+class ActivityEventAdmin(admin.ModelAdmin):
+    list_display = ('created_at', 'actor_username', 'verb', 'content_type', 'object_repr')
+    list_filter = ('verb', 'content_type')
+    search_fields = ('actor_username', 'object_repr')
+
+    # the log is append-only
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
@@ -0,0 +1,331 @@
+import hashlib
+import json
+from collections import defaultdict
+from datetime import date, datetime
+from decimal import Decimal
+
+from django.db.models import Count, Max, Sum
+from django.urls import reverse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import quote_etag
+
+from apps.main.fragments import get_generations
+from apps.main.models import Comment, Document, Product, Vendor
+from apps.main.pagination import paginate_keyset
+
+API_VERSION = 'v1'
+
+RATING_FIELDS = ('rating_sum', 'rating_count')
+
+
+class ApiError(ValueError):
+    pass
+
+
+class Include:
+    """
+    A related resource that can be embedded with ``?include=``.
+
+    To-one relations are read in the same query through a join; to-many
+    relations are read with one extra query for the whole page, keyed on
+    ``fk`` of the related rows.
+    """
+
+    def __init__(self, resource, lookup=None, fk=None):
+        self.resource = resource
+        self.lookup = lookup
+        self.fk = fk
+
+    @property
+    def many(self):
+        return self.fk is not None
+
+
+class Resource:
+    """
+    How one model is exposed: the fields clients may ask for, the fields
+    returned by default, the timestamp used for detail validators,
+    and the relations that can be included.
+    """
+
+    def __init__(self, model, fields, default_fields=None, timestamp='updated_at',
+                 order_by='created_at', computed=None, includes=None, rated=False):
+        self.model = model
+        self.fields = fields
+        self.default_fields = default_fields or fields
+        self.timestamp = timestamp
+        self.order_by = order_by
+        self.computed = computed or {}
+        self.includes = includes or {}
+        self.rated = rated
+
+    def queryset(self):
+        return self.model._default_manager.order_by()
+
+    def parse_fields(self, value):
+        if not value:
+            return list(self.default_fields)
+        fields = [field.strip() for field in value.split(',') if field.strip()]
+        unknown = [field for field in fields if field not in self.fields and field not in self.computed]
+        if unknown:
+            raise ApiError(f"Unknown fields: {', '.join(unknown)}")
+        return fields
+
+    def parse_includes(self, value):
+        names = [name.strip() for name in (value or '').split(',') if name.strip()]
+        unknown = [name for name in names if name not in self.includes]
+        if unknown:
+            raise ApiError(f"Unknown includes: {', '.join(unknown)}")
+        return names
+
+    def columns(self, fields):
+        # the primary key and ordering field are always read, for cursors and includes
+        columns = {'pk', self.order_by}
+        columns.update(field for field in fields if field in self.fields)
+        return columns
+
+
+RESOURCES = {
+    'vendors': Resource(
+        Vendor,
+        fields=(
+            'vendor_name', 'description', 'company_website_url', 'company_established_on',
+            'no_of_employees', 'country', 'city', 'address', 'phone_number',
+            'rating_sum', 'rating_count', 'created_at', 'updated_at',
+        ),
+        includes={'products': Include('products', fk='vendor_id')},
+        rated=True,
+    ),
+    'products': Resource(
+        Product,
+        fields=(
+            'vendor_id', 'name', 'software_type', 'module', 'client_type', 'business_area',
+            'last_demo_date', 'last_review_date', 'next_review_date', 'document_attached',
+            'cloud_status', 'internal_professional_services', 'additional_information',
+            'description', 'rating_sum', 'rating_count', 'created_at', 'updated_at',
+        ),
+        includes={
+            'vendor': Include('vendors', lookup='vendor'),
+            'documents': Include('documents', fk='product_id'),
+        },
+        rated=True,
+    ),
+    'documents': Resource(
+        Document,
+        fields=('product_id', 'document', 'description', 'created_at', 'updated_at'),
+        default_fields=('product_id', 'document', 'description', 'download_url', 'created_at', 'updated_at'),
+        computed={'download_url': lambda row: reverse('download_document', args=[row['pk']])},
+        includes={'product': Include('products', lookup='product')},
+    ),
+    'comments': Resource(
+        Comment,
+        fields=('commented_by_id', 'vendor_id', 'product_id', 'content', 'rating', 'timestamp'),
+        timestamp='timestamp',
+        order_by='timestamp',
+        includes={
+            'vendor': Include('vendors', lookup='vendor'),
+            'product': Include('products', lookup='product'),
+        },
+    ),
+}
+
+
+def _json_value(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    return value
+
+
+def _serialize(resource, row, fields, prefix=''):
+    data = {'id': row[f'{prefix}pk']}
+    for field in fields:
+        if field in resource.computed:
+            data[field] = resource.computed[field]({'pk': row[f'{prefix}pk']})
+        else:
+            data[field] = _json_value(row[f'{prefix}{field}'])
+    return data
+
+
+def _validator_aggregates(resource, queryset, includes):
+    """
+    One aggregate query over the row of a detail response and its to-one
+    includes, plus one per to-many include. Row counts catch deletes,
+    the newest timestamp catches edits and the rating totals, of the rows and
+    of rated includes, catch reviews, which do not touch ``updated_at``.
+    """
+    aggregates = {'count': Count('pk'), 'latest': Max(resource.timestamp)}
+    if resource.rated:
+        aggregates.update({field: Sum(field) for field in RATING_FIELDS})
+    for name in includes:
+        include = resource.includes[name]
+        if not include.many:
+            target = RESOURCES[include.resource]
+            aggregates[f'{name}_latest'] = Max(f'{include.lookup}__{target.timestamp}')
+            if target.rated:
+                aggregates.update({f'{name}_{field}': Sum(f'{include.lookup}__{field}') for field in RATING_FIELDS})
+    values = queryset.aggregate(**aggregates)
+
+    for name in includes:
+        include = resource.includes[name]
+        if include.many:
+            target = RESOURCES[include.resource]
+            related = target.queryset().filter(**{f'{include.fk}__in': queryset.values('pk')})
+            related_aggregates = {'count': Count('pk'), 'latest': Max(target.timestamp)}
+            if target.rated:
+                related_aggregates.update({field: Sum(field) for field in RATING_FIELDS})
+            related_values = related.aggregate(**related_aggregates)
+            values.update({f'{name}_{key}': value for key, value in related_values.items()})
+    return values
+
+
+def detail_etag(resource_name, queryset, request, includes):
+    """
+    Return the ETag of a detail response, or None when the object does not
+    exist. Only an ETag is sent: a delete changes the row counts but not the
+    newest timestamp, so a Last-Modified time could answer stale 304s.
+    """
+    resource = RESOURCES[resource_name]
+    values = _validator_aggregates(resource, queryset, includes)
+    if not values['count']:
+        return None
+    return _etag([API_VERSION, resource_name, sorted(request.GET.lists()), values])
+
+
+def _generation_labels(resource, includes):
+    """
+    The models whose writes can change a list of ``resource``: its own, its
+    includes', and comments when any of them has rating totals, which
+    reviews change without saving the rated row.
+    """
+    resources = [resource, *(RESOURCES[resource.includes[name].resource] for name in includes)]
+    labels = {item.model._meta.label_lower for item in resources}
+    if any(item.rated for item in resources):
+        labels.add(Comment._meta.label_lower)
+    return sorted(labels)
+
+
+def list_etag(resource_name, request, includes):
+    """
+    Return the ETag of a list response, built from the generation counters
+    that every save and delete of the listed models bumps (see
+    apps.main.fragments). It is read from the cache alone, so revalidating
+    a list costs the same however large the table grows.
+    """
+    labels = _generation_labels(RESOURCES[resource_name], includes)
+    return _etag([API_VERSION, resource_name, sorted(request.GET.lists()), labels, get_generations(labels)])
+
+
+def _etag(parts):
+    key = json.dumps(parts, default=_json_value, sort_keys=True)
+    return quote_etag(hashlib.md5(key.encode()).hexdigest())
+
+
+def _include_rows(resource, rows, includes):
+    """
+    Fetch the to-many includes for a page of rows with one query each.
+    """
+    included = {}
+    ids = [row['pk'] for row in rows]
+    for name in includes:
+        include = resource.includes[name]
+        if not include.many or not ids:
+            continue
+        target = RESOURCES[include.resource]
+        columns = {'pk', include.fk, *target.columns(target.default_fields)}
+        grouped = defaultdict(list)
+        related = (
+            target.queryset()
+            .filter(**{f'{include.fk}__in': ids})
+            .order_by(f'-{target.order_by}', '-pk')
+            .values(*columns)
+        )
+        for related_row in related:
+            grouped[related_row[include.fk]].append(_serialize(target, related_row, target.default_fields))
+        included[name] = grouped
+    return included
+
+
+def _rows(resource, queryset, fields, includes):
+    columns = resource.columns(fields)
+    for name in includes:
+        include = resource.includes[name]
+        if not include.many:
+            target = RESOURCES[include.resource]
+            columns.add(f'{include.lookup}__pk')
+            columns.update(f'{include.lookup}__{column}' for column in target.columns(target.default_fields))
+    return queryset.values(*columns)
+
+
+def _serialize_rows(resource, rows, fields, includes):
+    included = _include_rows(resource, rows, includes)
+    results = []
+    for row in rows:
+        data = _serialize(resource, row, fields)
+        for name in includes:
+            include = resource.includes[name]
+            if include.many:
+                data[name] = included[name].get(row['pk'], [])
+            elif row[f'{include.lookup}__pk'] is None:
+                data[name] = None
+            else:
+                target = RESOURCES[include.resource]
+                data[name] = _serialize(target, row, target.default_fields, prefix=f'{include.lookup}__')
+        results.append(data)
+    return results
+
+
+def _conditional(request, etag, build):
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = build()
+    response['ETag'] = etag
+    # clients must revalidate, which is cheap when nothing changed
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+def list_response(request, resource_name, response_class):
+    """
+    Answer a list request with one page of ``resource_name``. A request
+    whose ETag still matches is answered with a 304 from the cache alone,
+    without querying the database.
+    """
+    resource = RESOURCES[resource_name]
+    fields = resource.parse_fields(request.GET.get('fields'))
+    includes = resource.parse_includes(request.GET.get('include'))
+    queryset = resource.queryset()
+
+    def build():
+        page = paginate_keyset(_rows(resource, queryset, fields, includes), request, field=resource.order_by)
+        data = {
+            'results': _serialize_rows(resource, page.object_list, fields, includes),
+            'next': page.next_cursor,
+            'previous': page.previous_cursor,
+        }
+        if page.count is not None:
+            data['count'] = page.count
+        return response_class(data)
+
+    return _conditional(request, list_etag(resource_name, request, includes), build)
+
+
+def detail_response(request, resource_name, pk, response_class):
+    """
+    Answer a request for one object, or return None when it does not exist.
+    """
+    resource = RESOURCES[resource_name]
+    fields = resource.parse_fields(request.GET.get('fields'))
+    includes = resource.parse_includes(request.GET.get('include'))
+    queryset = resource.queryset().filter(pk=pk)
+
+    etag = detail_etag(resource_name, queryset, request, includes)
+    if etag is None:
+        return None
+
+    def build():
+        rows = list(_rows(resource, queryset, fields, includes))
+        return response_class(_serialize_rows(resource, rows, fields, includes)[0])
+
+    return _conditional(request, etag, build)
@@ -0,0 +1,121 @@
+import asyncio
+from typing import Any
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.decorators import login_required
+from django.db import close_old_connections, connections
+from django.shortcuts import get_object_or_404, render
+
+from .conditional import conditional_page, product_page_version, vendor_page_version
+from .dashboard import get_dashboard_counters, get_latest_applications
+from .forms import CommentForm
+from .models import Comment, Product, Vendor
+
+
+def _run_query(func, *args, **kwargs):
+    # a worker thread has its own connection, which is closed or reused
+    # according to CONN_MAX_AGE like a request thread's
+    close_old_connections()
+    try:
+        return func(*args, **kwargs)
+    finally:
+        close_old_connections()
+
+
+def concurrent_queries():
+    """
+    Whether query() runs queries on worker threads. Each worker thread opens
+    its own database connection, which only stays open between requests with
+    persistent connections; with CONN_MAX_AGE = 0 every query would connect
+    and disconnect, costing more than running them concurrently saves, so the
+    request's connection is used instead.
+    """
+    if not getattr(settings, 'ASYNC_VIEW_CONCURRENT_QUERIES', True):
+        return False
+    return all(connections[alias].settings_dict['CONN_MAX_AGE'] != 0 for alias in connections)
+
+
+def query(func, *args, **kwargs):
+    """
+    Run ``func(*args, **kwargs)`` in a worker thread with its own database connection,
+    so several independent queries of one request can be awaited together.
+
+    Each query runs in its own autocommit transaction, outside any
+    transaction of the request. This needs persistent connections
+    (CONN_MAX_AGE above 0 or None). Without them, or with
+    ASYNC_VIEW_CONCURRENT_QUERIES set to False, the queries run one after
+    another on the request's connection instead, which tests inside a
+    transaction need.
+    """
+    if concurrent_queries():
+        return sync_to_async(_run_query, thread_sensitive=False)(func, *args, **kwargs)
+    return sync_to_async(func)(*args, **kwargs)
+
+
+@login_required
+async def home(request):
+    # login_required loaded the user through request.auser(); share it with
+    # the templates, which would load it again through request.user
+    request.user = await request.auser()
+    counters, latest_applications = await asyncio.gather(
+        query(get_dashboard_counters),
+        query(get_latest_applications),
+    )
+
+    context: dict[str, Any] = {
+        'users': counters['users'],
+        'companies': counters['companies'],
+        'applications': counters['applications'],
+        'latest_applications': latest_applications
+    }
+    return await sync_to_async(render)(request, 'home.html', context)
+
+
+@conditional_page(vendor_page_version)
+async def vendor_detail(request, vendor_id):
+    # the vendor, its products and its reviews only depend on the id
+    vendor, applications, comments = await asyncio.gather(
+        query(get_object_or_404, Vendor, id=vendor_id),
+        query(list, Product.objects.filter(vendor_id=vendor_id)),
+        query(list, Comment.objects.filter(vendor_id=vendor_id).select_related(
+            'commented_by__profile', 'vendor'
+        ).order_by('-timestamp')),
+    )
+
+    for application in applications:
+        # as the vendor.products manager would, so the page does not load it per row
+        application.vendor = vendor
+
+    avg_rating = vendor.average_rating
+    context = {
+        'vendor': vendor,
+        'reviews': comments,
+        'count': vendor.rating_count,
+        'average_rating': round(avg_rating) if avg_rating else None,
+        'applications': applications,
+        'review_form': CommentForm(),
+    }
+    # rendering stays on the request thread, where lazy lookups in the
+    # templates may still touch the database
+    return await sync_to_async(render)(request, 'vendors/vendor_detail.html', context)
+
+
+@conditional_page(product_page_version)
+async def product_detail(request, product_id):
+    software, comments = await asyncio.gather(
+        query(get_object_or_404, Product.objects.select_related('vendor'), pk=product_id),
+        query(list, Comment.objects.filter(product_id=product_id).select_related(
+            'commented_by__profile', 'product'
+        ).order_by('-timestamp')),
+    )
+
+    avg_rating = software.average_rating
+    context = {
+        'software': software,
+        'reviews': comments,
+        'count': software.rating_count,
+        'average_rating': round(avg_rating) if avg_rating else None,
+        'review_form': CommentForm(),
+    }
+    return await sync_to_async(render)(request, 'vendor_products/software_detail.html', context)
@@ -0,0 +1,36 @@
+from django.contrib.auth.backends import ModelBackend
+
+from apps.main.permission_cache import get_permission_catalog, get_user_permission_codenames
+
+
+class CachedPermissionBackend(ModelBackend):
+    """
+    ModelBackend whose permission lookups are served from the shared
+    permission cache instead of querying on every request. Enable it with::
+
+        AUTHENTICATION_BACKENDS = ['apps.main.backends.CachedPermissionBackend']
+    """
+
+    def _cached_permissions(self, user_obj, obj):
+        if not user_obj.is_active or user_obj.is_anonymous or obj is not None:
+            return None
+        if user_obj.is_superuser:
+            everything = frozenset(get_permission_catalog().values())
+            return everything, everything
+        return get_user_permission_codenames(user_obj.pk)
+
+    def get_user_permissions(self, user_obj, obj=None):
+        permissions = self._cached_permissions(user_obj, obj)
+        return set(permissions[0]) if permissions else set()
+
+    def get_group_permissions(self, user_obj, obj=None):
+        permissions = self._cached_permissions(user_obj, obj)
+        return set(permissions[1]) if permissions else set()
+
+    def get_all_permissions(self, user_obj, obj=None):
+        permissions = self._cached_permissions(user_obj, obj)
+        if not permissions:
+            return set()
+        if not hasattr(user_obj, '_perm_cache'):
+            user_obj._perm_cache = permissions[0] | permissions[1]
+        return user_obj._perm_cache
@@ -0,0 +1,364 @@
+import asyncio
+import json
+import math
+import os
+import resource
+import sys
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import django
+from django.db import connections, transaction
+from django.urls import reverse
+
+from apps.main import urls
+from apps.main.models import Comment, Document, Permissions, Product, ReportJob, UploadSession, User, Vendor
+
+
+def percentile(values, fraction):
+    """
+    Nearest-rank percentile of an already sorted list.
+    """
+    if not values:
+        return None
+    rank = max(math.ceil(fraction * len(values)), 1)
+    return values[rank - 1]
+
+
+def peak_rss_kb():
+    usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and kilobytes elsewhere
+    return usage // 1024 if sys.platform == 'darwin' else usage
+
+
+def _first_pk(queryset):
+    return queryset.order_by('pk').values_list('pk', flat=True).first() or 0
+
+
+def benchmark_requests(user, **targets):
+    """
+    One representative request per URL name in apps.main.urls, as
+    name -> (method, path, kwargs) for the test client, made as ``user``.
+
+    The rows requested default to the first of each table in the current
+    database; ``targets`` overrides them by name (vendor_id, product_id,
+    user_id, permission_id, report_id, upload_id, document_id,
+    delete_vendor_id, delete_product_id, grant_user_ids, query).
+    """
+    def target(name, default):
+        return targets[name] if name in targets else default()
+
+    vendor_id = target('vendor_id', lambda: _first_pk(Vendor.objects.all()))
+    product_id = target('product_id', lambda: _first_pk(Product.objects.all()))
+    user_id = target('user_id', lambda: _first_pk(User.objects.exclude(pk=user.pk)))
+    permission_id = target('permission_id', lambda: _first_pk(Permissions.objects.all()))
+    report_id = target('report_id', lambda: _first_pk(ReportJob.objects.all()))
+    document_id = target('document_id', lambda: _first_pk(Document.objects.all()))
+    upload_id = target(
+        'upload_id', lambda: UploadSession.objects.filter(user=user).values_list('pk', flat=True).first()
+    ) or '00000000-0000-0000-0000-000000000000'
+    delete_vendor_id = targets.get('delete_vendor_id', vendor_id)
+    delete_product_id = targets.get('delete_product_id', product_id)
+    grant_user_ids = targets.get('grant_user_ids', [user_id])
+    json_body = {'content_type': 'application/json'}
+
+    return {
+        'home': ('get', reverse('home'), {}),
+        'home_async': ('get', reverse('home_async'), {}),
+        'signup': ('get', reverse('signup'), {}),
+        'login': ('get', reverse('login'), {}),
+        'logout': ('get', reverse('logout'), {}),
+        'password_change': ('get', reverse('password_change'), {}),
+        'password_change_done': ('get', reverse('password_change_done'), {}),
+        'users': ('get', reverse('users'), {}),
+        'user_detail': ('get', reverse('user_detail', args=[user_id]), {}),
+        'profile': ('get', reverse('profile'), {}),
+        'vendors': ('get', reverse('vendors'), {}),
+        'create_vendor': ('get', reverse('create_vendor'), {}),
+        'vendor_detail': ('get', reverse('vendor_detail', args=[vendor_id]), {}),
+        'vendor_detail_async': ('get', reverse('vendor_detail_async', args=[vendor_id]), {}),
+        'edit_vendor': ('get', reverse('edit_vendor', args=[vendor_id]), {}),
+        'delete_vendor': ('post', reverse('delete_vendor', args=[delete_vendor_id]), {}),
+        'create_product': ('get', reverse('create_product'), {}),
+        'update_product': ('get', reverse('update_product', args=[product_id]), {}),
+        'product_detail': ('get', reverse('product_detail', args=[product_id]), {}),
+        'product_detail_async': ('get', reverse('product_detail_async', args=[product_id]), {}),
+        'delete_product': ('post', reverse('delete_product', args=[delete_product_id]), {}),
+        'applications': ('get', reverse('applications'), {}),
+        'add_vendor_comment': (
+            'post', reverse('add_vendor_comment', args=[vendor_id]),
+            {'data': {'rating': 4, 'content': 'Benchmark review'}}
+        ),
+        'add_product_comment': (
+            'post', reverse('add_product_comment', args=[product_id]),
+            {'data': {'rating': 4, 'content': 'Benchmark review'}}
+        ),
+        'update_profile': (
+            'post', reverse('update_profile'),
+            {'data': {'username': user.username, 'name': user.get_full_name() or user.username, 'email': user.email}}
+        ),
+        'generate_softwares_pdf': ('get', reverse('generate_softwares_pdf'), {}),
+        'report_status': ('get', reverse('report_status', args=[report_id]), {}),
+        'export_data_to_csv': ('get', reverse('export_data_to_csv'), {}),
+        'create_permission': ('get', reverse('create_permission'), {}),
+        'permissions': ('get', reverse('permissions'), {}),
+        'update_permission': ('get', reverse('update_permission', args=[permission_id]), {}),
+        'delete_permission': ('post', reverse('delete_permission', args=[permission_id]), {}),
+        'assign_permission': (
+            'post', reverse('assign_permission'),
+            {'data': {'user_id': user_id, 'permission_id': permission_id, 'checked': 'true'}}
+        ),
+        'assign_permissions_batch': (
+            'post', reverse('assign_permissions_batch'),
+            {
+                'data': json.dumps({'operations': [
+                    {'user_id': grant_user_id, 'permission_id': permission_id, 'action': 'grant'}
+                    for grant_user_id in grant_user_ids
+                ]}),
+                **json_body
+            }
+        ),
+        'search': ('get', reverse('search'), {'data': {'q': targets.get('query', 'cloud')}}),
+        'activity_feed': ('get', reverse('activity_feed'), {}),
+        'import_data': ('get', reverse('import_data'), {}),
+        'create_upload': (
+            'post', reverse('create_upload'),
+            {'data': json.dumps({'filename': 'benchmark.pdf', 'size': 1024}), **json_body}
+        ),
+        'upload_detail': ('get', reverse('upload_detail', args=[upload_id]), {}),
+        'complete_upload': (
+            'post', reverse('complete_upload', args=[upload_id]),
+            {'data': json.dumps({'product_ids': [product_id]}), **json_body}
+        ),
+        'download_document': ('get', reverse('download_document', args=[document_id]), {}),
+        'api_list': ('get', reverse('api_list', args=['products']), {'data': {'include': 'vendor,documents'}}),
+        'api_detail': ('get', reverse('api_detail', args=['vendors', vendor_id]), {'data': {'include': 'products'}}),
+    }
+
+
+def _worker_init():
+    # a no-op under fork; sets Django up under spawn
+    django.setup()
+
+
+def _run_requests(username, name, requests, warmup):
+    """
+    Issue ``requests`` copies of one benchmark request from a worker
+    process and return the latency of each, the status codes, the wall
+    time of the measured requests (after warm-up) and the worker's peak
+    RSS. Every request runs in a transaction that is rolled
+    back, so endpoints that write leave the data as it was.
+    """
+    from django.test import Client
+
+    user = User.objects.get(username=username)
+    method, path, kwargs = benchmark_requests(user)[name]
+    client = Client()
+    client.force_login(user)
+
+    latencies = []
+    statuses = Counter()
+    measured_from = None
+    for index in range(warmup + requests):
+        if index == warmup:
+            measured_from = time.perf_counter()
+        started = time.perf_counter()
+        with transaction.atomic():
+            response = getattr(client, method)(path, **kwargs)
+            if response.streaming:
+                for _ in response.streaming_content:
+                    pass
+            transaction.set_rollback(True)
+        elapsed = time.perf_counter() - started
+        if name == 'logout':
+            client.force_login(user)
+        if index >= warmup:
+            latencies.append(elapsed)
+            statuses[response.status_code] += 1
+    measured = time.perf_counter() - measured_from if measured_from is not None else 0
+
+    connections.close_all()
+    return latencies, dict(statuses), measured, peak_rss_kb()
+
+
+def benchmark_endpoint(username, name, requests, workers, warmup=2):
+    """
+    Drive one endpoint with ``workers`` processes sharing ``requests``
+    requests and summarise latency percentiles, throughput and peak RSS.
+    """
+    shares = [requests // workers + (1 if index < requests % workers else 0) for index in range(workers)]
+    shares = [share for share in shares if share]
+
+    # forked workers must not inherit the parent's database connections
+    connections.close_all()
+    with ProcessPoolExecutor(max_workers=len(shares), initializer=_worker_init) as executor:
+        results = list(executor.map(
+            _run_requests,
+            [username] * len(shares),
+            [name] * len(shares),
+            shares,
+            [warmup] * len(shares),
+        ))
+
+    latencies = sorted(latency for worker_latencies, _, _, _ in results for latency in worker_latencies)
+    statuses = Counter()
+    for _, worker_statuses, _, _ in results:
+        statuses.update(worker_statuses)
+    # the workers run side by side, so the slowest one bounds the measured span
+    wall = max(measured for _, _, measured, _ in results)
+
+    def milliseconds(value):
+        return round(value * 1000, 3) if value is not None else None
+
+    return {
+        'requests': len(latencies),
+        'workers': len(shares),
+        'status_codes': {str(code): count for code, count in sorted(statuses.items())},
+        'errors': sum(count for code, count in statuses.items() if code >= 500),
+        'mean_ms': milliseconds(sum(latencies) / len(latencies)) if latencies else None,
+        'p50_ms': milliseconds(percentile(latencies, 0.50)),
+        'p95_ms': milliseconds(percentile(latencies, 0.95)),
+        'p99_ms': milliseconds(percentile(latencies, 0.99)),
+        'max_ms': milliseconds(latencies[-1]) if latencies else None,
+        'throughput_rps': round(len(latencies) / wall, 2) if wall else None,
+        'peak_rss_kb': max(rss for _, _, _, rss in results),
+    }
+
+
+# views that have an async version in apps.main.async_views, served under
+# the URL name with an ``_async`` suffix
+ASYNC_VIEWS = ('home', 'vendor_detail', 'product_detail')
+
+
+def async_benchmark_paths(vendor_id=None, product_id=None):
+    """
+    name -> (sync path, async path) for the views in ASYNC_VIEWS.
+    """
+    vendor_id = vendor_id or _first_pk(Vendor.objects.all())
+    product_id = product_id or _first_pk(Product.objects.all())
+    args = {'home': [], 'vendor_detail': [vendor_id], 'product_detail': [product_id]}
+    return {
+        name: (reverse(name, args=args[name]), reverse(f'{name}_async', args=args[name]))
+        for name in ASYNC_VIEWS
+    }
+
+
+def _split(requests, concurrency):
+    return [requests // concurrency + (1 if index < requests % concurrency else 0) for index in range(concurrency)]
+
+
+def latency_summary(latencies, wall, statuses):
+    latencies = sorted(latencies)
+
+    def milliseconds(value):
+        return round(value * 1000, 3) if value is not None else None
+
+    return {
+        'requests': len(latencies),
+        'status_codes': {str(code): count for code, count in sorted(statuses.items())},
+        'mean_ms': milliseconds(sum(latencies) / len(latencies)) if latencies else None,
+        'p50_ms': milliseconds(percentile(latencies, 0.50)),
+        'p95_ms': milliseconds(percentile(latencies, 0.95)),
+        'p99_ms': milliseconds(percentile(latencies, 0.99)),
+        'throughput_rps': round(len(latencies) / wall, 2) if wall else None,
+    }
+
+
+def benchmark_sync_concurrent(user, path, requests, concurrency, warmup=2):
+    """
+    Drive a sync view from ``concurrency`` threads, the way a threaded WSGI
+    server would, and summarise the latencies.
+    """
+    from django.test import Client
+
+    def worker(share):
+        client = Client()
+        client.force_login(user)
+        latencies, statuses = [], Counter()
+        try:
+            for index in range(warmup + share):
+                started = time.perf_counter()
+                response = client.get(path)
+                if index >= warmup:
+                    latencies.append(time.perf_counter() - started)
+                    statuses[response.status_code] += 1
+        finally:
+            connections.close_all()
+        return latencies, statuses
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(worker, _split(requests, concurrency)))
+    wall = time.perf_counter() - started
+    return _combine(results, wall)
+
+
+def benchmark_async_concurrent(user, path, requests, concurrency, warmup=2):
+    """
+    Drive an async view with ``concurrency`` concurrent clients on one event
+    loop, the way an ASGI server would, and summarise the latencies.
+    """
+    from django.test import AsyncClient
+
+    async def worker(share):
+        client = AsyncClient()
+        await client.aforce_login(user)
+        latencies, statuses = [], Counter()
+        for index in range(warmup + share):
+            started = time.perf_counter()
+            response = await client.get(path)
+            if index >= warmup:
+                latencies.append(time.perf_counter() - started)
+                statuses[response.status_code] += 1
+        return latencies, statuses
+
+    async def run():
+        return await asyncio.gather(*(worker(share) for share in _split(requests, concurrency)))
+
+    started = time.perf_counter()
+    results = asyncio.run(run())
+    wall = time.perf_counter() - started
+    return _combine(results, wall)
+
+
+def _combine(results, wall):
+    latencies = [latency for worker_latencies, _ in results for latency in worker_latencies]
+    statuses = Counter()
+    for _, worker_statuses in results:
+        statuses.update(worker_statuses)
+    return latency_summary(latencies, wall, statuses)
+
+
+def url_names():
+    return [pattern.name for pattern in urls.urlpatterns]
+
+
+def compare_results(previous, current):
+    """
+    Return (name, metric, before, after, change %) for the latency and
+    throughput figures of endpoints present in both runs.
+    """
+    rows = []
+    for name, result in current['endpoints'].items():
+        before = previous.get('endpoints', {}).get(name)
+        if not before:
+            continue
+        for metric in ('p50_ms', 'p95_ms', 'p99_ms', 'throughput_rps', 'peak_rss_kb'):
+            old, new = before.get(metric), result.get(metric)
+            if old and new is not None:
+                rows.append((name, metric, old, new, round((new - old) / old * 100, 1)))
+    return rows
+
+
+def environment():
+    return {
+        'python': sys.version.split()[0],
+        'django': django.get_version(),
+        'database': connections['default'].vendor,
+        'cpu_count': os.cpu_count(),
+        'rows': {
+            model._meta.db_table: model.objects.count()
+            for model in (User, Vendor, Product, Document, Comment)
+        },
+    }
@@ -0,0 +1,108 @@
+import hashlib
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.contrib import messages
+from django.db.models import Count, OuterRef, Subquery
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.views.decorators.http import condition
+
+from apps.main.models import Comment, Document, Product, Vendor
+
+
+def _newest(queryset, field):
+    return Subquery(queryset.order_by(f'-{field}').values(field)[:1])
+
+
+def _count(queryset, field):
+    return Subquery(queryset.order_by().values(field).annotate(count=Count('pk')).values('count'))
+
+
+def vendor_page_version(vendor_id):
+    """
+    Everything the vendor page shows that can change, read with one query:
+    the vendor row, its newest review, and its products.
+    """
+    products = Product.objects.filter(vendor=OuterRef('pk'))
+    return Vendor.objects.filter(pk=vendor_id).values(
+        'updated_at',
+        'rating_count',
+        latest_review=_newest(Comment.objects.filter(vendor=OuterRef('pk')), 'timestamp'),
+        latest_product=_newest(products, 'updated_at'),
+        product_count=_count(products, 'vendor'),
+    ).first()
+
+
+def product_page_version(product_id):
+    """
+    Everything the product page shows that can change, read with one query:
+    the product and vendor rows, its newest review, and its documents.
+    """
+    documents = Document.objects.filter(product=OuterRef('pk'))
+    return Product.objects.filter(pk=product_id).values(
+        'updated_at',
+        'rating_count',
+        'vendor__updated_at',
+        latest_review=_newest(Comment.objects.filter(product=OuterRef('pk')), 'timestamp'),
+        latest_document=_newest(documents, 'updated_at'),
+        document_count=_count(documents, 'product'),
+    ).first()
+
+
+def _page_etag(request, version_func, args, kwargs):
+    """
+    Return the ETag of a page, computed once per request. There is none
+    when the object does not exist, so the view answers with its usual 404,
+    or when the user has messages waiting, which a 304 would swallow.
+
+    No Last-Modified time is sent: deleting a review, product or document
+    changes the counts in the version but not its newest timestamp, so
+    If-Modified-Since would be answered with a stale 304.
+    """
+    if not hasattr(request, '_page_etag'):
+        version = None
+        if not len(messages.get_messages(request)):
+            version = version_func(*args, **kwargs)
+        if version is None:
+            request._page_etag = None
+        else:
+            # the page greets the user, so each user gets their own version
+            key = repr((request.user.pk, sorted(version.items())))
+            request._page_etag = hashlib.md5(key.encode()).hexdigest()
+    return request._page_etag
+
+
+def conditional_page(version_func):
+    """
+    Answer If-None-Match for a detail page with a 304
+    from ``version_func`` alone, before the view loads anything, and mark
+    the page as private to the user. ``version_func`` is called with the
+    view's URL arguments and returns a dict of the values the page depends
+    on, or None.
+    """
+    def etag(request, *args, **kwargs):
+        return _page_etag(request, version_func, args, kwargs)
+
+    def private(response):
+        # stored by the browser only, and revalidated on every visit
+        patch_cache_control(response, private=True, no_cache=True)
+        patch_vary_headers(response, ['Cookie'])
+        return response
+
+    def decorator(view):
+        conditional_view = condition(etag_func=etag)(view)
+
+        if iscoroutinefunction(view):
+            @wraps(view)
+            async def async_wrapper(request, *args, **kwargs):
+                # condition() calls the etag function synchronously, so the
+                # ETag is computed in a thread first and read back from the request
+                await sync_to_async(_page_etag)(request, version_func, args, kwargs)
+                return private(await conditional_view(request, *args, **kwargs))
+            return async_wrapper
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            return private(conditional_view(request, *args, **kwargs))
+        return wrapper
+    return decorator
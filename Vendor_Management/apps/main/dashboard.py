@@ -0,0 +1,104 @@
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+from apps.main.models import User, Vendor, Product
+from apps.main.routers import use_primary
+
+# Counters are kept exact by the signal receivers; the timeout only bounds
+# how long drift from writes that bypass signals (bulk_create, raw SQL)
+# can survive.
+DASHBOARD_CACHE_TIMEOUT = getattr(settings, 'DASHBOARD_CACHE_TIMEOUT', 60 * 60)
+
+LATEST_APPLICATIONS_COUNT = 5
+
+COUNTERS = {
+    'users': ('dashboard:count:users', User),
+    'companies': ('dashboard:count:companies', Vendor),
+    'applications': ('dashboard:count:applications', Product),
+}
+
+COUNTER_NAMES = {model: name for name, (_, model) in COUNTERS.items()}
+
+LATEST_VERSION_KEY = 'dashboard:latest:version'
+
+
+def _latest_key(version):
+    return f'dashboard:latest:{version}'
+
+
+def get_dashboard_stats():
+    """
+    Return the home page counters and latest applications from the cache,
+    recomputing (and re-caching) whichever of them is missing from the
+    primary.
+    """
+    stats = get_dashboard_counters()
+    stats['latest_applications'] = get_latest_applications()
+    return stats
+
+
+def get_dashboard_counters():
+    keys = [key for key, _ in COUNTERS.values()]
+    cached = cache.get_many(keys)
+
+    stats = {}
+    missing = {}
+    for name, (key, model) in COUNTERS.items():
+        if key in cached:
+            stats[name] = cached[key]
+        else:
+            with use_primary():
+                stats[name] = missing[key] = model.objects.count()
+    if missing:
+        cache.set_many(missing, DASHBOARD_CACHE_TIMEOUT)
+    return stats
+
+
+def get_latest_applications():
+    version = cache.get(LATEST_VERSION_KEY)
+    if version is None:
+        # Start from a fresh version so entries left behind by an evicted
+        # version key can never be served.
+        cache.add(LATEST_VERSION_KEY, time.time_ns(), None)
+        version = cache.get(LATEST_VERSION_KEY)
+
+    latest = cache.get(_latest_key(version))
+    if latest is None:
+        with use_primary():
+            latest = list(
+                Product.objects.select_related('vendor').order_by('-created_at')[:LATEST_APPLICATIONS_COUNT]
+            )
+        cache.set(_latest_key(version), latest, DASHBOARD_CACHE_TIMEOUT)
+    return latest
+
+
+def adjust_counter(model, delta):
+    """
+    Add ``delta`` to the cached counter for ``model``. A counter that is not
+    cached is left alone; it is recomputed on the next read.
+    """
+    key, _ = COUNTERS[COUNTER_NAMES[model]]
+    try:
+        cache.incr(key, delta)
+    except ValueError:
+        pass
+
+
+def bump_latest_version():
+    """
+    Invalidate the cached latest-applications list.
+    """
+    try:
+        cache.incr(LATEST_VERSION_KEY)
+    except ValueError:
+        cache.add(LATEST_VERSION_KEY, time.time_ns(), None)
+
+
+def invalidate_dashboard():
+    """
+    Drop every cached dashboard value, for writes that bypass model signals.
+    """
+    cache.delete_many([key for key, _ in COUNTERS.values()])
+    bump_latest_version()
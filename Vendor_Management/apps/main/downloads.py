@@ -0,0 +1,190 @@
+import mimetypes
+import os
+import re
+from datetime import timezone as dt_timezone
+
+from django.conf import settings
+from django.http import FileResponse, Http404, HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_http_date_safe, quote_etag
+from django.utils.text import slugify
+
+# 'django' streams files from the worker, 'x-accel-redirect' hands them to
+# nginx and 'x-sendfile' to Apache/lighttpd.
+DOCUMENT_SERVE_MODE = getattr(settings, 'DOCUMENT_SERVE_MODE', 'django')
+# nginx location marked `internal` that aliases MEDIA_ROOT
+DOCUMENT_ACCEL_REDIRECT_PREFIX = getattr(settings, 'DOCUMENT_ACCEL_REDIRECT_PREFIX', '/protected/')
+
+VIEW_PERMISSION = 'main.view_vendor_product_record'
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+class RangeNotSatisfiable(Exception):
+    pass
+
+
+class _RangeFile:
+    """
+    Read-only view of ``length`` bytes of an open file from its current
+    position. It keeps ``fileno`` so servers that use sendfile can still do
+    so; they send Content-Length bytes from the current offset.
+    """
+
+    def __init__(self, file, length):
+        self.file = file
+        self.name = file.name
+        self.remaining = length
+
+    def read(self, size=-1):
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size) if size else b''
+        self.remaining -= len(data)
+        return data
+
+    def fileno(self):
+        return self.file.fileno()
+
+    def close(self):
+        self.file.close()
+
+
+def can_download(user, document):
+    if user.is_staff or user.is_superuser:
+        return True
+    if user.has_perm(VIEW_PERMISSION):
+        return True
+    return document.product.vendor.user_id == user.pk
+
+
+def document_validators(document):
+    """
+    Return the ETag and modification time of a document's file. Blob-backed
+    documents use their content hash and need no filesystem access.
+    """
+    if document.blob_id:
+        return quote_etag(document.blob.sha256), document.blob.created_at
+
+    storage = document.document.storage
+    try:
+        modified = storage.get_modified_time(document.document.name)
+        size = storage.size(document.document.name)
+    except OSError:
+        raise Http404('Document file is missing')
+    return quote_etag(f'{int(modified.timestamp())}-{size}'), modified
+
+
+def download_filename(document):
+    name = os.path.basename(document.document.name)
+    if document.blob_id:
+        # blobs are named by hash; name the download after the product
+        stem, extension = os.path.splitext(name)
+        return (slugify(document.product.name) or stem) + extension
+    return name
+
+
+def parse_range(header, size):
+    """
+    Return the inclusive (start, end) of a single byte range, or None when
+    the header should be ignored and the whole file sent.
+    """
+    match = RANGE_RE.match(header.strip())
+    if not match or match.groups() == ('', ''):
+        # multiple or malformed ranges may be ignored (RFC 9110 14.2)
+        return None
+
+    first, last = match.groups()
+    if first:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+        if start >= size or start > end:
+            raise RangeNotSatisfiable
+    else:
+        suffix = int(last)
+        if suffix == 0:
+            raise RangeNotSatisfiable
+        start, end = max(size - suffix, 0), size - 1
+    return start, end
+
+
+def _if_range_matches(request, etag, last_modified):
+    value = request.headers.get('If-Range')
+    if not value:
+        return True
+    if value.startswith(('"', 'W/')):
+        return value == etag
+    timestamp = parse_http_date_safe(value)
+    return timestamp is not None and int(last_modified.timestamp()) == timestamp
+
+
+def _offloaded_response(document, filename):
+    content_type, _ = mimetypes.guess_type(filename)
+    response = HttpResponse(content_type=content_type or 'application/octet-stream')
+    name = document.document.name
+    if DOCUMENT_SERVE_MODE == 'x-accel-redirect':
+        response['X-Accel-Redirect'] = DOCUMENT_ACCEL_REDIRECT_PREFIX.rstrip('/') + '/' + name
+    else:
+        response['X-Sendfile'] = document.document.storage.path(name)
+    return response
+
+
+def serve_document(request, document, as_attachment=False):
+    """
+    Build the response for a document download, answering conditional and
+    Range requests and handing the transfer to the front-end server when
+    DOCUMENT_SERVE_MODE asks for it.
+    """
+    etag, last_modified = document_validators(document)
+    last_modified = last_modified.astimezone(dt_timezone.utc)
+    filename = download_filename(document)
+
+    response = get_conditional_response(
+        request, etag=etag, last_modified=int(last_modified.timestamp())
+    )
+    if response is None:
+        if DOCUMENT_SERVE_MODE in ('x-accel-redirect', 'x-sendfile'):
+            # nginx/Apache handle Range themselves
+            response = _offloaded_response(document, filename)
+        else:
+            response = _file_response(request, document, filename, etag, last_modified, as_attachment)
+
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified.timestamp())
+    response['Accept-Ranges'] = 'bytes'
+    response['Cache-Control'] = 'private, no-cache'
+    if 'Content-Disposition' not in response:
+        disposition = 'attachment' if as_attachment else 'inline'
+        response['Content-Disposition'] = f'{disposition}; filename="{filename}"'
+    return response
+
+
+def _file_response(request, document, filename, etag, last_modified, as_attachment):
+    try:
+        file = document.document.storage.open(document.document.name, 'rb')
+    except OSError:
+        raise Http404('Document file is missing')
+    size = document.document.storage.size(document.document.name)
+
+    byte_range = None
+    header = request.headers.get('Range')
+    if header and request.method in ('GET', 'HEAD') and _if_range_matches(request, etag, last_modified):
+        try:
+            byte_range = parse_range(header, size)
+        except RangeNotSatisfiable:
+            file.close()
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{size}'
+            return response
+
+    if byte_range is None:
+        return FileResponse(file, as_attachment=as_attachment, filename=filename)
+
+    start, end = byte_range
+    file.seek(start)
+    response = FileResponse(
+        _RangeFile(file, end - start + 1), as_attachment=as_attachment, filename=filename, status=206
+    )
+    response['Content-Length'] = end - start + 1
+    response['Content-Range'] = f'bytes {start}-{end}/{size}'
+    return response
@@ -27,3 +27,18 @@ class PermissionCategories(TextChoices):
     VENDOR_MANAGEMENT = 'Vendor Management', 'Vendor Management'
     PRODUCT_MANAGEMENT = 'Product Management', 'Product Management'
     MANAGE_USER_PERMISSIONS = 'Manage User Permissions', 'Manage User Permissions'
+
+
+class JobStatus(TextChoices):
+    PENDING = 'pending', 'Pending'
+    RUNNING = 'running', 'Running'
+    DONE = 'done', 'Done'
+    FAILED = 'failed', 'Failed'
+
+
+class ActivityVerb(TextChoices):
+    CREATED = 'created', 'Created'
+    UPDATED = 'updated', 'Updated'
+    DELETED = 'deleted', 'Deleted'
+    GRANTED = 'granted', 'Granted'
+    REVOKED = 'revoked', 'Revoked'
@@ -0,0 +1,53 @@
+import csv
+import io
+
+# (header, field) pairs written by the software CSV export, in column order.
+PRODUCT_EXPORT_COLUMNS = [
+    ('Vendor', 'vendor__vendor_name'),
+    ('Name', 'name'),
+    ('Software Type', 'software_type'),
+    ('Module', 'module'),
+    ('Client Type', 'client_type'),
+    ('Last Demo Date', 'last_demo_date'),
+    ('Last Review Date', 'last_review_date'),
+    ('Next Review Date', 'next_review_date'),
+    ('Document Attached', 'document_attached'),
+    ('Cloud Status', 'cloud_status'),
+    ('Additional Information', 'additional_information'),
+    ('Internal Professional Services', 'internal_professional_services'),
+    ('Business Area', 'business_area'),
+]
+
+# Rows fetched per round-trip from the (server-side) cursor.
+EXPORT_FETCH_SIZE = 2000
+
+# Rows written into each chunk sent to the client.
+EXPORT_CHUNK_ROWS = 500
+
+
+def stream_csv(queryset, columns, chunk_rows=EXPORT_CHUNK_ROWS, fetch_size=EXPORT_FETCH_SIZE):
+    """
+    Yield a CSV document for ``queryset`` in chunks of ``chunk_rows`` rows.
+
+    Only the exported columns are selected (related columns are joined in the
+    same query) and rows are read with ``iterator()``, which uses a server-side
+    cursor where the database supports one, so memory use does not grow with
+    the size of the result.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow([header for header, _ in columns])
+    yield buffer.getvalue()
+    buffer.seek(0)
+    buffer.truncate()
+
+    rows = queryset.values_list(*[field for _, field in columns])
+    for index, row in enumerate(rows.iterator(chunk_size=fetch_size), start=1):
+        writer.writerow(row)
+        if index % chunk_rows == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+
+    if buffer.tell():
+        yield buffer.getvalue()
@@ -0,0 +1,131 @@
+from datetime import datetime, time
+
+from django.conf import settings
+from django.db.models import CharField, Count, F, Value
+from django.db.models.functions import Cast
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+# Query string parameters accepted by the product filters, mapped to the
+# model field they constrain.
+PRODUCT_FILTER_FIELDS = {
+    'cloud_status': 'cloud_status',
+    'business_area': 'business_area',
+    'software_type': 'software_type',
+    'client_type': 'client_type',
+    'module': 'module',
+}
+
+# Date range parameters, mapped to the field and lookup they constrain.
+# Values are ISO dates or datetimes; a bare date covers the whole day.
+PRODUCT_RANGE_FILTERS = {
+    'next_review_from': ('next_review_date', 'gte'),
+    'next_review_to': ('next_review_date', 'lte'),
+    'last_review_from': ('last_review_date', 'gte'),
+    'last_review_to': ('last_review_date', 'lte'),
+}
+
+# Facets shown in the browse mode: the exact-match filters plus vendor.
+FACET_PARAMS = [*PRODUCT_FILTER_FIELDS, 'vendor_id']
+
+# Most values listed per facet; selected values are always listed.
+FACET_LIMIT = getattr(settings, 'FACET_LIMIT', 20)
+
+
+def parse_range_value(value, end_of_day=False):
+    """
+    Parse an ISO date or datetime from a range filter, or return None.
+    """
+    try:
+        parsed = parse_datetime(value)
+        if parsed is None:
+            day = parse_date(value)
+            if day is None:
+                return None
+            parsed = datetime.combine(day, time.max if end_of_day else time.min)
+    except ValueError:
+        return None
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+
+def filter_products(queryset, params, exclude=None):
+    """
+    Narrow a product queryset using request query parameters.
+
+    ``vendor`` matches the vendor name (case-insensitive) and ``vendor_id`` the
+    vendor primary key; the remaining parameters in ``PRODUCT_FILTER_FIELDS``
+    are exact matches and may be repeated to select several values. The
+    parameters in ``PRODUCT_RANGE_FILTERS`` bound the review dates. The
+    parameter named by ``exclude`` is ignored, for facet counts.
+    """
+    vendor_name = params.get('vendor')
+    if vendor_name:
+        queryset = queryset.filter(vendor__vendor_name__iexact=vendor_name)
+
+    if exclude != 'vendor_id':
+        vendor_ids = [value for value in params.getlist('vendor_id') if value.isdigit()]
+        if len(vendor_ids) == 1:
+            queryset = queryset.filter(vendor_id=vendor_ids[0])
+        elif vendor_ids:
+            queryset = queryset.filter(vendor_id__in=vendor_ids)
+
+    for param, field in PRODUCT_FILTER_FIELDS.items():
+        if param == exclude:
+            continue
+        values = [value for value in params.getlist(param) if value]
+        if len(values) == 1:
+            queryset = queryset.filter(**{field: values[0]})
+        elif values:
+            queryset = queryset.filter(**{f'{field}__in': values})
+
+    for param, (field, lookup) in PRODUCT_RANGE_FILTERS.items():
+        value = params.get(param)
+        bound = parse_range_value(value, end_of_day=lookup == 'lte') if value else None
+        if bound is not None:
+            queryset = queryset.filter(**{f'{field}__{lookup}': bound})
+
+    return queryset
+
+
+def _facet_query(queryset, params, param):
+    """
+    (facet, value, label, count) rows for one facet, counted over the
+    products matching every filter except the facet's own, so the other
+    values of a facet stay selectable.
+    """
+    rows = filter_products(queryset, params, exclude=param).order_by()
+    if param == 'vendor_id':
+        value, label = Cast('vendor_id', CharField()), F('vendor__vendor_name')
+    else:
+        value = label = F(PRODUCT_FILTER_FIELDS[param])
+    return (
+        rows.values(facet_value=value, facet_label=label)
+        .annotate(facet=Value(param, CharField()), facet_count=Count('pk'))
+        .values_list('facet', 'facet_value', 'facet_label', 'facet_count')
+    )
+
+
+def facet_counts(queryset, params, limit=FACET_LIMIT):
+    """
+    Count the products per value of every facet with a single UNION ALL
+    query of grouped aggregates, and return them as
+    ``{facet: [{'value', 'label', 'count', 'selected'}, ...]}`` ordered by
+    count. The most frequent ``limit`` values of each facet are kept, plus
+    any value that is selected.
+    """
+    queries = [_facet_query(queryset, params, param) for param in FACET_PARAMS]
+    facets = {param: [] for param in FACET_PARAMS}
+    for facet, value, label, count in queries[0].union(*queries[1:], all=True):
+        facets[facet].append({
+            'value': value,
+            'label': label,
+            'count': count,
+            'selected': value in params.getlist(facet),
+        })
+
+    for facet, values in facets.items():
+        values.sort(key=lambda item: (-item['count'], item['label'] or ''))
+        facets[facet] = [item for index, item in enumerate(values) if index < limit or item['selected']]
+    return facets
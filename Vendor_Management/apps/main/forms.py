@@ -145,3 +145,8 @@ class PermissionForm(forms.ModelForm):
         widgets = {
             'description': forms.Textarea(attrs={'rows': 4}),
         }
+
+
+class ImportForm(forms.Form):
+    kind = forms.ChoiceField(choices=[('vendors', 'Vendors'), ('products', 'Products')])
+    file = forms.FileField(help_text="CSV or XLSX file with a header row")
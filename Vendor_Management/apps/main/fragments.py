@@ -0,0 +1,198 @@
+import hashlib
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import cache
+
+from apps.main.models import Comment, Document, Product, Vendor
+from apps.main.routers import use_primary
+
+# Row fragments are keyed by the row's version and collection fragments by
+# generation counters, so entries never go stale; the timeout only evicts
+# versions nobody reads any more.
+FRAGMENT_CACHE_TIMEOUT = getattr(settings, 'FRAGMENT_CACHE_TIMEOUT', 60 * 60 * 24)
+
+# models whose saves and deletes bump their collection generation
+COLLECTION_MODELS = (Vendor, Product, Document, Comment)
+
+STATS_NAMES_KEY = 'fragments:stats:names'
+
+# fields that change without touching updated_at, see apps.main.ratings
+ROW_VERSION_FIELDS = ('updated_at', 'rating_sum', 'rating_count')
+
+
+def _generation_key(label):
+    return f'fragments:generation:{label}'
+
+
+def _stats_key(name, counter):
+    return f'fragments:stats:{name}:{counter}'
+
+
+def _incr(key, delta=1):
+    try:
+        cache.incr(key, delta)
+    except ValueError:
+        # a concurrent first increment may win the add; retry once
+        if not cache.add(key, delta, None):
+            cache.incr(key, delta)
+
+
+def bump_generation(model):
+    """
+    Invalidate every collection fragment that lists ``model``.
+    """
+    key = _generation_key(model._meta.label_lower)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, time.time_ns(), None)
+
+
+def bump_generations():
+    """
+    Invalidate every collection fragment, for writes that bypass model signals.
+    """
+    for model in COLLECTION_MODELS:
+        bump_generation(model)
+
+
+def get_generations(labels):
+    keys = [_generation_key(label) for label in labels]
+    generations = cache.get_many(keys)
+    for key in keys:
+        if key not in generations:
+            # A missing generation starts from a fresh value so fragments
+            # cached under an evicted generation are never read again.
+            cache.add(key, time.time_ns(), None)
+            generations[key] = cache.get(key)
+    return [generations[key] for key in keys]
+
+
+def row_version(obj):
+    """
+    The parts of a model instance that identify one rendering of it.
+    """
+    version = [obj._meta.label_lower, obj.pk]
+    for field in ROW_VERSION_FIELDS:
+        value = getattr(obj, field, None)
+        if value is not None:
+            version.append(value.isoformat() if hasattr(value, 'isoformat') else value)
+    return version
+
+
+def fragment_key(name, parts):
+    digest = hashlib.md5(repr(parts).encode()).hexdigest()
+    return f'fragments:{name}:{digest}'
+
+
+def get_fragments(keys):
+    """
+    Read the fragments cached under ``keys`` in one round trip; the ones
+    that are not cached map to None.
+    """
+    cached = cache.get_many(keys) if keys else {}
+    return {key: cached.get(key) for key in keys}
+
+
+def get_or_render(name, parts, render, prefetched=None, stats=None):
+    """
+    Return the cached fragment for ``name`` and ``parts``, rendering it from
+    the primary and caching it on a miss, and count the hit or miss.
+
+    ``prefetched`` is a dict from get_fragments() that is consulted instead
+    of the cache for the keys it holds. ``stats`` is a FragmentStats that
+    collects the counts, to be flushed by the caller; without one they are
+    written straight away.
+    """
+    key = fragment_key(name, parts)
+    if prefetched is not None and key in prefetched:
+        content = prefetched[key]
+    else:
+        content = cache.get(key)
+    buffer = stats if stats is not None else FragmentStats()
+
+    if content is None:
+        started = time.perf_counter()
+        with use_primary():
+            content = render()
+        elapsed = time.perf_counter() - started
+        cache.set(key, content, FRAGMENT_CACHE_TIMEOUT)
+        buffer.record(name, hit=False, render_time=elapsed)
+    else:
+        buffer.record(name, hit=True)
+
+    if stats is None:
+        buffer.flush()
+    return content
+
+
+def stats_enabled():
+    return getattr(settings, 'FRAGMENT_CACHE_STATS', False)
+
+
+class FragmentStats:
+    """
+    Hit and miss counts collected while rendering a page, written to the
+    cache by flush() with one increment per fragment name and counter
+    rather than one per fragment. Nothing is counted unless
+    FRAGMENT_CACHE_STATS is set.
+    """
+
+    def __init__(self):
+        self.enabled = stats_enabled()
+        self.counts = Counter()
+
+    def record(self, name, hit, render_time=0.0):
+        if not self.enabled:
+            return
+        if hit:
+            self.counts[name, 'hits'] += 1
+            return
+        self.counts[name, 'misses'] += 1
+        self.counts[name, 'render_us'] += int(render_time * 1_000_000)
+
+    def flush(self):
+        if not self.counts:
+            return
+        for (name, counter), delta in self.counts.items():
+            if delta:
+                _incr(_stats_key(name, counter), delta)
+        names = cache.get(STATS_NAMES_KEY) or set()
+        rendered = {name for name, _ in self.counts}
+        if not rendered <= names:
+            cache.set(STATS_NAMES_KEY, names | rendered, None)
+        self.counts.clear()
+
+
+def get_stats():
+    """
+    Hits, misses and render time per fragment name. The time saved is
+    estimated from the average render time of the misses.
+    """
+    names = sorted(cache.get(STATS_NAMES_KEY) or ())
+    counters = ('hits', 'misses', 'render_us')
+    values = cache.get_many([_stats_key(name, counter) for name in names for counter in counters])
+
+    stats = []
+    for name in names:
+        hits, misses, render_us = (values.get(_stats_key(name, counter), 0) for counter in counters)
+        average_ms = render_us / misses / 1000 if misses else 0.0
+        stats.append({
+            'name': name,
+            'hits': hits,
+            'misses': misses,
+            'hit_ratio': hits / (hits + misses) if hits + misses else 0.0,
+            'average_render_ms': average_ms,
+            'saved_ms': hits * average_ms,
+        })
+    return stats
+
+
+def reset_stats():
+    names = cache.get(STATS_NAMES_KEY) or ()
+    cache.delete_many(
+        [_stats_key(name, counter) for name in names for counter in ('hits', 'misses', 'render_us')]
+        + [STATS_NAMES_KEY]
+    )
@@ -0,0 +1,163 @@
+import io
+import os
+from functools import partial
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.uploadhandler import FileUploadHandler, SkipFile
+from django.db import transaction
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+from apps.main import tasks
+from apps.main.models import Profile
+
+# variant name -> square edge in pixels
+PROFILE_IMAGE_SIZES = getattr(settings, 'PROFILE_IMAGE_SIZES', {'small': 48, 'medium': 128, 'large': 512})
+PROFILE_IMAGE_FORMATS = {'webp': 'WEBP', 'jpeg': 'JPEG'}
+PROFILE_IMAGE_QUALITY = getattr(settings, 'PROFILE_IMAGE_QUALITY', 82)
+PROFILE_IMAGE_MAX_UPLOAD_SIZE = getattr(settings, 'PROFILE_IMAGE_MAX_UPLOAD_SIZE', 5 * 1024 * 1024)
+PROFILE_IMAGE_MAX_PIXELS = getattr(settings, 'PROFILE_IMAGE_MAX_PIXELS', 40_000_000)
+PROFILE_IMAGE_URL_CACHE_TIMEOUT = getattr(settings, 'PROFILE_IMAGE_URL_CACHE_TIMEOUT', 60 * 60)
+
+DEFAULT_PROFILE_IMAGE = Profile._meta.get_field('image').default
+
+
+class ProfileImageError(ValueError):
+    pass
+
+
+class ProfileImageUploadHandler(FileUploadHandler):
+    """
+    Drops the ``profile_picture`` upload as soon as it grows past
+    PROFILE_IMAGE_MAX_UPLOAD_SIZE, before the rest of it is read into
+    memory or a temporary file. ``too_large`` tells the view it happened.
+    """
+
+    limited_field = 'profile_picture'
+
+    def __init__(self, request=None):
+        super().__init__(request)
+        self.received = 0
+        self.too_large = False
+
+    def new_file(self, field_name, *args, **kwargs):
+        super().new_file(field_name, *args, **kwargs)
+        self.received = 0
+
+    def receive_data_chunk(self, raw_data, start):
+        if self.field_name == self.limited_field:
+            self.received += len(raw_data)
+            if self.received > PROFILE_IMAGE_MAX_UPLOAD_SIZE:
+                self.too_large = True
+                raise SkipFile
+        return raw_data
+
+    def file_complete(self, file_size):
+        return None
+
+
+def validate_profile_image(upload):
+    """
+    Check that an upload is an image Pillow can read and is not too large to
+    decode, without decoding it.
+    """
+    try:
+        with Image.open(upload) as image:
+            width, height = image.size
+            image.verify()
+    except (UnidentifiedImageError, OSError, SyntaxError, Image.DecompressionBombError):
+        raise ProfileImageError('The file is not a supported image')
+    finally:
+        upload.seek(0)
+    if width * height > PROFILE_IMAGE_MAX_PIXELS:
+        raise ProfileImageError('The image dimensions are too large')
+
+
+def variant_name(profile, source, size, extension):
+    stem = os.path.splitext(os.path.basename(source))[0]
+    return f'users/images/variants/{profile.pk}/{stem}-{size}.{extension}'
+
+
+def _encode(image, size, image_format):
+    variant = ImageOps.fit(image, (size, size), Image.Resampling.LANCZOS)
+    if image_format == 'JPEG' and variant.mode == 'RGBA':
+        background = Image.new('RGB', variant.size, (255, 255, 255))
+        background.paste(variant, mask=variant.getchannel('A'))
+        variant = background
+    output = io.BytesIO()
+    # re-encoding without exif/icc arguments drops the original metadata
+    variant.save(output, image_format, quality=PROFILE_IMAGE_QUALITY, optimize=image_format == 'JPEG')
+    return output.getvalue()
+
+
+def generate_profile_variants(profile_id):
+    """
+    Render every size and format of a profile's current picture and record
+    them on the profile, unless the picture changed in the meantime.
+    """
+    profile = Profile.objects.filter(pk=profile_id).first()
+    if profile is None or not profile.image or profile.image.name == DEFAULT_PROFILE_IMAGE:
+        return None
+
+    source = profile.image.name
+    storage = profile.image.storage
+    with storage.open(source, 'rb') as original:
+        with Image.open(original) as image:
+            if image.width * image.height > PROFILE_IMAGE_MAX_PIXELS:
+                raise ProfileImageError('The image dimensions are too large')
+            image = ImageOps.exif_transpose(image)
+            image = image.convert('RGBA' if 'A' in image.getbands() else 'RGB')
+
+    variants = {'source': source}
+    for name, size in PROFILE_IMAGE_SIZES.items():
+        variants[name] = {}
+        for extension, image_format in PROFILE_IMAGE_FORMATS.items():
+            path = variant_name(profile, source, size, extension)
+            if storage.exists(path):
+                storage.delete(path)
+            variants[name][extension] = storage.save(path, ContentFile(_encode(image, size, image_format)))
+
+    previous = profile.image_variants or {}
+    updated = Profile.objects.filter(pk=profile_id, image=source).update(image_variants=variants)
+    if not updated:
+        # a newer picture was uploaded while this one was processed
+        _delete_variants(storage, variants)
+        return None
+    if previous.get('source') != source:
+        _delete_variants(storage, previous)
+    return variants
+
+
+def _delete_variants(storage, variants):
+    for name, formats in variants.items():
+        if name == 'source':
+            continue
+        for path in formats.values():
+            storage.delete(path)
+
+
+def schedule_profile_variants(profile):
+    transaction.on_commit(partial(tasks.submit, generate_profile_variants, profile.pk))
+
+
+def profile_image_url(profile, variant='medium', extension='webp'):
+    """
+    Return the URL of a profile picture variant, falling back to the default
+    avatar while the variants of a new picture are still being generated.
+    """
+    storage = profile.image.storage
+    variants = profile.image_variants or {}
+    name = None
+    if variants.get('source') == profile.image.name:
+        name = variants.get(variant, {}).get(extension)
+    if name is None:
+        name = DEFAULT_PROFILE_IMAGE
+
+    # storage URLs can be costly to build (signed URLs on remote storages)
+    key = f'profile-image-url:{name}'
+    url = cache.get(key)
+    if url is None:
+        url = storage.url(name)
+        cache.set(key, url, PROFILE_IMAGE_URL_CACHE_TIMEOUT)
+    return url
@@ -0,0 +1,361 @@
+import csv
+import io
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+import django
+from django.contrib.auth.hashers import make_password
+from django.core.exceptions import ValidationError
+from django.db import DatabaseError, transaction
+from django.db.models import Q
+
+from apps.main.dashboard import invalidate_dashboard
+from apps.main.enums import UserTypes
+from apps.main.fragments import bump_generations
+from apps.main.forms import ProductForm, VendorForm
+from apps.main.models import Product, Profile, User, Vendor
+from apps.main.search import index_objects
+
+IMPORT_BATCH_SIZE = 500
+
+
+class ImportFileError(ValueError):
+    pass
+
+
+def normalize_header(header):
+    return str(header or '').strip().lower().replace(' ', '_')
+
+
+def _normalize_value(value):
+    if value is None:
+        return ''
+    return value.strip() if isinstance(value, str) else value
+
+
+def _read_csv(fileobj):
+    reader = csv.reader(io.TextIOWrapper(fileobj, encoding='utf-8-sig', newline=''))
+    headers = [normalize_header(header) for header in next(reader, [])]
+    for row in reader:
+        if any(row):
+            yield dict(zip(headers, (_normalize_value(value) for value in row)))
+
+
+def _read_xlsx(fileobj):
+    try:
+        from openpyxl import load_workbook
+    except ImportError as error:
+        raise ImportFileError('openpyxl is required to import .xlsx files') from error
+
+    workbook = load_workbook(fileobj, read_only=True, data_only=True)
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        headers = [normalize_header(header) for header in next(rows, [])]
+        for row in rows:
+            if any(value not in (None, '') for value in row):
+                yield dict(zip(headers, (_normalize_value(value) for value in row)))
+    finally:
+        workbook.close()
+
+
+def _read_json(fileobj):
+    try:
+        rows = json.load(io.TextIOWrapper(fileobj, encoding='utf-8-sig'))
+    except ValueError as error:
+        raise ImportFileError(f'Invalid JSON: {error}') from error
+    if not isinstance(rows, list) or not all(isinstance(row, dict) for row in rows):
+        raise ImportFileError('A JSON file must hold a list of objects')
+    for row in rows:
+        yield {normalize_header(key): _normalize_value(value) for key, value in row.items()}
+
+
+def read_rows(fileobj, filename):
+    """
+    Stream ``(row_number, row)`` pairs from a CSV or XLSX file whose first
+    row holds the column headers, or from a JSON list of objects. Headers are
+    matched case-insensitively with spaces treated as underscores, so files
+    written by the CSV export can be imported back.
+    """
+    extension = os.path.splitext(filename)[1].lower()
+    if extension == '.xlsx':
+        rows = _read_xlsx(fileobj)
+    elif extension == '.json':
+        # a JSON file has no header row
+        return enumerate(_read_json(fileobj), start=1)
+    elif extension in ('.csv', '.txt', ''):
+        rows = _read_csv(fileobj)
+    else:
+        raise ImportFileError(f'Unsupported file type: {extension}')
+    # row 1 is the header
+    return enumerate(rows, start=2)
+
+
+class ImportResult:
+    def __init__(self):
+        self.rows = 0
+        self.created = 0
+        self.errors = []
+
+    def add_error(self, row_number, errors):
+        self.errors.append({'row': row_number, 'errors': errors})
+
+    def as_dict(self):
+        return {
+            'rows': self.rows,
+            'created': self.created,
+            'failed': len(self.errors),
+            'errors': self.errors,
+        }
+
+
+class ProductImportForm(ProductForm):
+    """
+    ProductForm without the vendor choice field, whose per-row lookup is
+    replaced by a single name lookup per batch.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        del self.fields['vendor']
+
+
+class BaseImporter:
+    model = None
+    form_class = None
+
+    def __init__(self, batch_size=IMPORT_BATCH_SIZE, created_by=None):
+        self.batch_size = batch_size
+        self.created_by = created_by
+
+    def resolve(self, rows):
+        """
+        Look up whatever the rows of a batch reference, in one query.
+        """
+        return {}
+
+    def build(self, row, context):
+        """
+        Return an unsaved instance for ``row`` and a dict of errors.
+        """
+        raise NotImplementedError
+
+    def run(self, rows):
+        result = ImportResult()
+        rows = iter(rows)
+        while True:
+            batch = list(islice(rows, self.batch_size))
+            if not batch:
+                break
+            result.rows += len(batch)
+            self.import_batch(batch, result)
+
+        if result.created:
+            invalidate_dashboard()
+            bump_generations()
+        return result
+
+    def import_batch(self, batch, result):
+        context = self.resolve([row for _, row in batch])
+        objects = []
+        row_numbers = []
+        for row_number, row in batch:
+            instance, errors = self.build(row, context)
+            if errors:
+                result.add_error(row_number, errors)
+            else:
+                objects.append(instance)
+                row_numbers.append(row_number)
+
+        if not objects:
+            return
+        self.prepare(objects)
+        try:
+            with transaction.atomic():
+                created = self.save(objects)
+        except DatabaseError:
+            # find the offending rows: save the batch one row at a time, each
+            # in its own savepoint
+            created = []
+            for row_number, instance in zip(row_numbers, objects):
+                try:
+                    with transaction.atomic():
+                        created += self.save([instance])
+                except DatabaseError as error:
+                    result.add_error(row_number, {'__all__': [str(error)]})
+        result.created += len(created)
+
+    def prepare(self, objects):
+        """
+        Finish the valid instances of a batch before its transaction starts.
+        """
+        for instance in objects:
+            instance.created_by = self.created_by
+
+    def save(self, objects):
+        created = self.model.objects.bulk_create(objects)
+        index_objects([instance for instance in created if instance.pk])
+        return created
+
+    def validate(self, row):
+        form = self.form_class(data=row)
+        if form.is_valid():
+            return form.instance, {}
+        return None, {field: list(messages) for field, messages in form.errors.items()}
+
+
+class VendorImporter(BaseImporter):
+    """
+    Imports vendors. Each row names the existing user account that owns the
+    vendor in a ``username`` column.
+    """
+    model = Vendor
+    form_class = VendorForm
+
+    def resolve(self, rows):
+        usernames = {row.get('username') for row in rows if row.get('username')}
+        users = {
+            username: (pk, vendor_id)
+            for username, pk, vendor_id in User.objects.filter(
+                username__in=usernames
+            ).values_list('username', 'pk', 'vendor__id')
+        }
+        return {'users': users, 'claimed': set()}
+
+    def build(self, row, context):
+        username = row.get('username')
+        user = context['users'].get(username)
+        if not username:
+            return None, {'username': ['This field is required.']}
+        if user is None:
+            return None, {'username': [f'Unknown user "{username}".']}
+        user_id, vendor_id = user
+        if vendor_id or user_id in context['claimed']:
+            return None, {'username': [f'User "{username}" already has a vendor.']}
+
+        instance, errors = self.validate(row)
+        if not errors:
+            instance.user_id = user_id
+            context['claimed'].add(user_id)
+        return instance, errors
+
+
+class ProductImporter(BaseImporter):
+    """
+    Imports products. The ``vendor`` column holds the vendor name.
+    """
+    model = Product
+    form_class = ProductImportForm
+
+    def resolve(self, rows):
+        names = {row.get('vendor') for row in rows if row.get('vendor')}
+        vendors = {}
+        for pk, name in Vendor.objects.filter(vendor_name__in=names).values_list('pk', 'vendor_name'):
+            vendors.setdefault(name, []).append(pk)
+        return {'vendors': vendors}
+
+    def build(self, row, context):
+        name = row.get('vendor')
+        matches = context['vendors'].get(name, [])
+        if not name:
+            return None, {'vendor': ['This field is required.']}
+        if not matches:
+            return None, {'vendor': [f'Unknown vendor "{name}".']}
+        if len(matches) > 1:
+            return None, {'vendor': [f'Several vendors are named "{name}".']}
+
+        instance, errors = self.validate(row)
+        if not errors:
+            instance.vendor_id = matches[0]
+        return instance, errors
+
+
+class UserImporter(BaseImporter):
+    """
+    Provisions user accounts and their profiles. Rows hold ``username``,
+    ``email`` and ``password`` and may hold ``first_name``, ``last_name`` and
+    ``user_type``; a blank password leaves the account without a usable one.
+
+    Password hashing dominates the cost of creating a user, so each batch is
+    hashed on a pool of ``workers`` processes, or inline when it is 0.
+    """
+    model = User
+
+    def __init__(self, batch_size=IMPORT_BATCH_SIZE, created_by=None, workers=None):
+        super().__init__(batch_size, created_by)
+        self.workers = os.cpu_count() if workers is None else workers
+        self.executor = None
+        self.hashing_time = 0.0
+
+    def run(self, rows):
+        if not self.workers:
+            return super().run(rows)
+        # workers started with spawn need the settings loaded to hash
+        with ProcessPoolExecutor(self.workers, initializer=django.setup) as executor:
+            self.executor = executor
+            try:
+                return super().run(rows)
+            finally:
+                self.executor = None
+
+    def resolve(self, rows):
+        usernames = {row.get('username') for row in rows if row.get('username')}
+        emails = {User.objects.normalize_email(row.get('email')) for row in rows if row.get('email')}
+        taken = User.objects.filter(Q(username__in=usernames) | Q(email__in=emails)).values_list('username', 'email')
+        return {
+            'usernames': {username for username, _ in taken},
+            'emails': {email for _, email in taken},
+        }
+
+    def build(self, row, context):
+        instance = User(
+            username=str(row.get('username', '')),
+            email=User.objects.normalize_email(str(row.get('email', ''))),
+            first_name=row.get('first_name') or None,
+            last_name=row.get('last_name') or None,
+            user_type=row.get('user_type') or UserTypes.NORMAL_USER.value,
+        )
+        try:
+            instance.full_clean(exclude=['password'], validate_unique=False)
+        except ValidationError as error:
+            return None, error.message_dict
+
+        errors = {}
+        if instance.username in context['usernames']:
+            errors['username'] = [f'User "{instance.username}" already exists.']
+        if instance.email in context['emails']:
+            errors['email'] = [f'A user with email "{instance.email}" already exists.']
+        if errors:
+            return None, errors
+
+        context['usernames'].add(instance.username)
+        context['emails'].add(instance.email)
+        # the raw password, replaced by its hash in prepare()
+        instance.password = str(row.get('password') or '')
+        return instance, {}
+
+    def prepare(self, objects):
+        started = time.monotonic()
+        passwords = [instance.password or None for instance in objects]
+        if self.executor is None:
+            hashes = [make_password(password) for password in passwords]
+        else:
+            chunksize = max(1, len(passwords) // (self.workers * 4))
+            hashes = self.executor.map(make_password, passwords, chunksize=chunksize)
+        for instance, password in zip(objects, hashes):
+            instance.password = password
+        self.hashing_time += time.monotonic() - started
+
+    def save(self, objects):
+        created = User.objects.bulk_create(objects)
+        # bulk_create skips the post_save signal that creates profiles
+        Profile.objects.bulk_create([Profile(user_id=instance.pk) for instance in created])
+        return created
+
+
+IMPORTERS = {
+    'vendors': VendorImporter,
+    'products': ProductImporter,
+}
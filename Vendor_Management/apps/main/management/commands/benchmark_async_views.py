@@ -0,0 +1,83 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from apps.main.benchmarks import (
+    ASYNC_VIEWS,
+    async_benchmark_paths,
+    benchmark_async_concurrent,
+    benchmark_sync_concurrent,
+    environment,
+)
+from apps.main.models import User
+
+
+class Command(BaseCommand):
+    help = "Compares the latency of the sync and async home, vendor and product views under concurrent load"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--username', help='User to request the pages as; defaults to the first superuser')
+        parser.add_argument('--requests', type=int, default=100, help='Measured requests per view and mode')
+        parser.add_argument('--concurrency', type=int, default=8, help='Concurrent clients')
+        parser.add_argument('--warmup', type=int, default=2, help='Unmeasured requests per client')
+        parser.add_argument('--vendor-id', type=int, help='Vendor page to request; defaults to the first vendor')
+        parser.add_argument('--product-id', type=int, help='Product page to request; defaults to the first product')
+        parser.add_argument(
+            '--view',
+            action='append',
+            dest='views',
+            choices=ASYNC_VIEWS,
+            help='View to benchmark; repeat for several (default: all)'
+        )
+        parser.add_argument('--output', help='Write the results as JSON to this file')
+
+    def handle(self, *args, **options):
+        user = self.get_user(options['username'])
+        if options['requests'] < 1 or options['concurrency'] < 1:
+            raise CommandError('--requests and --concurrency must be positive')
+
+        paths = async_benchmark_paths(options['vendor_id'], options['product_id'])
+        results = {
+            'started_at': timezone.now().isoformat(),
+            'username': user.username,
+            'requests': options['requests'],
+            'concurrency': options['concurrency'],
+            'environment': environment(),
+            'views': {},
+        }
+        self.stdout.write(f"{'view':<16} {'mode':<6} {'p50':>9} {'p95':>9} {'p99':>9} {'req/s':>8}  status")
+        for name in options['views'] or ASYNC_VIEWS:
+            sync_path, async_path = paths[name]
+            results['views'][name] = {
+                'sync': benchmark_sync_concurrent(
+                    user, sync_path, options['requests'], options['concurrency'], options['warmup']
+                ),
+                'async': benchmark_async_concurrent(
+                    user, async_path, options['requests'], options['concurrency'], options['warmup']
+                ),
+            }
+            for mode, result in results['views'][name].items():
+                self.stdout.write(
+                    f"{name:<16} {mode:<6} {result['p50_ms']:>7.1f}ms {result['p95_ms']:>7.1f}ms "
+                    f"{result['p99_ms']:>7.1f}ms {result['throughput_rps']:>8.1f}  "
+                    f"{', '.join(f'{code}x{count}' for code, count in result['status_codes'].items())}"
+                )
+            sync_p95, async_p95 = (results['views'][name][mode]['p95_ms'] for mode in ('sync', 'async'))
+            change = (async_p95 - sync_p95) / sync_p95 * 100
+            line = f"{name:<16} async p95 {change:+.1f}% against sync"
+            self.stdout.write(self.style.SUCCESS(line) if change < 0 else line)
+
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump(results, output, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Results written to {options['output']}"))
+
+    def get_user(self, username):
+        if username:
+            user = User.objects.filter(username=username).first()
+        else:
+            user = User.objects.filter(is_superuser=True).order_by('pk').first()
+        if user is None:
+            raise CommandError('No user to benchmark as; pass --username or create a superuser')
+        return user
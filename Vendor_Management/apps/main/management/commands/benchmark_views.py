@@ -0,0 +1,86 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+
+from apps.main.benchmarks import benchmark_endpoint, compare_results, environment, url_names
+from apps.main.models import User
+
+
+class Command(BaseCommand):
+    help = "Benchmarks every view in apps.main.urls and reports latency percentiles, throughput and peak RSS"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--username', help='User to request the pages as; defaults to the first superuser')
+        parser.add_argument('--requests', type=int, default=100, help='Measured requests per endpoint')
+        parser.add_argument('--workers', type=int, default=4, help='Worker processes per endpoint')
+        parser.add_argument('--warmup', type=int, default=2, help='Unmeasured requests per worker')
+        parser.add_argument(
+            '--endpoint',
+            action='append',
+            dest='endpoints',
+            help='URL name to benchmark; repeat for several (default: all)'
+        )
+        parser.add_argument('--output', help='Write the results as JSON to this file')
+        parser.add_argument('--compare', help='JSON results of an earlier run to compare against')
+
+    def handle(self, *args, **options):
+        user = self.get_user(options['username'])
+        names = url_names()
+        endpoints = options['endpoints'] or names
+        unknown = set(endpoints) - set(names)
+        if unknown:
+            raise CommandError(f"Unknown URL names: {', '.join(sorted(unknown))}")
+        if options['requests'] < 1 or options['workers'] < 1:
+            raise CommandError('--requests and --workers must be positive')
+
+        if connection.vendor == 'sqlite' and options['workers'] > 1:
+            # SQLite takes one writer at a time; concurrent sessions and
+            # rolled-back writes would fail with "database is locked"
+            self.stdout.write(self.style.WARNING("SQLite database: using a single worker"))
+            options['workers'] = 1
+
+        results = {
+            'started_at': timezone.now().isoformat(),
+            'username': user.username,
+            'requests': options['requests'],
+            'workers': options['workers'],
+            'environment': environment(),
+            'endpoints': {},
+        }
+        self.stdout.write(f"{'endpoint':<26} {'p50':>9} {'p95':>9} {'p99':>9} {'req/s':>8} {'rss MB':>7}  status")
+        for name in endpoints:
+            result = benchmark_endpoint(
+                user.username, name, options['requests'], options['workers'], options['warmup']
+            )
+            results['endpoints'][name] = result
+            line = (
+                f"{name:<26} {result['p50_ms']:>7.1f}ms {result['p95_ms']:>7.1f}ms {result['p99_ms']:>7.1f}ms "
+                f"{result['throughput_rps']:>8.1f} {result['peak_rss_kb'] / 1024:>7.1f}  "
+                f"{', '.join(f'{code}x{count}' for code, count in result['status_codes'].items())}"
+            )
+            self.stdout.write(self.style.ERROR(line) if result['errors'] else line)
+
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump(results, output, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Results written to {options['output']}"))
+
+        if options['compare']:
+            with open(options['compare']) as previous:
+                rows = compare_results(json.load(previous), results)
+            for name, metric, before, after, change in rows:
+                # lower is better except for throughput
+                better = change > 0 if metric == 'throughput_rps' else change < 0
+                line = f"{name:<26} {metric:<15} {before:>10} -> {after:<10} {change:+.1f}%"
+                self.stdout.write(self.style.SUCCESS(line) if better else line)
+
+    def get_user(self, username):
+        if username:
+            user = User.objects.filter(username=username).first()
+        else:
+            user = User.objects.filter(is_superuser=True).order_by('pk').first()
+        if user is None:
+            raise CommandError('No user to benchmark as; pass --username or create a superuser')
+        return user
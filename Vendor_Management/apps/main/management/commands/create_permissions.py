@@ -1,50 +1,97 @@
-from django.core.management.base import BaseCommand
 from django.contrib.contenttypes.models import ContentType
+from django.core.management.base import BaseCommand
+from django.db import transaction
 
-from apps.main.management.permissions import custom_permissions
 from apps.main.management.permissions.custom_permissions import vendor_management_permissions, product_management_permissions
-from apps.main.models import Permissions
+from apps.main.models import Permissions, Vendor, Product
+from apps.main.permission_cache import bump_catalog_version
+
+# Permission catalog per content type model.
+PERMISSION_CATALOG = [
+    (Vendor, vendor_management_permissions),
+    (Product, product_management_permissions),
+]
+
+SYNCED_FIELDS = ['name', 'category', 'description']
 
 
 class Command(BaseCommand):
     help = "Creates default permission groups for users"
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Print the changes that would be made without writing them'
+        )
+
     def handle(self, *args, **options):
-        self.create_permissions('vendor', vendor_management_permissions)
-        self.create_permissions('product', product_management_permissions)
-
-    def create_permissions(self, category, permissions):
-        try:
-            content_type = self.get_content_type(category)
-            for codename, name, category, description in permissions:
-                permission, created = Permissions.objects.get_or_create(
+        content_types = ContentType.objects.get_for_models(*[model for model, _ in PERMISSION_CATALOG])
+
+        to_create = []
+        to_update = []
+        for model, permissions in PERMISSION_CATALOG:
+            creates, updates = self.plan(content_types[model], permissions)
+            to_create += creates
+            to_update += updates
+
+        if options['dry_run']:
+            self.stdout.write(self.style.WARNING("Dry run, no changes will be written"))
+            return
+
+        with transaction.atomic():
+            # Permissions extends auth.Permission (multi-table inheritance),
+            # which bulk_create cannot insert; new entries are rare and only
+            # happen when the catalog grows.
+            for permission in to_create:
+                permission.save()
+            if to_update:
+                Permissions.objects.bulk_update(to_update, SYNCED_FIELDS)
+                # bulk_update sends no post_save, which would bump it
+                transaction.on_commit(bump_catalog_version)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Permissions synced: {len(to_create)} created, {len(to_update)} updated"
+        ))
+
+    def plan(self, content_type, permissions):
+        """
+        Diff the catalog entries for one content type against the database
+        with a single query and return the permissions to create and update.
+        """
+        existing = {
+            permission.codename: permission
+            for permission in Permissions.objects.filter(
+                content_type=content_type,
+                codename__in=[codename for codename, _, _, _ in permissions]
+            )
+        }
+
+        to_create = []
+        to_update = []
+        for codename, name, category, description in sorted(permissions):
+            permission = existing.get(codename)
+            if permission is None:
+                to_create.append(Permissions(
                     codename=codename,
                     content_type=content_type,
                     name=name,
                     category=category,
                     description=description
-                )
-                if created:
-                    self.stdout.write(self.style.SUCCESS(f"Permission '{permission.name}' created"))
-                else:
-                    # Permission already exists, update the name if it's different
-                    if permission.name != name:
-                        permission.name = name
-                        permission.save()
-                        self.stdout.write(self.style.SUCCESS(f"Permission '{permission.name}' updated"))
-                    else:
-                        self.stdout.write(self.style.WARNING(f"Permission '{permission.name}' already exists"))
-
-            self.stdout.write(self.style.SUCCESS(f"Permissions for category '{category}' created successfully"))
-        except Exception as error:
-            self.stdout.write(self.style.ERROR(str(error)))
-            raise error
-
-    @staticmethod
-    def get_content_type(category):
-        if category == 'vendor':
-            return ContentType.objects.get(app_label='main', model='vendor')
-        elif category == 'product':
-            return ContentType.objects.get(app_label='main', model='product')
-        else:
-            return None  # Handle other cases as needed
+                ))
+                self.stdout.write(self.style.SUCCESS(f"+ Permission '{name}' will be created"))
+                continue
+
+            wanted = {'name': name, 'category': category, 'description': description}
+            changed = [field for field in SYNCED_FIELDS if getattr(permission, field) != wanted[field]]
+            if changed:
+                for field in changed:
+                    setattr(permission, field, wanted[field])
+                to_update.append(permission)
+                self.stdout.write(self.style.SUCCESS(
+                    f"~ Permission '{name}' will be updated ({', '.join(changed)})"
+                ))
+            else:
+                self.stdout.write(f"= Permission '{name}' is up to date")
+
+        return to_create, to_update
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from apps.main.uploads import UPLOAD_EXPIRY, expire_uploads
+
+
+class Command(BaseCommand):
+    help = "Deletes resumable uploads that were abandoned before completion, with their partial files"
+
+    def handle(self, *args, **options):
+        expired = expire_uploads()
+        self.stdout.write(self.style.SUCCESS(
+            f"Deleted {expired} uploads idle for more than {UPLOAD_EXPIRY} seconds"
+        ))
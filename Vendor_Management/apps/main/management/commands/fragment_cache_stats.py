@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+
+from apps.main.fragments import get_stats, reset_stats, stats_enabled
+
+
+class Command(BaseCommand):
+    help = "Reports hit and miss counters and the render time saved by the template fragment cache"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--reset',
+            action='store_true',
+            help='Clear the counters after reporting them'
+        )
+
+    def handle(self, *args, **options):
+        if not stats_enabled():
+            self.stdout.write(self.style.WARNING('FRAGMENT_CACHE_STATS is off, so nothing new is being counted'))
+        stats = get_stats()
+        if not stats:
+            self.stdout.write('No fragments have been rendered yet')
+
+        for row in stats:
+            self.stdout.write(
+                f"{row['name']}: {row['hits']} hits, {row['misses']} misses "
+                f"({row['hit_ratio']:.0%} hit ratio), {row['average_render_ms']:.2f}ms per render, "
+                f"~{row['saved_ms'] / 1000:.1f}s saved"
+            )
+        total = sum(row['saved_ms'] for row in stats)
+        self.stdout.write(self.style.SUCCESS(f"Fragment cache saved about {total / 1000:.1f}s of rendering"))
+
+        if options['reset']:
+            reset_stats()
+            self.stdout.write(self.style.SUCCESS('Counters reset'))
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+
+from apps.main.images import DEFAULT_PROFILE_IMAGE, ProfileImageError, generate_profile_variants
+from apps.main.models import Profile
+
+
+class Command(BaseCommand):
+    help = "Generates the thumbnail variants of uploaded profile pictures"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            help='Regenerate variants that already exist as well'
+        )
+
+    def handle(self, *args, **options):
+        profiles = Profile.objects.exclude(image='').exclude(image=DEFAULT_PROFILE_IMAGE)
+        generated = 0
+        for profile_id, image, variants in profiles.values_list('pk', 'image', 'image_variants').iterator():
+            if not options['all'] and (variants or {}).get('source') == image:
+                continue
+            try:
+                if generate_profile_variants(profile_id):
+                    generated += 1
+            except (ProfileImageError, OSError) as error:
+                self.stderr.write(f"Profile {profile_id}: {error}")
+
+        self.stdout.write(self.style.SUCCESS(f"Generated images for {generated} profiles"))
@@ -0,0 +1,48 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.main.importers import IMPORTERS, IMPORT_BATCH_SIZE, ImportFileError, read_rows
+
+
+class Command(BaseCommand):
+    help = "Imports vendors or products from a CSV or XLSX file in validated, batched inserts"
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=sorted(IMPORTERS), help='What the file contains')
+        parser.add_argument('path', help='Path to a .csv or .xlsx file with a header row')
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=IMPORT_BATCH_SIZE,
+            help='Rows validated and inserted per transaction'
+        )
+        parser.add_argument(
+            '--created-by',
+            default=None,
+            help='Value stored in created_by on the imported rows'
+        )
+
+    def handle(self, *args, **options):
+        importer = IMPORTERS[options['kind']](
+            batch_size=options['batch_size'],
+            created_by=options['created_by']
+        )
+        started = time.monotonic()
+        try:
+            with open(options['path'], 'rb') as fileobj:
+                result = importer.run(read_rows(fileobj, options['path']))
+        except (OSError, ImportFileError) as error:
+            raise CommandError(str(error))
+        elapsed = time.monotonic() - started
+
+        for error in result.errors:
+            details = '; '.join(
+                f"{field}: {' '.join(messages)}" for field, messages in error['errors'].items()
+            )
+            self.stdout.write(self.style.ERROR(f"Row {error['row']}: {details}"))
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {result.created} of {result.rows} {options['kind']} "
+            f"({len(result.errors)} failed) in {elapsed:.1f}s"
+        ))
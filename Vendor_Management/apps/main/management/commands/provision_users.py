@@ -0,0 +1,49 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.main.importers import IMPORT_BATCH_SIZE, ImportFileError, UserImporter, read_rows
+
+
+class Command(BaseCommand):
+    help = "Creates user accounts and their profiles from a CSV, XLSX or JSON file, hashing passwords in parallel"
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Path to a .csv or .xlsx file with a header row, or a .json list of objects')
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=IMPORT_BATCH_SIZE,
+            help='Users hashed and inserted per transaction'
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=None,
+            help='Processes hashing passwords; defaults to the CPU count, 0 hashes in this process'
+        )
+
+    def handle(self, *args, **options):
+        if options['workers'] is not None and options['workers'] < 0:
+            raise CommandError('--workers cannot be negative')
+        importer = UserImporter(batch_size=options['batch_size'], workers=options['workers'])
+        started = time.monotonic()
+        try:
+            with open(options['path'], 'rb') as fileobj:
+                result = importer.run(read_rows(fileobj, options['path']))
+        except (OSError, ImportFileError) as error:
+            raise CommandError(str(error))
+        elapsed = time.monotonic() - started
+
+        for error in result.errors:
+            details = '; '.join(
+                f"{field}: {' '.join(messages)}" for field, messages in error['errors'].items()
+            )
+            self.stdout.write(self.style.ERROR(f"Row {error['row']}: {details}"))
+
+        rate = result.created / elapsed if elapsed else 0
+        self.stdout.write(self.style.SUCCESS(
+            f"Provisioned {result.created} of {result.rows} users ({len(result.errors)} failed) "
+            f"in {elapsed:.1f}s, {rate:.0f} users/s; hashing took {importer.hashing_time:.1f}s "
+            f"on {importer.workers or 1} process(es)"
+        ))
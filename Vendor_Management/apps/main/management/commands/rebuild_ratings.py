@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from apps.main.fragments import bump_generations
+from apps.main.models import Comment, Product, Vendor
+from apps.main.ratings import rebuild_rating_summaries
+
+
+class Command(BaseCommand):
+    help = "Recomputes the denormalized rating totals on vendors and products from their comments"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Number of rows written per bulk update'
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        for model, field in ((Vendor, 'vendor'), (Product, 'product')):
+            updated = rebuild_rating_summaries(Comment, model, field, batch_size=batch_size)
+            self.stdout.write(self.style.SUCCESS(
+                f"Rebuilt ratings for {updated} {model._meta.verbose_name_plural.lower()} with reviews"
+            ))
+        # rating totals are written without signals
+        bump_generations()
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from apps.main.models import Product, Vendor
+from apps.main.search import get_backend, rebuild_index
+
+
+class Command(BaseCommand):
+    help = "Rebuilds the full-text search index over vendors and products"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Number of documents written per batch'
+        )
+
+    def handle(self, *args, **options):
+        if get_backend() is None:
+            self.stdout.write(self.style.WARNING(
+                "The database has no supported full-text engine; searches use icontains lookups"
+            ))
+            return
+
+        total = rebuild_index([Vendor, Product], batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Indexed {total} documents"))
@@ -0,0 +1,51 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from apps.main.enums import JobStatus
+from apps.main.models import ReportJob
+from apps.main.reports import build_report, requeue_stale_jobs
+
+
+class Command(BaseCommand):
+    help = "Builds pending report jobs, polling for new ones unless --once is given"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Process the pending jobs and exit'
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=2.0,
+            help='Seconds to wait between polls'
+        )
+        parser.add_argument(
+            '--stale-minutes',
+            type=int,
+            default=15,
+            help='Requeue running jobs that started more than this many minutes ago'
+        )
+
+    def handle(self, *args, **options):
+        stale_after = timedelta(minutes=options['stale_minutes'])
+        while True:
+            requeued = requeue_stale_jobs(stale_after)
+            if requeued:
+                self.stdout.write(self.style.WARNING(f"Requeued {requeued} stale report jobs"))
+
+            pending = ReportJob.objects.filter(status=JobStatus.PENDING).order_by('created_at')
+            for job_id in pending.values_list('pk', flat=True):
+                try:
+                    build_report(job_id)
+                except Exception as error:
+                    self.stdout.write(self.style.ERROR(f"Report job {job_id} failed: {error}"))
+                else:
+                    self.stdout.write(self.style.SUCCESS(f"Report job {job_id} processed"))
+
+            if options['once']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,259 @@
+import hashlib
+import itertools
+import random
+import time
+from datetime import timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from apps.main.dashboard import invalidate_dashboard
+from apps.main.fragments import bump_generations
+from apps.main.enums import CloudStatus, UserTypes
+from apps.main.models import Blob, Comment, Document, Product, Profile, User, Vendor
+from apps.main.ratings import rebuild_rating_summaries
+from apps.main.search import get_backend, rebuild_index
+from apps.main.uploads import blob_name
+
+SOFTWARE_TYPES = ['ERP', 'CRM', 'HRIS', 'Payroll', 'Accounting', 'Procurement', 'Analytics', 'Security']
+MODULES = ['Finance', 'Sales', 'Inventory', 'Reporting', 'Compliance', 'Onboarding', 'Billing']
+CLIENT_TYPES = ['Enterprise', 'SME', 'Public Sector', 'Non-profit']
+BUSINESS_AREAS = ['Accounting', 'Operations', 'Human Resources', 'Marketing', 'IT', 'Legal']
+COUNTRIES = ['Kenya', 'Uganda', 'Tanzania', 'Rwanda', 'Nigeria', 'South Africa', 'Ghana']
+WORDS = (
+    'cloud native integrated platform workflow automation reporting secure scalable '
+    'audit ledger invoice payroll dashboard mobile analytics compliance vendor'
+).split()
+
+# how often each star rating is left, 1 to 5
+RATING_WEIGHTS = [5, 10, 20, 35, 30]
+
+SAMPLE_DOCUMENT = b'%PDF-1.4\n1 0 obj << /Type /Catalog >> endobj\ntrailer << /Root 1 0 R >>\n%%EOF\n'
+
+
+def batched(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(itertools.islice(iterator, size)):
+        yield batch
+
+
+class Command(BaseCommand):
+    help = "Generates synthetic users, vendors, products, documents and reviews for load testing"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000, help='Reviewers to create, besides vendor accounts')
+        parser.add_argument('--vendors', type=int, default=100, help='Vendors to create, each with its own user')
+        parser.add_argument('--products', type=int, default=1000, help='Products to spread over the vendors')
+        parser.add_argument('--documents', type=int, default=500, help='Documents to spread over the products')
+        parser.add_argument('--comments', type=int, default=5000, help='Reviews to spread over vendors and products')
+        parser.add_argument(
+            '--distribution',
+            choices=['uniform', 'zipf'],
+            default='zipf',
+            help='How products, documents and reviews are spread over their parents'
+        )
+        parser.add_argument(
+            '--skew',
+            type=float,
+            default=1.1,
+            help='Exponent of the zipf distribution; higher concentrates more rows on fewer parents'
+        )
+        parser.add_argument(
+            '--vendor-review-share',
+            type=float,
+            default=0.3,
+            help='Fraction of reviews left on vendors rather than products'
+        )
+        parser.add_argument('--batch-size', type=int, default=5000, help='Rows inserted per bulk_create')
+        parser.add_argument('--seed', type=int, default=None, help='Random seed, for reproducible data')
+        parser.add_argument('--password', default='password', help='Password of every generated user')
+        parser.add_argument(
+            '--skip-search-index',
+            action='store_true',
+            help='Do not rebuild the full-text search index afterwards'
+        )
+
+    def handle(self, *args, **options):
+        if options['products'] and not options['vendors']:
+            raise CommandError('Products need at least one vendor')
+        if options['documents'] and not options['products']:
+            raise CommandError('Documents need at least one product')
+        if options['comments'] and not (options['users'] or options['vendors']):
+            raise CommandError('Reviews need at least one user')
+
+        self.rng = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        self.distribution = options['distribution']
+        self.skew = options['skew']
+        # prefix for unique fields so the command can be run repeatedly
+        self.run = f'{int(time.time()):x}'
+        self.now = timezone.now()
+        # every generated user shares one hash; hashing per user would dominate
+        self.password = make_password(options['password'])
+
+        started = time.monotonic()
+        reviewer_ids = self.create_users('reviewer', options['users'], UserTypes.NORMAL_USER)
+        vendor_ids, owner_ids = self.create_vendors(options['vendors'])
+        product_ids = self.create_products(vendor_ids, options['products'])
+        self.create_documents(product_ids, options['documents'])
+        self.create_comments(
+            reviewer_ids or owner_ids, vendor_ids, product_ids,
+            options['comments'], options['vendor_review_share']
+        )
+
+        self.report('Rebuilding rating summaries')
+        rebuild_rating_summaries(Comment, Vendor, 'vendor', batch_size=self.batch_size)
+        rebuild_rating_summaries(Comment, Product, 'product', batch_size=self.batch_size)
+        if not options['skip_search_index'] and get_backend() is not None:
+            self.report('Rebuilding the search index')
+            rebuild_index([Vendor, Product], batch_size=self.batch_size)
+        invalidate_dashboard()
+        bump_generations()
+
+        self.stdout.write(self.style.SUCCESS(f"Seeded inventory in {time.monotonic() - started:.1f}s"))
+
+    def report(self, message):
+        self.stdout.write(message)
+
+    def pick(self, population, k):
+        """
+        Draw ``k`` items from ``population`` with replacement, following the
+        configured distribution (zipf favours the start of the population).
+        """
+        if self.distribution == 'uniform':
+            return self.rng.choices(population, k=k)
+        if not hasattr(self, '_weights') or len(self._weights) != len(population):
+            self._weights = list(itertools.accumulate(
+                1 / rank ** self.skew for rank in range(1, len(population) + 1)
+            ))
+        return self.rng.choices(population, cum_weights=self._weights, k=k)
+
+    def words(self, count):
+        return ' '.join(self.rng.choices(WORDS, k=count))
+
+    def insert(self, model, objects):
+        """
+        bulk_create ``objects`` in batches and return the new primary keys.
+        """
+        pks = []
+        for batch in batched(objects, self.batch_size):
+            with transaction.atomic():
+                pks += [obj.pk for obj in model.objects.bulk_create(batch)]
+        return pks
+
+    def create_users(self, kind, count, user_type):
+        if not count:
+            return []
+        users = (
+            User(
+                username=f'{kind}-{self.run}-{i}',
+                email=f'{kind}-{self.run}-{i}@example.com',
+                first_name=kind.title(),
+                last_name=str(i),
+                password=self.password,
+                user_type=user_type,
+            )
+            for i in range(count)
+        )
+        user_ids = self.insert(User, users)
+        # bulk_create skips the post_save signal that creates profiles
+        self.insert(Profile, (Profile(user_id=pk) for pk in user_ids))
+        self.report(f'Created {len(user_ids)} {kind} users')
+        return user_ids
+
+    def create_vendors(self, count):
+        """
+        Create ``count`` vendors, each owned by a new vendor user, and return
+        the vendor ids and the owners' user ids.
+        """
+        user_ids = self.create_users('vendor', count, UserTypes.VENDOR)
+        vendors = (
+            Vendor(
+                user_id=user_id,
+                vendor_name=f'{self.words(2).title()} {i}',
+                description=self.words(20),
+                company_established_on=self.rng.randint(1950, self.now.year),
+                no_of_employees=str(self.rng.choice([10, 50, 200, 1000, 5000])),
+                country=self.rng.choice(COUNTRIES),
+                created_by='seed_inventory',
+            )
+            for i, user_id in enumerate(user_ids)
+        )
+        vendor_ids = self.insert(Vendor, vendors)
+        self.report(f'Created {len(vendor_ids)} vendors')
+        return vendor_ids, user_ids
+
+    def review_date(self):
+        return self.now + timedelta(days=self.rng.randint(-365, 365))
+
+    def create_products(self, vendor_ids, count):
+        if not count:
+            return []
+        products = (
+            Product(
+                vendor_id=vendor_id,
+                name=f'{self.words(2).title()} {i}',
+                description=self.words(30),
+                software_type=self.rng.choice(SOFTWARE_TYPES),
+                module=self.rng.choice(MODULES),
+                client_type=self.rng.choice(CLIENT_TYPES),
+                business_area=self.rng.choice(BUSINESS_AREAS),
+                cloud_status=self.rng.choice(list(CloudStatus)).value,
+                last_review_date=self.review_date() - timedelta(days=365),
+                next_review_date=self.review_date(),
+                internal_professional_services=self.rng.random() < 0.2,
+                created_by='seed_inventory',
+            )
+            for i, vendor_id in enumerate(self.pick(vendor_ids, count))
+        )
+        product_ids = self.insert(Product, products)
+        self.report(f'Created {len(product_ids)} products')
+        return product_ids
+
+    def create_documents(self, product_ids, count):
+        if not count:
+            return
+        # all seeded documents share one content-addressed blob
+        sha256 = hashlib.sha256(SAMPLE_DOCUMENT).hexdigest()
+        blob = Blob.objects.filter(sha256=sha256).first()
+        if blob is None:
+            name = default_storage.save(blob_name(sha256, 'sample.pdf'), ContentFile(SAMPLE_DOCUMENT))
+            blob = Blob.objects.create(sha256=sha256, file=name, size=len(SAMPLE_DOCUMENT))
+
+        targets = self.pick(product_ids, count)
+        documents = (
+            Document(product_id=product_id, document=blob.file.name, blob=blob, created_by='seed_inventory')
+            for product_id in targets
+        )
+        created = len(self.insert(Document, documents))
+        Blob.objects.filter(pk=blob.pk).update(ref_count=F('ref_count') + created)
+        for batch in batched(set(targets), self.batch_size):
+            Product.objects.filter(pk__in=batch).update(document_attached=True)
+        self.report(f'Created {created} documents')
+
+    def create_comments(self, user_ids, vendor_ids, product_ids, count, vendor_share):
+        if not count:
+            return
+        vendor_count = round(count * vendor_share) if vendor_ids else 0
+        if not product_ids:
+            vendor_count = count
+        targets = itertools.chain(
+            (('vendor_id', pk) for pk in self.pick(vendor_ids, vendor_count)),
+            (('product_id', pk) for pk in self.pick(product_ids, count - vendor_count)),
+        )
+        comments = (
+            Comment(**{
+                field: pk,
+                'commented_by_id': self.rng.choice(user_ids),
+                'rating': self.rng.choices(range(1, 6), weights=RATING_WEIGHTS)[0],
+                'content': self.words(self.rng.randint(5, 40)),
+            })
+            for field, pk in targets
+        )
+        created = len(self.insert(Comment, comments))
+        self.report(f'Created {created} reviews')
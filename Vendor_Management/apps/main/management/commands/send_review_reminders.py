@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand
+
+from apps.main.reminders import REVIEW_REMINDER_BATCH_SIZE, REVIEW_REMINDER_LEAD_DAYS, send_review_reminders
+
+
+class Command(BaseCommand):
+    help = "Emails each vendor user a digest of their products whose review became due since the last run"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--lead-days',
+            type=int,
+            default=REVIEW_REMINDER_LEAD_DAYS,
+            help='Include products due within this many days'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=REVIEW_REMINDER_BATCH_SIZE,
+            help='Digests sent per mail connection batch'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Build the digests without sending them or moving the checkpoint'
+        )
+
+    def handle(self, *args, **options):
+        products, digests = send_review_reminders(
+            lead_days=options['lead_days'],
+            batch_size=options['batch_size'],
+            dry_run=options['dry_run']
+        )
+        if options['dry_run']:
+            self.stdout.write(self.style.WARNING("Dry run, no emails were sent"))
+        self.stdout.write(self.style.SUCCESS(
+            f"{products} due products in {digests} reminder digests"
+        ))
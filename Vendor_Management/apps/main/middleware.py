@@ -0,0 +1,164 @@
+import logging
+import re
+import time
+from collections import Counter
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+from apps.main.activity import flush_buffer, start_buffer
+from apps.main.routers import REPLICA_PIN_COOKIE, REPLICA_PIN_SECONDS, finish_routing, get_replicas, start_routing
+
+logger = logging.getLogger('apps.main.queries')
+
+QUERY_STATS_HEADER = 'X-DB-Queries'
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_RE = re.compile(r'\b\d+(?:\.\d+)?\b')
+_IN_LIST_RE = re.compile(r'\(\s*(?:%s|\?)(?:\s*,\s*(?:%s|\?))*\s*\)')
+_SPACE_RE = re.compile(r'\s+')
+
+
+def fingerprint(sql):
+    """
+    Reduce a SQL statement to its shape, so the same query issued with
+    different parameters (an N+1 loop) maps to one fingerprint.
+    """
+    sql = _STRING_RE.sub('?', sql)
+    sql = _NUMBER_RE.sub('?', sql)
+    sql = _IN_LIST_RE.sub('(...)', sql)
+    return _SPACE_RE.sub(' ', sql).strip()
+
+
+def duplicate_fingerprints(statements):
+    counts = Counter(fingerprint(sql) for sql in statements)
+    return {sql: count for sql, count in counts.items() if count > 1}
+
+
+class QueryStats:
+    """
+    Database execute wrapper that counts and times the statements run
+    through it.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.fingerprints = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - start
+            self.count += 1
+            self.fingerprints[fingerprint(sql)] += 1
+
+    @property
+    def duplicates(self):
+        return {sql: count for sql, count in self.fingerprints.items() if count > 1}
+
+    def header(self):
+        return (
+            f'count={self.count}; time={self.duration * 1000:.1f}ms; '
+            f'duplicates={sum(count - 1 for count in self.duplicates.values())}'
+        )
+
+
+class QueryInstrumentationMiddleware:
+    """
+    Records the number of queries, their total time and repeated query
+    shapes for each request, adds them to the response as an
+    ``X-DB-Queries`` header and logs them to ``apps.main.queries`` at debug
+    level. Enabled by QUERY_INSTRUMENTATION, which defaults to DEBUG.
+
+    Queries run while a streaming response is consumed happen after the
+    middleware returns and are not counted.
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'QUERY_INSTRUMENTATION', settings.DEBUG):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        stats = QueryStats()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(stats))
+            response = self.get_response(request)
+
+        request.query_stats = stats
+        response[QUERY_STATS_HEADER] = stats.header()
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug('%s %s: %s', request.method, request.path, stats.header())
+            for sql, count in sorted(stats.duplicates.items(), key=lambda item: -item[1]):
+                logger.debug('  %dx %s', count, sql)
+        return response
+
+
+class ActivityLogMiddleware:
+    """
+    Collects the activity events logged while handling a request and writes
+    them with a single bulk insert once the response is ready, after the
+    view's transactions have committed.
+
+    Enabled by adding ``apps.main.middleware.ActivityLogMiddleware`` to
+    MIDDLEWARE; without it log_activity writes each event on its own.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        token = start_buffer()
+        try:
+            return self.get_response(request)
+        finally:
+            flush_buffer(token)
+
+
+class ReplicaPinMiddleware:
+    """
+    Routes the reads of safe requests to the read replicas through
+    ReplicaRouter. Unsafe requests, and clients holding the pin cookie, read
+    from the primary; a request that wrote sets the cookie for
+    REPLICA_PIN_SECONDS so the client reads its own writes.
+
+    Place it before SessionMiddleware and AuthenticationMiddleware so their
+    reads are routed too. Not used when DATABASE_REPLICAS is empty.
+    """
+
+    def __init__(self, get_response):
+        if not get_replicas():
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        token = start_routing(pinned=request.method not in SAFE_METHODS or self.pinned(request))
+        try:
+            response = self.get_response(request)
+        finally:
+            wrote = finish_routing(token)
+
+        if wrote:
+            response.set_cookie(
+                REPLICA_PIN_COOKIE,
+                str(int(time.time()) + REPLICA_PIN_SECONDS),
+                max_age=REPLICA_PIN_SECONDS,
+                httponly=True,
+                samesite='Lax',
+            )
+        return response
+
+    def pinned(self, request):
+        # a forged value only sends that client's reads to the primary
+        try:
+            return int(request.COOKIES.get(REPLICA_PIN_COOKIE, 0)) > time.time()
+        except ValueError:
+            return False
@@ -0,0 +1,109 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:33
+
+from django.db import migrations, models
+from django.db.models import Count, Q, Sum
+
+RATING_VALUES = range(1, 6)
+
+
+def backfill_rating_summaries(apps, schema_editor):
+    # a frozen copy of apps.main.ratings.rebuild_rating_summaries, so the
+    # migration does not change when that module does
+    db_alias = schema_editor.connection.alias
+    Comment = apps.get_model('main', 'Comment')
+    annotations = {'rating_sum': Sum('rating'), 'rating_count': Count('pk')}
+    for rating in RATING_VALUES:
+        annotations[f'rating_{rating}_count'] = Count('pk', filter=Q(rating=rating))
+
+    for model_name, field in (('Vendor', 'vendor'), ('Product', 'product')):
+        model = apps.get_model('main', model_name)
+        totals = (
+            Comment.objects.using(db_alias)
+            .filter(**{f'{field}__isnull': False})
+            .order_by()
+            .values(field)
+            .annotate(**annotations)
+        )
+        batch = [model(pk=row.pop(field), **row) for row in totals.iterator()]
+        model.objects.using(db_alias).bulk_update(batch, list(annotations), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0005_keyset_pagination_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='rating_1_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_2_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_3_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_4_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_5_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_sum',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='vendor',
+            name='rating_1_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='vendor',
+            name='rating_2_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='vendor',
+            name='rating_3_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='vendor',
+            name='rating_4_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='vendor',
+            name='rating_5_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='vendor',
+            name='rating_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='vendor',
+            name='rating_sum',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_rating_summaries, migrations.RunPython.noop),
+    ]
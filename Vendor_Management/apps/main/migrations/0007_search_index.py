@@ -0,0 +1,91 @@
+from django.db import migrations
+
+# A frozen copy of the index layout in apps.main.search at the time of this
+# migration, so it does not change when that module does.
+SEARCH_TABLE = 'search_index'
+SEARCH_LANGUAGE = 'english'
+
+# model, object type, rowid code, title field, body fields
+SEARCHABLE_MODELS = [
+    ('Vendor', 'vendor', 1, 'vendor_name', ['description']),
+    ('Product', 'product', 2, 'name', ['description', 'additional_information', 'software_type', 'module', 'business_area']),
+]
+
+CREATE_INDEX = {
+    'sqlite': [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_TABLE} USING fts5("
+        "title, body, object_type UNINDEXED, object_id UNINDEXED, "
+        "tokenize = 'porter unicode61')",
+    ],
+    'postgresql': [
+        f"CREATE TABLE IF NOT EXISTS {SEARCH_TABLE} ("
+        "object_type varchar(20) NOT NULL, "
+        "object_id bigint NOT NULL, "
+        "title text NOT NULL, "
+        "body text NOT NULL, "
+        "document tsvector NOT NULL, "
+        "PRIMARY KEY (object_type, object_id))",
+        f"CREATE INDEX IF NOT EXISTS {SEARCH_TABLE}_document_idx "
+        f"ON {SEARCH_TABLE} USING GIN (document)",
+    ],
+}
+
+INSERT_DOCUMENT = {
+    'sqlite': (
+        f"INSERT INTO {SEARCH_TABLE} (rowid, title, body, object_type, object_id) "
+        "VALUES (%s, %s, %s, %s, %s)"
+    ),
+    'postgresql': (
+        f"INSERT INTO {SEARCH_TABLE} (object_type, object_id, title, body, document) "
+        "VALUES (%s, %s, %s, %s, "
+        "setweight(to_tsvector(%s, %s), 'A') || setweight(to_tsvector(%s, %s), 'B'))"
+    ),
+}
+
+
+def _document_params(vendor, object_type, code, pk, title, body):
+    if vendor == 'sqlite':
+        return (pk * 8 + code, title, body, object_type, pk)
+    return (object_type, pk, title, body, SEARCH_LANGUAGE, title, SEARCH_LANGUAGE, body)
+
+
+def create_search_index(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor not in CREATE_INDEX:
+        return
+    with connection.cursor() as cursor:
+        for statement in CREATE_INDEX[connection.vendor]:
+            cursor.execute(statement)
+        cursor.execute(f"DELETE FROM {SEARCH_TABLE}")
+
+        for model_name, object_type, code, title_field, body_fields in SEARCHABLE_MODELS:
+            rows = apps.get_model('main', model_name)._base_manager.using(connection.alias).order_by().values_list(
+                'pk', title_field, *body_fields
+            )
+            params = []
+            for pk, title, *body in rows.iterator(chunk_size=500):
+                body = '\n'.join(str(value) for value in body if value)
+                params.append(_document_params(connection.vendor, object_type, code, pk, title or '', body))
+                if len(params) >= 500:
+                    cursor.executemany(INSERT_DOCUMENT[connection.vendor], params)
+                    params = []
+            if params:
+                cursor.executemany(INSERT_DOCUMENT[connection.vendor], params)
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor not in CREATE_INDEX:
+        return
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(f"DROP TABLE IF EXISTS {SEARCH_TABLE}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0006_rating_summaries'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
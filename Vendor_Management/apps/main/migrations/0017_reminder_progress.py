@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-18 04:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0016_document_upload'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='remindercheckpoint',
+            name='claimed_until',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='remindercheckpoint',
+            name='pending_after_user',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='remindercheckpoint',
+            name='pending_due_until',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='remindercheckpoint',
+            name='pending_since',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
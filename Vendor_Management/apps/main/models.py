@@ -1,15 +1,54 @@
+import uuid
+
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.utils import timezone
-from .enums import CloudStatus, UserTypes, PermissionCategories
+from .enums import ActivityVerb, CloudStatus, UserTypes, PermissionCategories, JobStatus
 
 from django.contrib.auth.base_user import AbstractBaseUser
 from django.contrib.auth.models import PermissionsMixin, Permission
+from django.contrib.contenttypes.models import ContentType
 from django.db import models
 
 from apps.main.managers import UserManager
 
 
-class User(AbstractBaseUser, PermissionsMixin):
+class DirtyFieldsMixin:
+    """
+    Remembers the field values an instance was loaded or last saved with,
+    so callers can tell which fields changed and skip redundant writes.
+    """
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        deferred = self.get_deferred_fields()
+        self._loaded_values = {
+            field.attname: getattr(self, field.attname)
+            for field in self._meta.concrete_fields
+            if field.attname not in deferred
+        }
+
+    def get_dirty_fields(self):
+        """
+        Return the names of the concrete fields changed since the instance
+        was loaded or saved; every field is dirty on an unsaved instance.
+        """
+        loaded = getattr(self, '_loaded_values', None)
+        if loaded is None:
+            return [field.name for field in self._meta.concrete_fields]
+        return [
+            field.name
+            for field in self._meta.concrete_fields
+            if field.attname in loaded and getattr(self, field.attname) != loaded[field.attname]
+        ]
+
+
+class User(DirtyFieldsMixin, AbstractBaseUser, PermissionsMixin):
     """
     Custom user model.
     """
@@ -47,6 +86,11 @@ class User(AbstractBaseUser, PermissionsMixin):
     USERNAME_FIELD = 'username'
     REQUIRED_FIELDS = ['email']
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['-date_joined', '-id'], name='users_date_joined_id_idx'),
+        ]
+
     def get_full_name(self):
         return f'{self.first_name} {self.last_name}'
 
@@ -57,10 +101,12 @@ class User(AbstractBaseUser, PermissionsMixin):
         return self.email
 
 
-class Profile(models.Model):
+class Profile(DirtyFieldsMixin, models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name="profile")
     bio = models.TextField(blank=True, null=True)
     image = models.ImageField(upload_to='users/images', default='users/images/avatar.png')
+    # thumbnails of ``image`` keyed by variant and format, see apps.main.images
+    image_variants = models.JSONField(default=dict, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -104,7 +150,34 @@ class BaseModel(models.Model):
         abstract = True
 
 
-class Vendor(BaseModel):
+class RatingSummary(models.Model):
+    """
+    Running totals of the ratings left in comments, kept up to date by the
+    comment signals so detail pages do not have to aggregate the comments.
+    """
+    rating_sum = models.PositiveIntegerField(default=0)
+    rating_count = models.PositiveIntegerField(default=0)
+    rating_1_count = models.PositiveIntegerField(default=0)
+    rating_2_count = models.PositiveIntegerField(default=0)
+    rating_3_count = models.PositiveIntegerField(default=0)
+    rating_4_count = models.PositiveIntegerField(default=0)
+    rating_5_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        abstract = True
+
+    @property
+    def average_rating(self):
+        if not self.rating_count:
+            return None
+        return self.rating_sum / self.rating_count
+
+    @property
+    def rating_histogram(self):
+        return {rating: getattr(self, f'rating_{rating}_count') for rating in range(1, 6)}
+
+
+class Vendor(BaseModel, RatingSummary):
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name="vendor")
     description = models.TextField(blank=True, null=True)
     vendor_name = models.CharField(max_length=255)
@@ -123,12 +196,15 @@ class Vendor(BaseModel):
         verbose_name = "Vendor"
         verbose_name_plural = "Vendors"
         ordering = ["-created_at"]
+        indexes = [
+            models.Index(fields=['-created_at', '-id'], name='vendors_created_at_id_idx'),
+        ]
 
     def __str__(self):
         return self.vendor_name
 
 
-class Product(BaseModel):
+class Product(BaseModel, RatingSummary):
     vendor = models.ForeignKey(Vendor, on_delete=models.CASCADE, related_name='products')
     name = models.CharField(max_length=255)
     software_type = models.CharField(max_length=255)
@@ -149,26 +225,96 @@ class Product(BaseModel):
         verbose_name = "Product"
         verbose_name_plural = "Products"
         ordering = ["-created_at"]
+        indexes = [
+            models.Index(fields=['-created_at', '-id'], name='products_created_at_id_idx'),
+            # range scans for review reminders, see apps.main.reminders
+            models.Index(fields=['next_review_date', 'vendor'], name='products_next_review_idx'),
+            models.Index(fields=['updated_at'], name='products_updated_at_idx'),
+            models.Index(fields=['vendor', '-updated_at'], name='products_vendor_updated_idx'),
+            # faceted browsing, see apps.main.filters: the leading column
+            # serves the filter and the facet's GROUP BY, the trailing
+            # created_at the keyset order of the filtered page
+            models.Index(fields=['vendor', '-created_at', '-id'], name='products_vendor_created_idx'),
+            models.Index(fields=['cloud_status', 'business_area', '-created_at'], name='products_cloud_area_idx'),
+            models.Index(fields=['business_area', 'software_type'], name='products_area_type_idx'),
+            models.Index(fields=['software_type', 'module'], name='products_type_module_idx'),
+            models.Index(fields=['client_type', 'cloud_status'], name='products_client_cloud_idx'),
+            models.Index(fields=['module'], name='products_module_idx'),
+            models.Index(fields=['last_review_date'], name='products_last_review_idx'),
+        ]
 
     def __str__(self):
         return self.name
 
 
-class Document(BaseModel):
+class Blob(models.Model):
+    """
+    A stored file addressed by the SHA-256 of its content. Documents with
+    identical content share one blob, which is deleted with its last document.
+    """
+    sha256 = models.CharField(max_length=64, unique=True)
+    file = models.FileField(upload_to="blobs", max_length=250)
+    size = models.PositiveBigIntegerField()
+    ref_count = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = "blobs"
+        verbose_name = "Blob"
+        verbose_name_plural = "Blobs"
+
+    def __str__(self):
+        return self.sha256
+
+
+class UploadSession(models.Model):
+    """
+    A resumable upload whose chunks are appended to a partial file until
+    ``received`` reaches ``size``.
+    """
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='upload_sessions')
+    filename = models.CharField(max_length=255)
+    size = models.PositiveBigIntegerField()
+    received = models.PositiveBigIntegerField(default=0)
+    blob = models.ForeignKey(Blob, on_delete=models.SET_NULL, blank=True, null=True, related_name='+')
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    completed_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        db_table = "upload_sessions"
+        verbose_name = "Upload Session"
+        verbose_name_plural = "Upload Sessions"
+        ordering = ["-created_at"]
+
+    def __str__(self):
+        return f"{self.filename} ({self.received}/{self.size})"
+
+
+class Document(DirtyFieldsMixin, BaseModel):
     product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='documents')
     document = models.FileField(upload_to="products/documents/%Y-%m-%d", blank=True, max_length=250)
+    blob = models.ForeignKey(Blob, on_delete=models.PROTECT, blank=True, null=True, related_name='documents')
+    # the resumable upload the document was attached from, see apps.main.uploads
+    upload = models.ForeignKey(
+        UploadSession, on_delete=models.SET_NULL, blank=True, null=True, related_name='documents'
+    )
 
     class Meta:
         db_table = "documents"
         verbose_name = "Document"
         verbose_name_plural = "Documents"
         ordering = ["-created_at"]
+        indexes = [
+            models.Index(fields=['-created_at', '-id'], name='documents_created_at_id_idx'),
+        ]
 
     def __str__(self):
         return f"{self.product.name} - {self.document}"
 
 
-class Comment(models.Model):
+class Comment(DirtyFieldsMixin, models.Model):
     commented_by = models.ForeignKey(User, on_delete=models.CASCADE, related_name='comments')
     vendor = models.ForeignKey(Vendor, on_delete=models.CASCADE, blank=True, null=True)
     product = models.ForeignKey(Product, on_delete=models.CASCADE, blank=True, null=True)
@@ -180,6 +326,12 @@ class Comment(models.Model):
         verbose_name = "Comment"
         verbose_name_plural = "Comments"
         ordering = ["-timestamp"]
+        indexes = [
+            models.Index(fields=['-timestamp', '-id'], name='comments_timestamp_id_idx'),
+            # newest reviews of a vendor or product, see apps.main.conditional
+            models.Index(fields=['vendor', '-timestamp'], name='comments_vendor_timestamp_idx'),
+            models.Index(fields=['product', '-timestamp'], name='comments_product_timestamp_idx'),
+        ]
 
     def __str__(self):
         if self.vendor:
@@ -188,3 +340,102 @@ class Comment(models.Model):
             return f"Comment on {self.product.name} - {self.timestamp}"
         else:
             return "Orphan Comment"
+
+
+class ActivityEvent(models.Model):
+    """
+    One entry of the append-only activity log. Rows are only ever inserted,
+    in bulk by apps.main.activity; the actor's username and the object's
+    description are copied so entries survive the rows they refer to.
+    """
+    actor = models.ForeignKey(User, on_delete=models.SET_NULL, blank=True, null=True, related_name='+')
+    actor_username = models.CharField(max_length=150, blank=True)
+    verb = models.CharField(max_length=20, choices=ActivityVerb.choices)
+    content_type = models.ForeignKey(ContentType, on_delete=models.CASCADE, related_name='+')
+    object_id = models.CharField(max_length=64)
+    object_repr = models.CharField(max_length=255)
+    changes = models.JSONField(default=dict, blank=True)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        db_table = "activity_events"
+        verbose_name = "Activity Event"
+        verbose_name_plural = "Activity Events"
+        ordering = ["-created_at", "-id"]
+        indexes = [
+            models.Index(fields=['-created_at', '-id'], name='activity_created_at_id_idx'),
+            models.Index(fields=['actor', '-created_at'], name='activity_actor_idx'),
+            models.Index(fields=['content_type', 'object_id', '-created_at'], name='activity_object_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.actor_username or 'system'} {self.verb} {self.object_repr}"
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            raise ValueError("Activity events cannot be changed")
+        super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        raise ValueError("Activity events cannot be deleted")
+
+
+class ReminderCheckpoint(models.Model):
+    """
+    How far a periodic reminder job has got, so each run only looks at rows
+    that became due since the previous one. The pending fields track a run
+    that has not sent every digest yet, so the next run resumes it.
+    """
+    name = models.CharField(max_length=100, unique=True)
+    due_until = models.DateTimeField(blank=True, null=True)
+    last_run_at = models.DateTimeField(blank=True, null=True)
+    last_notified = models.PositiveIntegerField(default=0)
+    pending_due_until = models.DateTimeField(blank=True, null=True)
+    pending_since = models.DateTimeField(blank=True, null=True)
+    # the last vendor user whose digest the pending run has sent
+    pending_after_user = models.BigIntegerField(blank=True, null=True)
+    claimed_until = models.DateTimeField(blank=True, null=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = "reminder_checkpoints"
+        verbose_name = "Reminder Checkpoint"
+        verbose_name_plural = "Reminder Checkpoints"
+
+    def __str__(self):
+        return f"{self.name} (due until {self.due_until})"
+
+
+class ReportJob(models.Model):
+    """
+    A generated report artifact, built once per version of the data it
+    covers and reused until that data changes.
+    """
+    report = models.CharField(max_length=50)
+    data_version = models.CharField(max_length=64)
+    status = models.CharField(
+        max_length=20,
+        choices=JobStatus.choices,
+        default=JobStatus.PENDING
+    )
+    file = models.FileField(upload_to="reports/%Y-%m-%d", blank=True, max_length=250)
+    error = models.TextField(blank=True, null=True)
+    requested_by = models.CharField(max_length=255, blank=True, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(blank=True, null=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        db_table = "report_jobs"
+        verbose_name = "Report Job"
+        verbose_name_plural = "Report Jobs"
+        ordering = ["-created_at"]
+        constraints = [
+            models.UniqueConstraint(fields=['report', 'data_version'], name='unique_report_data_version'),
+        ]
+        indexes = [
+            models.Index(fields=['status', 'created_at'], name='report_jobs_status_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.report} ({self.data_version[:12]}) - {self.status}"
@@ -0,0 +1,116 @@
+import base64
+import binascii
+import json
+from datetime import datetime
+
+from django.conf import settings
+from django.db.models import Q
+
+DEFAULT_PAGE_SIZE = getattr(settings, 'PAGINATION_PAGE_SIZE', 25)
+MAX_PAGE_SIZE = getattr(settings, 'PAGINATION_MAX_PAGE_SIZE', 100)
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+class KeysetPage:
+    """
+    One page of a keyset-paginated queryset.
+
+    ``next_cursor``/``previous_cursor`` are opaque tokens to pass back as the
+    ``after``/``before`` query parameters; ``count`` is only populated when the
+    caller asked for the total.
+    """
+
+    def __init__(self, object_list, next_cursor=None, previous_cursor=None, count=None, page_size=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+        self.count = count
+        self.page_size = page_size
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+
+def encode_cursor(value, pk):
+    payload = json.dumps([value.isoformat(), pk], separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        value, pk = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return datetime.fromisoformat(value), int(pk)
+    except (binascii.Error, UnicodeDecodeError, TypeError, ValueError) as error:
+        raise InvalidCursor('Invalid pagination cursor') from error
+
+
+def get_page_size(request, default=DEFAULT_PAGE_SIZE):
+    try:
+        page_size = int(request.GET.get('page_size', default))
+    except (TypeError, ValueError):
+        page_size = default
+    return max(1, min(page_size, MAX_PAGE_SIZE))
+
+
+def paginate_keyset(queryset, request, field='created_at', page_size=None):
+    """
+    Paginate ``queryset`` newest first on ``(field, pk)`` without OFFSET.
+
+    Each page is a single indexed range scan that fetches one extra row to
+    detect whether another page follows, so its cost does not depend on how
+    deep the page is. The total is only counted when ``?count=1`` is passed.
+    """
+    page_size = page_size or get_page_size(request)
+    after = request.GET.get('after')
+    before = request.GET.get('before')
+
+    ordering = (f'-{field}', '-pk')
+    if before:
+        value, pk = decode_cursor(before)
+        rows = queryset.filter(
+            Q(**{f'{field}__gt': value}) | Q(**{field: value, 'pk__gt': pk})
+        ).order_by(field, 'pk')
+    elif after:
+        value, pk = decode_cursor(after)
+        rows = queryset.filter(
+            Q(**{f'{field}__lt': value}) | Q(**{field: value, 'pk__lt': pk})
+        ).order_by(*ordering)
+    else:
+        rows = queryset.order_by(*ordering)
+
+    object_list = list(rows[:page_size + 1])
+    has_more = len(object_list) > page_size
+    object_list = object_list[:page_size]
+    if before:
+        object_list.reverse()
+
+    def cursor(obj):
+        # rows read with .values('pk', field, ...) work as well as instances
+        if isinstance(obj, dict):
+            return encode_cursor(obj[field], obj['pk'])
+        return encode_cursor(getattr(obj, field), obj.pk)
+
+    next_cursor = previous_cursor = None
+    if object_list:
+        if has_more or before:
+            next_cursor = cursor(object_list[-1])
+        if (has_more and before) or after:
+            previous_cursor = cursor(object_list[0])
+
+    count = queryset.count() if request.GET.get('count') == '1' else None
+    return KeysetPage(object_list, next_cursor, previous_cursor, count, page_size)
@@ -0,0 +1,120 @@
+from functools import partial
+
+from django.contrib.auth.models import Permission
+from django.db import transaction
+from django.db.models import Q
+
+from apps.main.models import User
+from apps.main.permission_cache import bump_user_versions
+
+MAX_OPERATIONS = 1000
+
+GRANT = 'grant'
+REVOKE = 'revoke'
+
+
+def _parse_operation(operation):
+    if not isinstance(operation, dict):
+        raise ValueError('Each operation must be an object')
+    try:
+        user_id = int(operation['user_id'])
+        permission_id = int(operation['permission_id'])
+    except (KeyError, TypeError, ValueError):
+        raise ValueError('user_id and permission_id must be integers')
+
+    action = operation.get('action')
+    if action is None and 'checked' in operation:
+        # same shape as the single-toggle endpoint
+        action = GRANT if operation['checked'] in (True, 'true') else REVOKE
+    if action not in (GRANT, REVOKE):
+        raise ValueError('action must be "grant" or "revoke"')
+    return user_id, permission_id, action
+
+
+def apply_permission_operations(operations):
+    """
+    Apply a list of grant/revoke operations on users' direct permissions in
+    one transaction and return one result per operation.
+
+    Operations are replayed in order against the current assignments, so
+    later operations on the same pair win, and only the net difference is
+    written: one bulk insert and one delete on the through table.
+    """
+    parsed = []
+    for operation in operations:
+        try:
+            parsed.append(_parse_operation(operation))
+        except ValueError as error:
+            parsed.append(error)
+
+    valid = [operation for operation in parsed if not isinstance(operation, ValueError)]
+    user_ids = {user_id for user_id, _, _ in valid}
+    permission_ids = {permission_id for _, permission_id, _ in valid}
+
+    through = User.user_permissions.through
+    with transaction.atomic():
+        known_users = set(User.objects.filter(pk__in=user_ids).values_list('pk', flat=True))
+        known_permissions = set(
+            Permission.objects.filter(pk__in=permission_ids).values_list('pk', flat=True)
+        )
+        existing = set(
+            through.objects.select_for_update().filter(
+                user_id__in=known_users,
+                permission_id__in=known_permissions
+            ).values_list('user_id', 'permission_id')
+        )
+
+        assigned = set(existing)
+        results = []
+        for index, operation in enumerate(parsed):
+            if isinstance(operation, ValueError):
+                results.append({'index': index, 'status': 'error', 'error': str(operation)})
+                continue
+
+            user_id, permission_id, action = operation
+            result = {
+                'index': index,
+                'user_id': user_id,
+                'permission_id': permission_id,
+                'action': action,
+            }
+            pair = (user_id, permission_id)
+            if user_id not in known_users:
+                result.update(status='error', error='User not found')
+            elif permission_id not in known_permissions:
+                result.update(status='error', error='Permission not found')
+            elif action == GRANT:
+                result['status'] = 'unchanged' if pair in assigned else 'granted'
+                assigned.add(pair)
+            else:
+                result['status'] = 'revoked' if pair in assigned else 'unchanged'
+                assigned.discard(pair)
+            results.append(result)
+
+        to_add = assigned - existing
+        to_remove = existing - assigned
+
+        if to_add:
+            through.objects.bulk_create(
+                [through(user_id=user_id, permission_id=permission_id) for user_id, permission_id in to_add],
+                ignore_conflicts=True
+            )
+        if to_remove:
+            removals = {}
+            for user_id, permission_id in to_remove:
+                removals.setdefault(user_id, []).append(permission_id)
+            condition = Q()
+            for user_id, user_permission_ids in removals.items():
+                condition |= Q(user_id=user_id, permission_id__in=user_permission_ids)
+            through.objects.filter(condition).delete()
+
+        # bulk writes on the through table do not send m2m_changed
+        changed_users = {user_id for user_id, _ in to_add | to_remove}
+        if changed_users:
+            transaction.on_commit(partial(bump_user_versions, changed_users))
+
+    return {
+        'results': results,
+        'granted': len(to_add),
+        'revoked': len(to_remove),
+    }
@@ -0,0 +1,117 @@
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import Permission
+from django.core.cache import cache
+
+from apps.main.models import Permissions, User
+from apps.main.routers import use_primary
+
+# Entries are invalidated by version bumps; the timeout only evicts stale
+# versions nobody reads any more.
+PERMISSION_CACHE_TIMEOUT = getattr(settings, 'PERMISSION_CACHE_TIMEOUT', 60 * 60 * 24)
+
+CATALOG_VERSION_KEY = 'permissions:catalog:version'
+
+
+def _user_version_key(user_id):
+    return f'permissions:user:{user_id}:version'
+
+
+def _bump(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, time.time_ns(), None)
+
+
+def bump_user_versions(user_ids):
+    """
+    Invalidate the cached permission sets of the given users.
+    """
+    for user_id in user_ids:
+        _bump(_user_version_key(user_id))
+
+
+def bump_catalog_version():
+    """
+    Invalidate the cached permission catalog and, with it, every user's
+    cached permission set.
+    """
+    _bump(CATALOG_VERSION_KEY)
+
+
+def _get_versions(*keys):
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            # A missing version key starts from a fresh value so entries
+            # cached under an evicted version are never read again.
+            cache.add(key, time.time_ns(), None)
+            versions[key] = cache.get(key)
+    return [versions[key] for key in keys]
+
+
+def _get_or_set(key, compute):
+    value = cache.get(key)
+    if value is None:
+        with use_primary():
+            value = compute()
+        cache.set(key, value, PERMISSION_CACHE_TIMEOUT)
+    return value
+
+
+def get_permission_catalog():
+    """
+    Return ``{permission id: "app_label.codename"}`` for every permission.
+    """
+    version, = _get_versions(CATALOG_VERSION_KEY)
+    return _get_or_set(
+        f'permissions:catalog:{version}:codenames',
+        lambda: {
+            pk: f'{app_label}.{codename}'
+            for pk, app_label, codename in Permission.objects.values_list(
+                'pk', 'content_type__app_label', 'codename'
+            )
+        }
+    )
+
+
+def get_managed_permissions():
+    """
+    Return the list of custom ``Permissions`` shown in the permission matrix.
+    """
+    version, = _get_versions(CATALOG_VERSION_KEY)
+    return _get_or_set(
+        f'permissions:catalog:{version}:managed',
+        lambda: list(Permissions.objects.all())
+    )
+
+
+def get_user_permission_ids(user_id):
+    """
+    Return ``(direct, group)`` frozensets of the permission ids held by a user
+    directly and through their groups.
+    """
+    catalog_version, user_version = _get_versions(CATALOG_VERSION_KEY, _user_version_key(user_id))
+
+    def compute():
+        direct = User.user_permissions.through.objects.filter(
+            user_id=user_id
+        ).values_list('permission_id', flat=True)
+        group = Permission.objects.filter(group__user=user_id).values_list('pk', flat=True)
+        return frozenset(direct), frozenset(group)
+
+    return _get_or_set(f'permissions:user:{user_id}:{catalog_version}:{user_version}', compute)
+
+
+def get_user_permission_codenames(user_id):
+    """
+    Return ``(direct, group)`` frozensets of "app_label.codename" strings.
+    """
+    catalog = get_permission_catalog()
+    direct, group = get_user_permission_ids(user_id)
+    return (
+        frozenset(catalog[pk] for pk in direct if pk in catalog),
+        frozenset(catalog[pk] for pk in group if pk in catalog),
+    )
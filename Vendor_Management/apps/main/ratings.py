@@ -0,0 +1,72 @@
+from django.db import transaction
+from django.db.models import Count, F, Q, Sum
+
+RATING_VALUES = range(1, 6)
+
+RATING_SUMMARY_FIELDS = ['rating_sum', 'rating_count'] + [
+    f'rating_{rating}_count' for rating in RATING_VALUES
+]
+
+# the comment columns a rating summary depends on
+RATED_COMMENT_FIELDS = ('rating', 'vendor_id', 'product_id')
+
+
+def apply_comment_rating(comment, sign):
+    """
+    Add (``sign=1``) or remove (``sign=-1``) a comment's rating from the
+    summary of the vendor or product it was left on, as a single UPDATE.
+    """
+    rating = int(comment.rating)
+    updates = {
+        'rating_sum': F('rating_sum') + sign * rating,
+        'rating_count': F('rating_count') + sign,
+    }
+    if rating in RATING_VALUES:
+        field = f'rating_{rating}_count'
+        updates[field] = F(field) + sign
+
+    vendor_model = comment._meta.get_field('vendor').related_model
+    product_model = comment._meta.get_field('product').related_model
+    if comment.vendor_id:
+        vendor_model.objects.filter(pk=comment.vendor_id).update(**updates)
+    if comment.product_id:
+        product_model.objects.filter(pk=comment.product_id).update(**updates)
+
+
+def rebuild_rating_summaries(comment_model, target_model, target_field, batch_size=1000):
+    """
+    Recompute the rating summary of every ``target_model`` row from
+    ``comment_model`` with one grouped aggregate and batched bulk updates.
+    """
+    annotations = {
+        'rating_sum': Sum('rating'),
+        'rating_count': Count('pk'),
+    }
+    for rating in RATING_VALUES:
+        annotations[f'rating_{rating}_count'] = Count('pk', filter=Q(rating=rating))
+
+    totals = (
+        comment_model.objects
+        .filter(**{f'{target_field}__isnull': False})
+        .order_by()
+        .values(target_field)
+        .annotate(**annotations)
+    )
+
+    with transaction.atomic():
+        target_model.objects.update(**{field: 0 for field in RATING_SUMMARY_FIELDS})
+
+        batch = []
+        updated = 0
+        for row in totals.iterator():
+            batch.append(target_model(
+                pk=row[target_field],
+                **{field: row[field] for field in RATING_SUMMARY_FIELDS}
+            ))
+            if len(batch) >= batch_size:
+                updated += target_model.objects.bulk_update(batch, RATING_SUMMARY_FIELDS)
+                batch = []
+        if batch:
+            updated += target_model.objects.bulk_update(batch, RATING_SUMMARY_FIELDS)
+
+    return updated
@@ -0,0 +1,178 @@
+import itertools
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.db.models import F, Q
+from django.template.loader import render_to_string
+from django.utils import timezone
+
+from apps.main.models import Product, ReminderCheckpoint
+
+REVIEW_REMINDER_CHECKPOINT = 'review_reminders'
+# products due within this many days are included in a digest
+REVIEW_REMINDER_LEAD_DAYS = getattr(settings, 'REVIEW_REMINDER_LEAD_DAYS', 7)
+REVIEW_REMINDER_BATCH_SIZE = getattr(settings, 'REVIEW_REMINDER_BATCH_SIZE', 100)
+REVIEW_REMINDER_FROM_EMAIL = getattr(settings, 'REVIEW_REMINDER_FROM_EMAIL', None)
+# how long a run may hold the checkpoint before another run can take over
+REVIEW_REMINDER_CLAIM_SECONDS = getattr(settings, 'REVIEW_REMINDER_CLAIM_SECONDS', 3600)
+
+DUE_PRODUCT_FIELDS = [
+    'pk', 'name', 'next_review_date', 'vendor_id',
+    'vendor__vendor_name', 'vendor__user_id', 'vendor__user__email', 'vendor__user__username',
+]
+
+
+def due_products(due_after, due_until, changed_since=None):
+    """
+    Products whose next review falls in (``due_after``, ``due_until``], read
+    as an index range scan ordered by vendor user so digests can be built
+    while streaming. Products edited since ``changed_since`` whose review
+    date was moved behind ``due_after`` are included too, so they are not
+    skipped by the checkpoint.
+    """
+    window = Q(next_review_date__lte=due_until)
+    if due_after is not None:
+        window &= Q(next_review_date__gt=due_after)
+        if changed_since is not None:
+            window |= Q(updated_at__gt=changed_since, next_review_date__lte=due_after)
+
+    return (
+        Product.objects.filter(window)
+        .exclude(vendor__user__email='')
+        .order_by('vendor__user_id', 'next_review_date', 'pk')
+        .values(*DUE_PRODUCT_FIELDS)
+    )
+
+
+def build_digest(rows, now, from_email=REVIEW_REMINDER_FROM_EMAIL):
+    """
+    Build one reminder email for the due products of a single vendor user.
+    """
+    first = rows[0]
+    products = [
+        {
+            'name': row['name'],
+            'vendor_name': row['vendor__vendor_name'],
+            'next_review_date': row['next_review_date'],
+            'overdue': row['next_review_date'] <= now,
+        }
+        for row in rows
+    ]
+    context = {
+        'username': first['vendor__user__username'],
+        'products': products,
+        'overdue_count': sum(product['overdue'] for product in products),
+    }
+    subject = f"{len(products)} product review{'s' if len(products) != 1 else ''} due"
+    return EmailMessage(
+        subject=subject,
+        body=render_to_string('emails/review_reminder_digest.txt', context),
+        from_email=from_email,
+        to=[first['vendor__user__email']],
+    )
+
+
+def send_review_reminders(now=None, lead_days=None, batch_size=None, dry_run=False):
+    """
+    Send one digest per vendor user covering the products that became due
+    since the previous run and move the checkpoint forward. Returns
+    ``(products, digests)``.
+
+    The run claims the checkpoint for REVIEW_REMINDER_CLAIM_SECONDS, so an
+    overlapping run returns without sending anything. Digests are built
+    while streaming the due products and sent in batches; after each batch
+    the last vendor user sent is recorded on the checkpoint. A run that fails
+    part way leaves the rest of its window pending and the next run resumes
+    after that user, so every digest is delivered at least once and only a
+    batch interrupted mid-send can go out twice.
+    """
+    now = now or timezone.now()
+    lead_days = REVIEW_REMINDER_LEAD_DAYS if lead_days is None else lead_days
+    batch_size = batch_size or REVIEW_REMINDER_BATCH_SIZE
+
+    checkpoint = _claim_checkpoint(now, now + timedelta(days=lead_days), dry_run)
+    if checkpoint is None:
+        return 0, 0
+
+    rows = due_products(checkpoint.due_until, checkpoint.pending_due_until, checkpoint.last_run_at)
+    if checkpoint.pending_after_user is not None:
+        rows = rows.filter(vendor__user_id__gt=checkpoint.pending_after_user)
+
+    connection = get_connection(fail_silently=False)
+    products = digests = 0
+    try:
+        batch, batch_products = [], 0
+        for user_id, user_rows in itertools.groupby(
+            rows.iterator(chunk_size=2000), key=lambda row: row['vendor__user_id']
+        ):
+            user_rows = list(user_rows)
+            batch.append(build_digest(user_rows, now))
+            batch_products += len(user_rows)
+            if len(batch) >= batch_size:
+                digests += _send(connection, batch, dry_run)
+                products += batch_products
+                _record_progress(checkpoint, user_id, batch_products, dry_run)
+                batch, batch_products = [], 0
+        if batch:
+            digests += _send(connection, batch, dry_run)
+            products += batch_products
+            _record_progress(checkpoint, user_id, batch_products, dry_run)
+        _finish_run(checkpoint, dry_run)
+    finally:
+        if not dry_run:
+            ReminderCheckpoint.objects.filter(pk=checkpoint.pk).update(claimed_until=None)
+    return products, digests
+
+
+def _claim_checkpoint(now, due_until, dry_run):
+    """
+    Lock the checkpoint row, pick the window to send (the pending one of an
+    unfinished run, or a new one up to ``due_until``) and claim it. Returns
+    None when another run holds the claim or nothing new is due.
+    """
+    with transaction.atomic():
+        checkpoint, _ = ReminderCheckpoint.objects.get_or_create(name=REVIEW_REMINDER_CHECKPOINT)
+        checkpoint = ReminderCheckpoint.objects.select_for_update().get(pk=checkpoint.pk)
+        if checkpoint.claimed_until and checkpoint.claimed_until > timezone.now():
+            return None
+        if checkpoint.pending_due_until is None:
+            if checkpoint.due_until and checkpoint.due_until >= due_until:
+                return None
+            checkpoint.pending_due_until = due_until
+            checkpoint.pending_since = now
+            checkpoint.pending_after_user = None
+            checkpoint.last_notified = 0
+        if not dry_run:
+            checkpoint.claimed_until = timezone.now() + timedelta(seconds=REVIEW_REMINDER_CLAIM_SECONDS)
+            checkpoint.save()
+    return checkpoint
+
+
+def _record_progress(checkpoint, user_id, products, dry_run):
+    if dry_run:
+        return
+    ReminderCheckpoint.objects.filter(pk=checkpoint.pk).update(
+        pending_after_user=user_id,
+        last_notified=F('last_notified') + products,
+    )
+
+
+def _finish_run(checkpoint, dry_run):
+    if dry_run:
+        return
+    ReminderCheckpoint.objects.filter(pk=checkpoint.pk).update(
+        due_until=checkpoint.pending_due_until,
+        last_run_at=checkpoint.pending_since,
+        pending_due_until=None,
+        pending_since=None,
+        pending_after_user=None,
+    )
+
+
+def _send(connection, messages, dry_run):
+    if dry_run:
+        return len(messages)
+    # one SMTP session per batch instead of one per message
+    return connection.send_messages(messages) or 0
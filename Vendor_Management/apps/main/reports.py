@@ -0,0 +1,148 @@
+import hashlib
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import transaction
+from django.db.models import Count, Max
+from django.utils import timezone
+
+from apps.main import tasks
+from apps.main.enums import JobStatus
+from apps.main.models import Product, ReportJob
+from apps.main.routers import replica_alias
+from utils.views import render_to_pdf
+
+SOFTWARE_REPORT = 'softwares'
+SOFTWARE_REPORT_TEMPLATE = 'vendor_products/software_pdf.html'
+
+# 'thread' renders reports on the in-process background pool; 'command'
+# leaves pending jobs for the run_report_worker management command.
+REPORT_WORKER = getattr(settings, 'REPORT_WORKER', 'thread')
+
+# How long a job may stay pending, or running, before its build is taken
+# for lost and queued again.
+REPORT_PENDING_GRACE = timedelta(seconds=getattr(settings, 'REPORT_PENDING_GRACE_SECONDS', 60))
+REPORT_STALE_AFTER = timedelta(seconds=getattr(settings, 'REPORT_STALE_SECONDS', 15 * 60))
+
+
+def software_report_version():
+    """
+    Fingerprint the data shown in the software report with one aggregate
+    query; any product change, addition or deletion, or vendor edit changes it.
+    """
+    state = Product.objects.order_by().aggregate(
+        count=Count('pk'),
+        updated=Max('updated_at'),
+        vendor_updated=Max('vendor__updated_at'),
+    )
+    fingerprint = '|'.join(str(state[key]) for key in ('count', 'updated', 'vendor_updated'))
+    return hashlib.sha256(fingerprint.encode()).hexdigest()
+
+
+def request_software_report(requested_by=None):
+    """
+    Return the report job for the current data, queueing a build when there
+    is no finished or in-progress job for it yet.
+    """
+    version = software_report_version()
+    job, submit = ReportJob.objects.get_or_create(
+        report=SOFTWARE_REPORT,
+        data_version=version,
+        defaults={'requested_by': requested_by}
+    )
+    if not submit and job.status == JobStatus.FAILED:
+        # retry a failed build on the next request
+        ReportJob.objects.filter(pk=job.pk, status=JobStatus.FAILED).update(
+            status=JobStatus.PENDING, error=None, started_at=None, finished_at=None
+        )
+        job.status = JobStatus.PENDING
+        submit = True
+    elif not submit and REPORT_WORKER == 'thread':
+        # a restart loses the builds queued or running in the process; the
+        # command worker recovers its own with requeue_stale_jobs
+        submit = is_stranded(job)
+
+    if submit and REPORT_WORKER == 'thread':
+        transaction.on_commit(lambda: tasks.submit(build_report, job.pk))
+    return job
+
+
+def is_stranded(job):
+    """
+    Whether the build of ``job`` was lost: it is still pending
+    REPORT_PENDING_GRACE after it was queued, or has been running for more
+    than REPORT_STALE_AFTER. A running job is put back in the queue, and a
+    job queued twice is only built once, see claim_job.
+    """
+    now = timezone.now()
+    if job.status == JobStatus.PENDING:
+        return job.created_at < now - REPORT_PENDING_GRACE
+    if job.status == JobStatus.RUNNING and job.started_at and job.started_at < now - REPORT_STALE_AFTER:
+        if requeue_stale_jobs(REPORT_STALE_AFTER, pk=job.pk):
+            job.status, job.started_at = JobStatus.PENDING, None
+            return True
+    return False
+
+
+def claim_job(job_id):
+    return ReportJob.objects.filter(pk=job_id, status=JobStatus.PENDING).update(
+        status=JobStatus.RUNNING, started_at=timezone.now()
+    ) == 1
+
+
+def build_report(job_id):
+    """
+    Render a pending report job to PDF and store the artifact. Jobs already
+    claimed by another worker are skipped.
+    """
+    if not claim_job(job_id):
+        return
+    job = ReportJob.objects.get(pk=job_id)
+
+    try:
+        # the heavy read goes to a replica; the version it is stored under was
+        # read by a request that, unless pinned, also used a replica
+        context = {'applications': Product.objects.using(replica_alias()).select_related('vendor')}
+        pdf = render_to_pdf(SOFTWARE_REPORT_TEMPLATE, context)
+        content = getattr(pdf, 'content', pdf)
+        if not content:
+            raise ValueError('The PDF renderer returned no content')
+
+        job.file.save(f'{job.report}-{job.data_version[:12]}.pdf', ContentFile(content), save=False)
+        job.status = JobStatus.DONE
+    except Exception as error:
+        job.status = JobStatus.FAILED
+        job.error = str(error)
+        raise
+    finally:
+        job.finished_at = timezone.now()
+        job.save()
+
+    remove_superseded_reports(job)
+
+
+def remove_superseded_reports(job):
+    """
+    Delete the artifacts of older finished builds of the same report.
+    """
+    superseded = ReportJob.objects.filter(
+        report=job.report,
+        status__in=[JobStatus.DONE, JobStatus.FAILED],
+        created_at__lt=job.created_at
+    )
+    for old_job in superseded:
+        if old_job.file:
+            old_job.file.delete(save=False)
+        old_job.delete()
+
+
+def requeue_stale_jobs(older_than=REPORT_STALE_AFTER, **filters):
+    """
+    Put jobs whose worker died mid-build back in the queue.
+    """
+    return ReportJob.objects.filter(
+        status=JobStatus.RUNNING,
+        started_at__lt=timezone.now() - older_than,
+        **filters
+    ).update(status=JobStatus.PENDING, started_at=None)
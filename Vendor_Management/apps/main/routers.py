@@ -0,0 +1,129 @@
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+# How long a client that wrote keeps reading from the primary, to outlast
+# the replication lag
+REPLICA_PIN_SECONDS = getattr(settings, 'REPLICA_PIN_SECONDS', 10)
+REPLICA_PIN_COOKIE = getattr(settings, 'REPLICA_PIN_COOKIE', 'db_pin')
+
+
+class ReplicaState:
+    """
+    Per-request routing state: ``pinned`` sends reads to the primary,
+    ``wrote`` records that the request wrote, so the client gets pinned, and
+    ``replica`` is the replica chosen on the request's first replica read.
+    """
+
+    def __init__(self, pinned):
+        self.pinned = pinned
+        self.wrote = False
+        self.replica = None
+
+
+# set by ReplicaPinMiddleware; reads outside a request use the primary
+_state = ContextVar('replica_state', default=None)
+# set by use_primary
+_primary = ContextVar('replica_primary', default=False)
+
+
+def start_routing(pinned):
+    return _state.set(ReplicaState(pinned))
+
+
+def finish_routing(token):
+    """
+    End the routing state set by ``start_routing`` and return whether the
+    request wrote to the primary.
+    """
+    state = _state.get()
+    _state.reset(token)
+    return state.wrote
+
+
+@contextmanager
+def use_primary():
+    """
+    Send the reads inside the block to the primary. Cache fills use it: an
+    entry stored under the version a write just bumped must not be computed
+    from a replica that has not replayed that write yet.
+    """
+    token = _primary.set(True)
+    try:
+        yield
+    finally:
+        _primary.reset(token)
+
+
+def get_replicas():
+    """
+    The aliases in DATABASES that replicate the default database, from the
+    DATABASE_REPLICAS setting. With none every query uses the default one.
+    """
+    return getattr(settings, 'DATABASE_REPLICAS', [])
+
+
+def replica_alias():
+    """
+    A configured replica, or the default database when there is none. A
+    request keeps the replica it first read from, so its reads do not mix
+    replicas that lag by different amounts.
+    """
+    replicas = get_replicas()
+    if not replicas:
+        return DEFAULT_DB_ALIAS
+    state = _state.get()
+    if state is None:
+        return random.choice(replicas)
+    if state.replica is None:
+        state.replica = random.choice(replicas)
+    return state.replica
+
+
+def read_alias():
+    """
+    The database the current request reads from. Querysets evaluated after
+    the response is returned, such as streamed exports, should be bound to
+    it with ``.using()`` while the request is still being handled.
+    """
+    state = _state.get()
+    if state is None or state.pinned or _primary.get() or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+        # reads inside a transaction must see its writes
+        return DEFAULT_DB_ALIAS
+    return replica_alias()
+
+
+class ReplicaRouter:
+    """
+    Send writes to the default database and the reads of safe requests to
+    DATABASE_REPLICAS, except for clients that wrote in the last
+    REPLICA_PIN_SECONDS, which read their own writes from the primary.
+
+    Enabled with::
+
+        DATABASE_REPLICAS = ['replica']
+        DATABASE_ROUTERS = ['apps.main.routers.ReplicaRouter']
+
+    and ``apps.main.middleware.ReplicaPinMiddleware`` in MIDDLEWARE. Each
+    replica alias is an ordinary DATABASES entry; give it
+    ``'TEST': {'MIRROR': 'default'}`` so tests use a single database.
+    """
+
+    def db_for_read(self, model, **hints):
+        return read_alias()
+
+    def db_for_write(self, model, **hints):
+        state = _state.get()
+        if state is not None:
+            # later reads of this request must see the write
+            state.pinned = state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {DEFAULT_DB_ALIAS, *get_replicas()}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
@@ -0,0 +1,304 @@
+import re
+from collections import namedtuple
+
+from django.db import connection as default_connection
+from django.db.models import Q
+from django.urls import reverse
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+SEARCH_TABLE = 'search_index'
+
+# Text config used for stemming on PostgreSQL.
+SEARCH_LANGUAGE = 'english'
+
+# Markers wrapped around matched terms by the database; they cannot occur
+# in escaped text so highlights are safe to render once replaced.
+HIGHLIGHT_START = '\x02'
+HIGHLIGHT_STOP = '\x03'
+
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 100
+
+# Indexed fields per model: the title is ranked above the body.
+SEARCHABLE_MODELS = {
+    'vendor': {
+        'code': 1,
+        'title': 'vendor_name',
+        'body': ['description'],
+        'url_name': 'vendor_detail',
+        'url_kwarg': 'vendor_id',
+    },
+    'product': {
+        'code': 2,
+        'title': 'name',
+        'body': ['description', 'additional_information', 'software_type', 'module', 'business_area'],
+        'url_name': 'product_detail',
+        'url_kwarg': 'product_id',
+    },
+}
+
+SearchResult = namedtuple('SearchResult', ['object_type', 'object_id', 'title', 'snippet', 'rank', 'url'])
+
+
+def _search_terms(query):
+    return re.findall(r'\w+', query.lower())
+
+
+def _highlight(text):
+    return mark_safe(
+        escape(text or '').replace(HIGHLIGHT_START, '<mark>').replace(HIGHLIGHT_STOP, '</mark>')
+    )
+
+
+def _document(object_type, object_id, title, body_values):
+    body = '\n'.join(str(value) for value in body_values if value)
+    return object_type, object_id, title or '', body
+
+
+def document_for(instance):
+    spec = SEARCHABLE_MODELS[instance._meta.model_name]
+    return _document(
+        instance._meta.model_name,
+        instance.pk,
+        getattr(instance, spec['title']),
+        [getattr(instance, field) for field in spec['body']]
+    )
+
+
+class SQLiteSearchBackend:
+    """
+    FTS5 virtual table keyed by a rowid derived from the object type and
+    primary key, so updates and deletes are rowid lookups.
+    """
+
+    def create_index(self, cursor):
+        cursor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_TABLE} USING fts5("
+            "title, body, object_type UNINDEXED, object_id UNINDEXED, "
+            "tokenize = 'porter unicode61')"
+        )
+
+    def drop_index(self, cursor):
+        cursor.execute(f"DROP TABLE IF EXISTS {SEARCH_TABLE}")
+
+    @staticmethod
+    def _rowid(object_type, object_id):
+        return object_id * 8 + SEARCHABLE_MODELS[object_type]['code']
+
+    def index(self, cursor, documents):
+        self.remove(cursor, [(object_type, object_id) for object_type, object_id, _, _ in documents])
+        cursor.executemany(
+            f"INSERT INTO {SEARCH_TABLE} (rowid, title, body, object_type, object_id) "
+            "VALUES (%s, %s, %s, %s, %s)",
+            [
+                (self._rowid(object_type, object_id), title, body, object_type, object_id)
+                for object_type, object_id, title, body in documents
+            ]
+        )
+
+    def remove(self, cursor, keys):
+        cursor.executemany(
+            f"DELETE FROM {SEARCH_TABLE} WHERE rowid = %s",
+            [(self._rowid(object_type, object_id),) for object_type, object_id in keys]
+        )
+
+    def clear(self, cursor):
+        cursor.execute(f"DELETE FROM {SEARCH_TABLE}")
+
+    def search(self, cursor, terms, limit):
+        match = ' '.join('"%s"*' % term for term in terms)
+        cursor.execute(
+            "SELECT object_type, object_id, "
+            f"highlight({SEARCH_TABLE}, 0, %s, %s), "
+            f"snippet({SEARCH_TABLE}, 1, %s, %s, '…', 16), "
+            f"bm25({SEARCH_TABLE}, 10.0, 1.0) AS rank "
+            f"FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH %s "
+            "ORDER BY rank LIMIT %s",
+            [HIGHLIGHT_START, HIGHLIGHT_STOP, HIGHLIGHT_START, HIGHLIGHT_STOP, match, limit]
+        )
+        # bm25() scores better matches lower; flip the sign so higher is better.
+        return [(object_type, object_id, title, snippet, -rank)
+                for object_type, object_id, title, snippet, rank in cursor.fetchall()]
+
+
+class PostgresSearchBackend:
+    """
+    Plain table with a weighted tsvector column behind a GIN index.
+    """
+
+    def create_index(self, cursor):
+        cursor.execute(
+            f"CREATE TABLE IF NOT EXISTS {SEARCH_TABLE} ("
+            "object_type varchar(20) NOT NULL, "
+            "object_id bigint NOT NULL, "
+            "title text NOT NULL, "
+            "body text NOT NULL, "
+            "document tsvector NOT NULL, "
+            "PRIMARY KEY (object_type, object_id))"
+        )
+        cursor.execute(
+            f"CREATE INDEX IF NOT EXISTS {SEARCH_TABLE}_document_idx "
+            f"ON {SEARCH_TABLE} USING GIN (document)"
+        )
+
+    def drop_index(self, cursor):
+        cursor.execute(f"DROP TABLE IF EXISTS {SEARCH_TABLE}")
+
+    def index(self, cursor, documents):
+        cursor.executemany(
+            f"INSERT INTO {SEARCH_TABLE} (object_type, object_id, title, body, document) "
+            "VALUES (%s, %s, %s, %s, "
+            "setweight(to_tsvector(%s, %s), 'A') || setweight(to_tsvector(%s, %s), 'B')) "
+            "ON CONFLICT (object_type, object_id) DO UPDATE SET "
+            "title = EXCLUDED.title, body = EXCLUDED.body, document = EXCLUDED.document",
+            [
+                (object_type, object_id, title, body, SEARCH_LANGUAGE, title, SEARCH_LANGUAGE, body)
+                for object_type, object_id, title, body in documents
+            ]
+        )
+
+    def remove(self, cursor, keys):
+        cursor.executemany(
+            f"DELETE FROM {SEARCH_TABLE} WHERE object_type = %s AND object_id = %s",
+            list(keys)
+        )
+
+    def clear(self, cursor):
+        cursor.execute(f"TRUNCATE {SEARCH_TABLE}")
+
+    def search(self, cursor, terms, limit):
+        options = f'StartSel={HIGHLIGHT_START}, StopSel={HIGHLIGHT_STOP}, HighlightAll=true'
+        snippet_options = f'StartSel={HIGHLIGHT_START}, StopSel={HIGHLIGHT_STOP}, MaxFragments=2'
+        # Highlights are computed in the outer query so only the returned
+        # page of hits is headlined.
+        cursor.execute(
+            "SELECT object_type, object_id, "
+            "ts_headline(%s, title, query, %s), ts_headline(%s, body, query, %s), rank "
+            "FROM ("
+            "SELECT object_type, object_id, title, body, query, "
+            "ts_rank_cd(document, query) AS rank "
+            f"FROM {SEARCH_TABLE}, to_tsquery(%s, %s) query "
+            "WHERE document @@ query ORDER BY rank DESC LIMIT %s"
+            ") hits ORDER BY rank DESC",
+            [
+                SEARCH_LANGUAGE, options, SEARCH_LANGUAGE, snippet_options,
+                SEARCH_LANGUAGE, ' & '.join(f'{term}:*' for term in terms), limit
+            ]
+        )
+        return cursor.fetchall()
+
+
+BACKENDS = {
+    'sqlite': SQLiteSearchBackend,
+    'postgresql': PostgresSearchBackend,
+}
+
+
+def get_backend(connection=default_connection):
+    """
+    Return the index backend for ``connection`` or ``None`` when the database
+    has no supported full-text engine, in which case searches fall back to
+    ``icontains`` lookups.
+    """
+    backend = BACKENDS.get(connection.vendor)
+    return backend() if backend else None
+
+
+def index_objects(objects, connection=default_connection):
+    backend = get_backend(connection)
+    documents = [document_for(instance) for instance in objects]
+    if backend and documents:
+        with connection.cursor() as cursor:
+            backend.index(cursor, documents)
+
+
+def remove_objects(objects, connection=default_connection):
+    backend = get_backend(connection)
+    keys = [(instance._meta.model_name, instance.pk) for instance in objects]
+    if backend and keys:
+        with connection.cursor() as cursor:
+            backend.remove(cursor, keys)
+
+
+def rebuild_index(models, connection=default_connection, batch_size=500):
+    """
+    Re-index every row of ``models`` (vendor and product model classes),
+    reading only the indexed columns. Returns the number of documents written.
+    """
+    backend = get_backend(connection)
+    if not backend:
+        return 0
+
+    total = 0
+    with connection.cursor() as cursor:
+        backend.clear(cursor)
+        for model in models:
+            spec = SEARCHABLE_MODELS[model._meta.model_name]
+            rows = model._base_manager.using(connection.alias).order_by().values_list(
+                'pk', spec['title'], *spec['body']
+            )
+            batch = []
+            for pk, title, *body in rows.iterator(chunk_size=batch_size):
+                batch.append(_document(model._meta.model_name, pk, title, body))
+                if len(batch) >= batch_size:
+                    backend.index(cursor, batch)
+                    total += len(batch)
+                    batch = []
+            if batch:
+                backend.index(cursor, batch)
+                total += len(batch)
+    return total
+
+
+def _fallback_search(terms, limit):
+    from apps.main.models import Product, Vendor
+
+    pattern = re.compile('(%s)' % '|'.join(re.escape(term) for term in terms), re.IGNORECASE)
+    mark = rf'{HIGHLIGHT_START}\1{HIGHLIGHT_STOP}'
+    hits = []
+    for model in (Vendor, Product):
+        spec = SEARCHABLE_MODELS[model._meta.model_name]
+        condition = Q()
+        for term in terms:
+            term_condition = Q(**{f"{spec['title']}__icontains": term})
+            for field in spec['body']:
+                term_condition |= Q(**{f'{field}__icontains': term})
+            condition &= term_condition
+        rows = model.objects.filter(condition).values_list('pk', spec['title'], *spec['body'])[:limit]
+        for pk, title, *body in rows:
+            snippet = ' '.join(str(value) for value in body if value)[:200]
+            hits.append((model._meta.model_name, pk, pattern.sub(mark, title), pattern.sub(mark, snippet), 0))
+    return hits[:limit]
+
+
+def search(query, limit=DEFAULT_LIMIT, connection=default_connection):
+    """
+    Run a ranked prefix search for every word in ``query`` and return a list
+    of ``SearchResult`` whose ``title`` and ``snippet`` are HTML-safe with the
+    matched terms wrapped in ``<mark>``.
+    """
+    terms = _search_terms(query)
+    if not terms:
+        return []
+    limit = max(1, min(limit, MAX_LIMIT))
+
+    backend = get_backend(connection)
+    if backend:
+        with connection.cursor() as cursor:
+            hits = backend.search(cursor, terms, limit)
+    else:
+        hits = _fallback_search(terms, limit)
+
+    results = []
+    for object_type, object_id, title, snippet, rank in hits:
+        spec = SEARCHABLE_MODELS[object_type]
+        results.append(SearchResult(
+            object_type,
+            object_id,
+            _highlight(title),
+            _highlight(snippet),
+            rank,
+            reverse(spec['url_name'], kwargs={spec['url_kwarg']: object_id})
+        ))
+    return results
@@ -1,7 +1,18 @@
-from django.db.models.signals import post_save
+from functools import partial
+
+from django.db import transaction
+from django.contrib.auth.models import Group, Permission
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_save
 from django.dispatch import receiver
 
-from apps.main.models import User, Profile
+from apps.main.dashboard import adjust_counter, bump_latest_version
+from apps.main.fragments import bump_generation
+from apps.main.models import User, Profile, Comment, Vendor, Product, Permissions, Document
+from apps.main.permission_cache import bump_catalog_version, bump_user_versions
+from apps.main.ratings import RATED_COMMENT_FIELDS, apply_comment_rating
+from apps.main.images import DEFAULT_PROFILE_IMAGE, schedule_profile_variants
+from apps.main.search import index_objects, remove_objects
+from apps.main.uploads import release_blob, retain_blob
 
 
 @receiver(post_save, sender=User)
@@ -14,8 +25,188 @@ def create_profile(sender, instance, created, **kwargs):
 
 
 @receiver(post_save, sender=User)
-def save_profile(sender, instance, **kwargs):
+def save_profile(sender, instance, created, **kwargs):
+    """
+    Save the profile along with the user when it has unsaved changes. A
+    profile that was never loaded cannot have any, so it is not fetched.
+    """
+    if created or not User.profile.is_cached(instance):
+        return
+    profile = instance.profile
+    if profile.get_dirty_fields():
+        profile.save()
+
+
+@receiver(post_save, sender=Profile)
+def process_profile_image(sender, instance, raw=False, **kwargs):
+    """
+    Generate the thumbnails of a newly uploaded profile picture in the
+    background.
+    """
+    if raw or 'image' not in instance.get_dirty_fields():
+        return
+    if instance.image and instance.image.name != DEFAULT_PROFILE_IMAGE:
+        schedule_profile_variants(instance)
+
+
+@receiver(pre_save, sender=Comment)
+def load_previous_rating(sender, instance, raw=False, **kwargs):
+    """
+    Load the stored rating and target of a comment that is saved without
+    having been loaded with them, so add_comment_rating can tell what changed.
+    """
+    loaded = getattr(instance, '_loaded_values', None) or {}
+    if raw or instance._state.adding or all(field in loaded for field in RATED_COMMENT_FIELDS):
+        return
+    stored = sender._base_manager.filter(pk=instance.pk).values(*RATED_COMMENT_FIELDS).first()
+    if stored:
+        instance._loaded_values = {**loaded, **stored}
+
+
+@receiver(post_save, sender=Comment)
+def add_comment_rating(sender, instance, created, raw=False, **kwargs):
+    """
+    Count a new comment's rating on its vendor or product, and move the
+    rating of an edited comment whose rating, vendor or product changed.
+    """
+    if raw:
+        return
+    if created:
+        apply_comment_rating(instance, 1)
+        return
+    # loaded values are replaced only once the save returns
+    previous = getattr(instance, '_loaded_values', None) or {}
+    if not all(field in previous for field in RATED_COMMENT_FIELDS):
+        return
+    if {'rating', 'vendor', 'product'} & set(instance.get_dirty_fields()):
+        apply_comment_rating(Comment(**{field: previous[field] for field in RATED_COMMENT_FIELDS}), -1)
+        apply_comment_rating(instance, 1)
+
+
+@receiver(post_delete, sender=Comment)
+def remove_comment_rating(sender, instance, **kwargs):
+    """
+    Take a deleted comment's rating off its vendor or product.
+    """
+    apply_comment_rating(instance, -1)
+
+
+@receiver(post_save, sender=Vendor)
+@receiver(post_save, sender=Product)
+def update_search_index(sender, instance, raw=False, **kwargs):
+    """
+    Re-index a vendor or product whenever it is saved, except by loaddata;
+    rebuild_search_index indexes loaded fixtures.
+    """
+    if raw:
+        return
+    index_objects([instance])
+
+
+@receiver(post_delete, sender=Vendor)
+@receiver(post_delete, sender=Product)
+def remove_from_search_index(sender, instance, **kwargs):
+    """
+    Drop a deleted vendor or product from the search index.
+    """
+    remove_objects([instance])
+
+
+@receiver(post_save, sender=User)
+@receiver(post_save, sender=Vendor)
+@receiver(post_save, sender=Product)
+def count_created_object(sender, instance, created, **kwargs):
+    """
+    Keep the cached dashboard counters and latest applications current.
+    """
+    if created:
+        transaction.on_commit(partial(adjust_counter, sender, 1))
+    if sender is not User:
+        transaction.on_commit(bump_latest_version)
+
+
+@receiver(post_delete, sender=User)
+@receiver(post_delete, sender=Vendor)
+@receiver(post_delete, sender=Product)
+def count_deleted_object(sender, instance, **kwargs):
+    """
+    Keep the cached dashboard counters and latest applications current.
+    """
+    transaction.on_commit(partial(adjust_counter, sender, -1))
+    if sender is not User:
+        transaction.on_commit(bump_latest_version)
+
+
+@receiver(post_save, sender=Vendor)
+@receiver(post_save, sender=Product)
+@receiver(post_save, sender=Document)
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Vendor)
+@receiver(post_delete, sender=Product)
+@receiver(post_delete, sender=Document)
+@receiver(post_delete, sender=Comment)
+def bump_fragment_generation(sender, **kwargs):
+    """
+    Re-render cached list fragments that show rows of the changed model.
+    """
+    transaction.on_commit(partial(bump_generation, sender))
+
+
+@receiver(m2m_changed, sender=User.user_permissions.through)
+@receiver(m2m_changed, sender=User.groups.through)
+def invalidate_user_permissions(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    Drop the cached permission sets of users whose permissions or groups changed.
+    """
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        transaction.on_commit(partial(bump_user_versions, [instance.pk]))
+    elif pk_set:
+        transaction.on_commit(partial(bump_user_versions, list(pk_set)))
+    else:
+        # a permission or group was cleared from every user
+        transaction.on_commit(bump_catalog_version)
+
+
+@receiver(m2m_changed, sender=Group.permissions.through)
+def invalidate_group_permissions(sender, action, **kwargs):
+    """
+    Drop every cached permission set when a group's permissions change.
+    """
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        transaction.on_commit(bump_catalog_version)
+
+
+@receiver(post_save, sender=Permission)
+@receiver(post_save, sender=Permissions)
+@receiver(post_delete, sender=Permission)
+@receiver(post_delete, sender=Permissions)
+def invalidate_permission_catalog(sender, **kwargs):
+    """
+    Drop the cached permission catalog when a permission is added, changed or removed.
+    """
+    transaction.on_commit(bump_catalog_version)
+
+
+@receiver(post_save, sender=Document)
+def count_document_blob(sender, instance, created, **kwargs):
+    """
+    Move a document's reference from its previous blob to its current one.
+    """
+    previous = None if created else getattr(instance, '_loaded_values', {}).get('blob_id')
+    if previous == instance.blob_id:
+        return
+    if instance.blob_id:
+        retain_blob(instance.blob_id)
+    if previous:
+        transaction.on_commit(partial(release_blob, previous))
+
+
+@receiver(post_delete, sender=Document)
+def release_document_blob(sender, instance, **kwargs):
     """
-    Save the profile whenever the user is saved.
+    Drop a deleted document's reference to its blob.
     """
-    instance.profile.save()
+    if instance.blob_id:
+        transaction.on_commit(partial(release_blob, instance.blob_id))
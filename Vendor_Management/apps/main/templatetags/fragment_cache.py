@@ -0,0 +1,138 @@
+from django import template
+from django.template.defaulttags import ForNode
+
+from apps.main.fragments import FragmentStats, fragment_key, get_fragments, get_generations, get_or_render, row_version
+
+register = template.Library()
+
+# render_context entries shared by the fragment tags of one template
+PREFETCHED = 'fragment_cache:prefetched'
+STATS = 'fragment_cache:stats'
+
+
+class FragmentNode(template.Node):
+    def __init__(self, nodelist, name, args, version, vary_on=(), collection=False):
+        self.nodelist = nodelist
+        self.name = name
+        self.args = args
+        self.version = version
+        self.vary_on = vary_on
+        self.collection = collection
+
+    def key(self, context):
+        parts = self.version([arg.resolve(context) for arg in self.args])
+        if self.vary_on:
+            parts = [parts, [value.resolve(context) for value in self.vary_on]]
+        return self.name.resolve(context), parts
+
+    def render(self, context):
+        name, parts = self.key(context)
+        # the outermost fragment collects the counts of the ones inside it
+        owner = STATS not in context.render_context
+        if owner:
+            context.render_context[STATS] = FragmentStats()
+        stats = context.render_context[STATS]
+        try:
+            return get_or_render(
+                name, parts, lambda: self.render_body(context),
+                prefetched=context.render_context.get(PREFETCHED), stats=stats
+            )
+        finally:
+            if owner:
+                stats.flush()
+                del context.render_context[STATS]
+
+    def render_body(self, context):
+        if self.collection:
+            prefetched = context.render_context.setdefault(PREFETCHED, {})
+            prefetched.update(get_fragments(self.row_keys(context)))
+        return self.nodelist.render(context)
+
+    def row_keys(self, context):
+        """
+        The cache keys of the rows a ``{% for %}`` loop inside this
+        collection is about to render, so they can be read in one round
+        trip instead of one per row.
+        """
+        keys = []
+        for loop in self.nodelist.get_nodes_by_type(ForNode):
+            rows = [node for node in loop.nodelist_loop.get_nodes_by_type(FragmentNode) if not node.collection]
+            if not rows:
+                continue
+            values = loop.sequence.resolve(context, ignore_failures=True)
+            # a one-shot iterable would be used up before the loop runs
+            if not values or not hasattr(values, '__len__'):
+                continue
+            for item in values:
+                names = loop.loopvars
+                with context.push(dict(zip(names, item)) if len(names) > 1 else {names[0]: item}):
+                    keys += [fragment_key(*node.key(context)) for node in rows]
+        return keys
+
+
+def _objects_version(objects):
+    return [row_version(obj) if hasattr(obj, '_meta') else obj for obj in objects]
+
+
+def _collection_version(labels):
+    return list(zip(labels, get_generations(labels)))
+
+
+def _parse(parser, token, version, collection=False):
+    bits = token.split_contents()
+    if len(bits) < 3:
+        raise template.TemplateSyntaxError(f"'{bits[0]}' takes a fragment name and at least one argument")
+    args, vary_on = bits[2:], []
+    if collection and 'vary_on' in args:
+        index = args.index('vary_on')
+        args, vary_on = args[:index], args[index + 1:]
+        if not args or not vary_on:
+            raise template.TemplateSyntaxError(f"'{bits[0]}' takes model labels before vary_on and values after it")
+    nodelist = parser.parse((f'end{bits[0]}',))
+    parser.delete_first_token()
+    return FragmentNode(
+        nodelist,
+        parser.compile_filter(bits[1]),
+        [parser.compile_filter(bit) for bit in args],
+        version,
+        vary_on=[parser.compile_filter(bit) for bit in vary_on],
+        collection=collection,
+    )
+
+
+@register.tag
+def cache_row(parser, token):
+    """
+    Cache one row of a list until any of the given objects changes::
+
+        {% cache_row 'application_row' application application.vendor %}
+            ...
+        {% endcache_row %}
+
+    The key is made of each object's primary key, ``updated_at`` and rating
+    totals; other arguments are used as they are. Anything the row shows
+    must come from those arguments, not from the surrounding loop.
+    """
+    return _parse(parser, token, _objects_version)
+
+
+@register.tag
+def cache_collection(parser, token):
+    """
+    Cache a whole list until a row of any of the given models is saved or
+    deleted::
+
+        {% cache_collection 'latest_applications' 'main.product' 'main.vendor' %}
+            ...
+        {% endcache_collection %}
+
+    Values after ``vary_on``, such as a cursor or a filter, are added to the
+    key, so each page or filter of a list is cached on its own::
+
+        {% cache_collection 'vendors' 'main.vendor' vary_on request.GET.after request.GET.q %}
+
+    On a miss the list is rendered again, and rows wrapped in
+    ``{% cache_row %}`` that did not change still come from the cache; the
+    rows of its ``{% for %}`` loops are read with one ``get_many``.
+    """
+    return _parse(parser, token, _collection_version, collection=True)
@@ -0,0 +1,13 @@
+from django import template
+
+from apps.main.images import profile_image_url as variant_url
+
+register = template.Library()
+
+
+@register.simple_tag
+def profile_image_url(profile, variant='medium', extension='webp'):
+    """
+    Usage: ``{% profile_image_url request.user.profile 'small' %}``
+    """
+    return variant_url(profile, variant, extension)
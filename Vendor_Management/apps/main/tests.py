@@ -1,3 +1,1845 @@
-from django.test import TestCase
+import csv
+import hashlib
+import io
+import json
+import os
+import shutil
+import tempfile
+import threading
+from collections import Counter
+from datetime import datetime, timedelta
+from smtplib import SMTPException
+from types import SimpleNamespace
+from unittest import skipUnless
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.contrib.auth.models import Group
+from django.contrib.contenttypes.models import ContentType
+from django.core import mail
+from django.core.cache import cache, caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.mail.backends import locmem
+from django.core.mail.backends.base import BaseEmailBackend
+from django.core.management import call_command
+from django.db import IntegrityError, connection, connections, router, transaction
+from django.http import HttpResponse, QueryDict
+from django.template import Context, Template
+from django.test import RequestFactory, TestCase, TransactionTestCase, modify_settings, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image
+
+from apps.main import urls
+from apps.main.activity import log_activity
+from apps.main.async_views import query
+from apps.main.benchmarks import benchmark_requests
+from apps.main.dashboard import (
+    adjust_counter, get_dashboard_counters, get_dashboard_stats, get_latest_applications, invalidate_dashboard,
+)
+from apps.main.downloads import download_filename
+from apps.main.enums import ActivityVerb, CloudStatus, JobStatus, UserTypes
+from apps.main.exports import PRODUCT_EXPORT_COLUMNS, stream_csv
+from apps.main.filters import facet_counts, filter_products
+from apps.main.fragments import get_or_render, get_stats
+from apps.main.images import (
+    DEFAULT_PROFILE_IMAGE, PROFILE_IMAGE_MAX_UPLOAD_SIZE, PROFILE_IMAGE_SIZES, generate_profile_variants,
+    profile_image_url,
+)
+from apps.main.importers import ProductImporter, UserImporter, VendorImporter
+from apps.main.middleware import QUERY_STATS_HEADER, ReplicaPinMiddleware, duplicate_fingerprints, fingerprint
+from apps.main.models import (
+    ActivityEvent, Blob, Comment, Document, Permissions, Product, Profile, ReminderCheckpoint, ReportJob, UploadSession,
+    User, Vendor,
+)
+from apps.main.pagination import InvalidCursor, decode_cursor, encode_cursor, paginate_keyset
+from apps.main.permission_cache import get_managed_permissions, get_user_permission_codenames
+from apps.main.reminders import send_review_reminders
+from apps.main.reports import SOFTWARE_REPORT, request_software_report, software_report_version
+from apps.main.routers import REPLICA_PIN_COOKIE, finish_routing, start_routing
+from apps.main.search import search as search_catalog
+from apps.main.uploads import (
+    UPLOAD_EXPIRY, UploadOffsetMismatch, append_chunk, blob_name, partial_path, save_uploaded_document, start_upload,
+    upload_temp_dir,
+)
+
+
+def profile_queries(queries):
+    return [query['sql'] for query in queries if '"profiles"' in query['sql']]
+
+
+class ProfileWriteElisionTests(TestCase):
+    password = 'correct-horse-battery'
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='jane',
+            email='jane@example.com',
+            password=self.password,
+            user_type=UserTypes.NORMAL_USER
+        )
+
+    def test_login_does_not_touch_profile(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(
+                reverse('login'),
+                {'username': 'jane', 'password': self.password}
+            )
+
+        self.assertRedirects(response, reverse('home'), fetch_redirect_response=False)
+        self.assertEqual(profile_queries(queries.captured_queries), [])
+
+    def test_signup_writes_profile_once(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(reverse('signup'), {
+                'username': 'john',
+                'email': 'john@example.com',
+                'user_type': UserTypes.NORMAL_USER,
+                'password1': self.password,
+                'password2': self.password,
+            })
+
+        self.assertRedirects(response, reverse('home'), fetch_redirect_response=False)
+        self.assertEqual(self.client.session['_auth_user_id'], str(User.objects.get(username='john').pk))
+        writes = profile_queries(queries.captured_queries)
+        self.assertEqual(len(writes), 1)
+        self.assertTrue(writes[0].startswith('INSERT'))
+
+    def test_unchanged_loaded_profile_is_not_saved(self):
+        user = User.objects.select_related('profile').get(pk=self.user.pk)
+        user.first_name = 'Jane'
+
+        with CaptureQueriesContext(connection) as queries:
+            user.save()
+
+        self.assertEqual(profile_queries(queries.captured_queries), [])
+
+    def test_changed_profile_is_saved_with_user(self):
+        user = User.objects.select_related('profile').get(pk=self.user.pk)
+        user.profile.bio = 'Procurement lead'
+
+        with self.assertNumQueries(2):
+            user.save()
+
+        self.assertEqual(Profile.objects.get(user=self.user).bio, 'Procurement lead')
+
+
+class QueryFingerprintTests(TestCase):
+    def test_parameters_are_ignored(self):
+        self.assertEqual(
+            fingerprint('SELECT * FROM "vendors" WHERE "id" = 1 AND "vendor_name" = \'Acme\''),
+            fingerprint('SELECT *  FROM "vendors" WHERE "id" = 22 AND "vendor_name" = \'It\'\'s\'')
+        )
+
+    def test_in_lists_of_any_length_match(self):
+        self.assertEqual(
+            duplicate_fingerprints([
+                'SELECT * FROM "products" WHERE "id" IN (%s, %s)',
+                'SELECT * FROM "products" WHERE "id" IN (%s)',
+                'SELECT * FROM "vendors"',
+            ]),
+            {'SELECT * FROM "products" WHERE "id" IN (...)': 2}
+        )
+
+
+@override_settings(QUERY_INSTRUMENTATION=True)
+@modify_settings(MIDDLEWARE={'append': 'apps.main.middleware.QueryInstrumentationMiddleware'})
+class QueryInstrumentationMiddlewareTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='jane', email='jane@example.com', password='x', user_type=UserTypes.VENDOR
+        )
+        self.client.force_login(self.user)
+
+    def test_response_reports_queries(self):
+        response = self.client.get(reverse('report_status', args=[1]))
+
+        self.assertEqual(response.status_code, 404)
+        stats = response.wsgi_request.query_stats
+        self.assertGreater(stats.count, 0)
+        self.assertEqual(
+            response[QUERY_STATS_HEADER],
+            f'count={stats.count}; time={stats.duration * 1000:.1f}ms; duplicates=0'
+        )
+
+    @override_settings(QUERY_INSTRUMENTATION=False)
+    def test_disabled(self):
+        response = self.client.get(reverse('report_status', args=[1]))
+        self.assertNotIn(QUERY_STATS_HEADER, response)
+
+
+# Maximum number of queries per URL in apps.main.urls, measured with the
+# fixtures below: several vendors, products and reviews per page, so a query
+# issued per row shows up as a budget overrun. Raise a budget only together
+# with the change that needs it.
+QUERY_BUDGETS = {
+    'home': 7,
+    'home_async': 7,
+    'signup': 3,
+    'login': 3,
+    'logout': 4,
+    'password_change': 2,
+    'password_change_done': 2,
+    'users': 4,
+    'user_detail': 7,
+    'profile': 3,
+    'vendors': 4,
+    'create_vendor': 3,
+    'vendor_detail': 10,
+    'vendor_detail_async': 10,
+    'edit_vendor': 4,
+    'delete_vendor': 9,
+    'create_product': 4,
+    'update_product': 6,
+    'product_detail': 10,
+    'product_detail_async': 10,
+    'delete_product': 10,
+    'applications': 5,
+    'add_vendor_comment': 8,
+    'add_product_comment': 8,
+    'update_profile': 4,
+    'generate_softwares_pdf': 7,
+    'report_status': 1,
+    'export_data_to_csv': 1,
+    'create_permission': 4,
+    'permissions': 4,
+    'update_permission': 5,
+    'delete_permission': 14,
+    'assign_permission': 7,
+    'assign_permissions_batch': 10,
+    'search': 4,
+    'activity_feed': 4,
+    'import_data': 3,
+    'create_upload': 3,
+    'upload_detail': 3,
+    'complete_upload': 6,
+    'download_document': 3,
+    'api_list': 6,
+    'api_detail': 6,
+}
+
+ROWS = 5
+
+
+# the async views' queries must run on the test's connection to be counted
+# and to see the fixtures of the test transaction
+@override_settings(ASYNC_VIEW_CONCURRENT_QUERIES=False)
+class QueryBudgetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user(
+            username='admin', email='admin@example.com', password='x',
+            user_type=UserTypes.ADMIN, is_staff=True
+        )
+        cls.reviewers = [
+            User.objects.create_user(
+                username=f'reviewer{i}', email=f'reviewer{i}@example.com', password='x',
+                user_type=UserTypes.NORMAL_USER
+            )
+            for i in range(ROWS)
+        ]
+        cls.vendors = [
+            Vendor.objects.create(
+                user=User.objects.create_user(
+                    username=f'vendor{i}', email=f'vendor{i}@example.com', password='x',
+                    user_type=UserTypes.VENDOR
+                ),
+                vendor_name=f'Vendor {i}',
+                company_established_on=2000 + i
+            )
+            for i in range(ROWS)
+        ]
+        cls.vendor = cls.vendors[0]
+        cls.products = [
+            Product.objects.create(
+                vendor=cls.vendor,
+                name=f'Product {i}',
+                software_type='ERP',
+                module='Finance',
+                client_type='Enterprise',
+                business_area='Accounting',
+                cloud_status=CloudStatus.NATIVE
+            )
+            for i in range(ROWS)
+        ]
+        cls.product = cls.products[0]
+        for reviewer in cls.reviewers:
+            Comment.objects.create(commented_by=reviewer, vendor=cls.vendor, rating=4, content='Solid')
+            Comment.objects.create(commented_by=reviewer, product=cls.product, rating=3, content='Fine')
+        cls.permission = Permissions.objects.create(
+            codename='view_vendor_product_record',
+            name='View vendor product record',
+            content_type=ContentType.objects.get_for_model(Vendor)
+        )
+        cls.report = ReportJob.objects.create(report='softwares', data_version='1')
+        cls.upload = UploadSession.objects.create(user=cls.admin, filename='spec.pdf', size=10)
+
+    def setUp(self):
+        cache.clear()
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.document = Document(product=self.product)
+        self.document.document.save('spec.pdf', ContentFile(b'%PDF-1.4 spec'), save=True)
+        self.client.force_login(self.admin)
+
+    def requests(self):
+        """
+        One representative request per URL name: (method, url, data).
+        """
+        return benchmark_requests(
+            self.admin,
+            user_id=self.reviewers[0].pk,
+            vendor_id=self.vendor.pk,
+            product_id=self.product.pk,
+            delete_vendor_id=self.vendors[-1].pk,
+            delete_product_id=self.products[-1].pk,
+            permission_id=self.permission.pk,
+            report_id=self.report.pk,
+            upload_id=self.upload.pk,
+            document_id=self.document.pk,
+            grant_user_ids=[reviewer.pk for reviewer in self.reviewers],
+            query='Product',
+        )
+
+    def assertQueryBudget(self, name, method, url, kwargs):
+        with CaptureQueriesContext(connection) as context:
+            response = getattr(self.client, method)(url, **kwargs)
+            if response.streaming:
+                b''.join(response.streaming_content)
+
+        self.assertLess(response.status_code, 500)
+        statements = [query['sql'] for query in context.captured_queries]
+        duplicates = duplicate_fingerprints(statements)
+        self.assertLessEqual(
+            len(statements),
+            QUERY_BUDGETS[name],
+            f'{name} ran {len(statements)} queries, budget is {QUERY_BUDGETS[name]}. Repeated:\n'
+            + '\n'.join(f'{count}x {sql}' for sql, count in duplicates.items())
+        )
+
+    def test_every_url_has_a_budget(self):
+        names = {pattern.name for pattern in urls.urlpatterns}
+        self.assertEqual(names, set(QUERY_BUDGETS))
+        self.assertEqual(names, set(self.requests()))
+
+    def test_query_budgets(self):
+        for name, (method, url, kwargs) in self.requests().items():
+            with self.subTest(name):
+                # start every request from the same data, cache and session
+                savepoint = transaction.savepoint()
+                try:
+                    self.assertQueryBudget(name, method, url, kwargs)
+                finally:
+                    transaction.savepoint_rollback(savepoint)
+                    cache.clear()
+                    self.client.force_login(self.admin)
+
+
+class ApiTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username='jane', email='jane@example.com', password='x', user_type=UserTypes.NORMAL_USER
+        )
+        cls.vendor = Vendor.objects.create(
+            user=User.objects.create_user(
+                username='acme', email='acme@example.com', password='x', user_type=UserTypes.VENDOR
+            ),
+            vendor_name='Acme',
+            company_established_on=2001
+        )
+        cls.products = [
+            Product.objects.create(
+                vendor=cls.vendor,
+                name=f'Product {i}',
+                software_type='ERP',
+                module='Finance',
+                client_type='Enterprise',
+                business_area='Accounting',
+                cloud_status=CloudStatus.NATIVE
+            )
+            for i in range(3)
+        ]
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def test_sparse_fields_and_include(self):
+        response = self.client.get(
+            reverse('api_list', args=['products']), {'fields': 'name', 'include': 'vendor'}
+        )
+
+        self.assertEqual(response.status_code, 200)
+        first = response.json()['results'][0]
+        self.assertEqual(set(first), {'id', 'name', 'vendor'})
+        self.assertEqual(first['vendor']['vendor_name'], 'Acme')
+
+    def test_cursor_pagination(self):
+        url = reverse('api_list', args=['products'])
+        first = self.client.get(url, {'page_size': 2}).json()
+        second = self.client.get(url, {'page_size': 2, 'after': first['next']}).json()
+
+        ids = [row['id'] for row in first['results'] + second['results']]
+        self.assertEqual(sorted(ids, reverse=True), [product.pk for product in reversed(self.products)])
+        self.assertIsNone(second['next'])
+
+    def test_unchanged_data_is_not_modified(self):
+        url = reverse('api_detail', args=['vendors', self.vendor.pk])
+        response = self.client.get(url, {'include': 'products'})
+
+        # session, user and one validator query each for the vendor and its
+        # products; no rows are read
+        with self.assertNumQueries(4):
+            cached = self.client.get(url, {'include': 'products'}, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(cached.status_code, 304)
+
+        self.products[0].save()
+        changed = self.client.get(url, {'include': 'products'}, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(changed.status_code, 200)
+        self.assertNotEqual(changed['ETag'], response['ETag'])
+
+        # reviews of included rows change their rating but not their timestamp
+        Comment.objects.create(commented_by=self.user, product=self.products[1], rating=5, content='Great')
+        reviewed = self.client.get(url, {'include': 'products'}, HTTP_IF_NONE_MATCH=changed['ETag'])
+        self.assertEqual(reviewed.status_code, 200)
+
+        url = reverse('api_list', args=['products'])
+        response = self.client.get(url, {'include': 'vendor'})
+        with self.captureOnCommitCallbacks(execute=True):
+            Comment.objects.create(commented_by=self.user, vendor=self.vendor, rating=4, content='Solid')
+        reviewed = self.client.get(url, {'include': 'vendor'}, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(reviewed.status_code, 200)
+        self.assertEqual(reviewed.json()['results'][0]['vendor']['rating_count'], 1)
+
+    def test_list_is_revalidated_from_the_cache(self):
+        url = reverse('api_list', args=['products'])
+        response = self.client.get(url)
+        self.assertNotIn('Last-Modified', response)
+
+        # session and user only; the ETag comes from the generation counters
+        with self.assertNumQueries(2):
+            cached = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(cached.status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.products[-1].delete()
+        deleted = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(deleted.status_code, 200)
+        self.assertEqual(len(deleted.json()['results']), 2)
+
+    def test_deleted_include_changes_the_detail(self):
+        url = reverse('api_detail', args=['vendors', self.vendor.pk])
+        response = self.client.get(url, {'include': 'products'})
+        self.assertNotIn('Last-Modified', response)
+
+        self.products[-1].delete()
+        deleted = self.client.get(url, {'include': 'products'}, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(deleted.status_code, 200)
+        self.assertEqual(len(deleted.json()['products']), 2)
+
+    def test_invalid_requests(self):
+        response = self.client.get(reverse('api_list', args=['products']), {'fields': 'password'})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.client.get(reverse('api_list', args=['users'])).status_code, 404)
+        self.assertEqual(self.client.get(reverse('api_detail', args=['products', 0])).status_code, 404)
+
+
+class ConditionalPageTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username='jane', email='jane@example.com', password='x', user_type=UserTypes.NORMAL_USER
+        )
+        cls.vendor = Vendor.objects.create(
+            user=User.objects.create_user(
+                username='acme', email='acme@example.com', password='x', user_type=UserTypes.VENDOR
+            ),
+            vendor_name='Acme',
+            company_established_on=2001
+        )
+        cls.product = Product.objects.create(
+            vendor=cls.vendor,
+            name='Ledger',
+            software_type='ERP',
+            module='Finance',
+            client_type='Enterprise',
+            business_area='Accounting',
+            cloud_status=CloudStatus.NATIVE
+        )
+
+    def setUp(self):
+        self.client.force_login(self.user)
+        self.url = reverse('product_detail', args=[self.product.pk])
+
+    def test_repeat_view_is_not_modified(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response['Cache-Control'], 'private, no-cache')
+
+        # session, user and the page version; no reviews are loaded
+        with self.assertNumQueries(3):
+            cached = self.client.get(self.url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(cached.status_code, 304)
+        self.assertNotIn('Last-Modified', response)
+
+    def test_deleted_child_changes_the_page(self):
+        # the older document's delete leaves the newest timestamp unchanged
+        older = Document.objects.create(product=self.product, description='Old spec')
+        Document.objects.create(product=self.product, description='New spec')
+        etag = self.client.get(self.url)['ETag']
+        older.delete()
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_new_review_changes_the_page(self):
+        etag = self.client.get(self.url)['ETag']
+        Comment.objects.create(commented_by=self.user, product=self.product, rating=5, content='Great')
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_versions_are_per_user(self):
+        etag = self.client.get(self.url)['ETag']
+        self.client.force_login(self.vendor.user)
+
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_missing_object_is_not_found(self):
+        self.assertEqual(self.client.get(reverse('vendor_detail', args=[0])).status_code, 404)
+
+
+class CountingCache(LocMemCache):
+    """
+    Counts the reads that would each be a round trip to a shared cache.
+    """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.reads = Counter()
+
+    def get(self, key, default=None, version=None):
+        self.reads['get'] += 1
+        return super().get(key, default, version)
+
+    def get_many(self, keys, version=None):
+        self.reads['get_many'] += 1
+        missing = object()
+        values = {}
+        for key in keys:
+            value = super().get(key, missing, version)
+            if value is not missing:
+                values[key] = value
+        return values
+
+
+class FragmentCacheTests(TestCase):
+    template = Template(
+        "{% load fragment_cache %}"
+        "{% cache_collection 'products' 'main.product' %}"
+        "{% for product in products %}{% cache_row 'product_row' product %}"
+        "{{ product.name }}:{{ render.count }};"
+        "{% endcache_row %}{% endfor %}"
+        "{% endcache_collection %}"
+    )
+
+    @classmethod
+    def setUpTestData(cls):
+        vendor = Vendor.objects.create(
+            user=User.objects.create_user(
+                username='acme', email='acme@example.com', password='x', user_type=UserTypes.VENDOR
+            ),
+            vendor_name='Acme',
+            company_established_on=2001
+        )
+        cls.products = [
+            Product.objects.create(
+                vendor=vendor,
+                name=f'Product {i}',
+                software_type='ERP',
+                module='Finance',
+                client_type='Enterprise',
+                business_area='Accounting',
+                cloud_status=CloudStatus.NATIVE
+            )
+            for i in range(3)
+        ]
+
+    def setUp(self):
+        cache.clear()
+
+    def render(self):
+        # counts how often each row body is rendered rather than read from the cache
+        counter = {'count': 0}
+
+        class Render:
+            @property
+            def count(self):
+                counter['count'] += 1
+                return counter['count']
+
+        output = self.template.render(Context({
+            'products': Product.objects.order_by('pk'), 'render': Render()
+        }))
+        return output, counter['count']
+
+    @override_settings(FRAGMENT_CACHE_STATS=True)
+    def test_unchanged_list_is_served_from_cache(self):
+        first, rendered = self.render()
+        self.assertEqual(rendered, 3)
+
+        second, rendered = self.render()
+        self.assertEqual((second, rendered), (first, 0))
+        self.assertEqual(
+            {row['name']: (row['hits'], row['misses']) for row in get_stats()},
+            {'products': (1, 1), 'product_row': (0, 3)}
+        )
+
+    def test_only_changed_rows_are_rendered_again(self):
+        self.render()
+        product = self.products[1]
+        product.name = 'Renamed'
+        with self.captureOnCommitCallbacks(execute=True):
+            product.save()
+
+        output, rendered = self.render()
+        self.assertEqual(rendered, 1)
+        self.assertIn('Renamed:1;', output)
+
+    @override_settings(CACHES={'default': {'BACKEND': 'apps.main.tests.CountingCache', 'LOCATION': 'fragments'}})
+    def test_rows_are_read_in_one_round_trip(self):
+        self.render()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.products[1].save()
+        reads = caches['default'].reads
+        reads.clear()
+
+        _, rendered = self.render()
+        self.assertEqual(rendered, 1)
+        # the generations, the collection, then the three rows at once
+        self.assertEqual(reads, {'get_many': 2, 'get': 1})
+
+    def test_stats_are_off_by_default(self):
+        self.render()
+        self.render()
+        self.assertEqual(get_stats(), [])
+
+    def test_vary_on_values_are_part_of_the_key(self):
+        template = Template(
+            "{% load fragment_cache %}"
+            "{% cache_collection 'products' 'main.product' vary_on page %}{{ page }}{% endcache_collection %}"
+        )
+        self.assertEqual(template.render(Context({'page': 1})), '1')
+        self.assertEqual(template.render(Context({'page': 2})), '2')
+        self.assertEqual(template.render(Context({'page': 1})), '1')
+
+
+class FacetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.vendors = [
+            Vendor.objects.create(
+                user=User.objects.create_user(
+                    username=f'vendor{i}', email=f'vendor{i}@example.com', password='x',
+                    user_type=UserTypes.VENDOR
+                ),
+                vendor_name=f'Vendor {i}',
+                company_established_on=2000 + i
+            )
+            for i in range(2)
+        ]
+        for i, (cloud_status, business_area) in enumerate([
+            (CloudStatus.NATIVE, 'Accounting'),
+            (CloudStatus.NATIVE, 'Payroll'),
+            (CloudStatus.BASED, 'Accounting'),
+        ]):
+            Product.objects.create(
+                vendor=cls.vendors[i % 2],
+                name=f'Product {i}',
+                software_type='ERP',
+                module='Finance',
+                client_type='Enterprise',
+                business_area=business_area,
+                cloud_status=cloud_status,
+                next_review_date=timezone.make_aware(datetime(2026, 1, 10 + i))
+            )
+
+    def counts(self, facets, name):
+        return {item['value']: item['count'] for item in facets[name]}
+
+    def test_facets_are_counted_in_one_query(self):
+        params = QueryDict('cloud_status=Native')
+        with self.assertNumQueries(1):
+            facets = facet_counts(Product.objects.all(), params)
+
+        # a facet is counted without its own filter, so other values stay selectable
+        self.assertEqual(self.counts(facets, 'cloud_status'), {'Native': 2, 'Based': 1})
+        self.assertEqual(self.counts(facets, 'business_area'), {'Accounting': 1, 'Payroll': 1})
+        self.assertEqual(
+            self.counts(facets, 'vendor_id'), {str(self.vendors[0].pk): 1, str(self.vendors[1].pk): 1}
+        )
+        self.assertTrue(next(item for item in facets['cloud_status'] if item['value'] == 'Native')['selected'])
+
+    def test_review_date_range(self):
+        params = QueryDict('next_review_from=2026-01-11&next_review_to=2026-01-12')
+        products = filter_products(Product.objects.all(), params)
+
+        self.assertEqual(sorted(products.values_list('name', flat=True)), ['Product 1', 'Product 2'])
+
+
+class AsyncViewTests(TransactionTestCase):
+    # queries run on worker threads with their own connections, which only
+    # see committed rows
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='jane', email='jane@example.com', password='x', user_type=UserTypes.NORMAL_USER
+        )
+        self.vendor = Vendor.objects.create(
+            user=User.objects.create_user(
+                username='acme', email='acme@example.com', password='x', user_type=UserTypes.VENDOR
+            ),
+            vendor_name='Acme',
+            company_established_on=2001
+        )
+        self.product = Product.objects.create(
+            vendor=self.vendor,
+            name='Ledger',
+            software_type='ERP',
+            module='Finance',
+            client_type='Enterprise',
+            business_area='Accounting',
+            cloud_status=CloudStatus.NATIVE
+        )
+        Comment.objects.create(commented_by=self.user, product=self.product, rating=4, content='Solid')
+        self.client.force_login(self.user)
+
+    def test_pages_match_the_sync_views(self):
+        for name, args in (
+            ('home', []),
+            ('vendor_detail', [self.vendor.pk]),
+            ('product_detail', [self.product.pk]),
+        ):
+            with self.subTest(name):
+                sync_response = self.client.get(reverse(name, args=args))
+                async_response = self.client.get(reverse(f'{name}_async', args=args))
+
+                self.assertEqual(async_response.status_code, 200)
+                self.assertEqual(async_response.content, sync_response.content)
+
+    def test_missing_vendor_is_not_found(self):
+        self.assertEqual(self.client.get(reverse('vendor_detail_async', args=[0])).status_code, 404)
+
+    def conn_max_age(self, value):
+        for alias in connections:
+            settings_dict = connections[alias].settings_dict
+            self.addCleanup(settings_dict.__setitem__, 'CONN_MAX_AGE', settings_dict['CONN_MAX_AGE'])
+            settings_dict['CONN_MAX_AGE'] = value
+
+    def query_thread(self):
+        async def run():
+            return await query(threading.get_ident)
+        return async_to_sync(run)()
+
+    def test_queries_share_the_request_connection_without_persistent_connections(self):
+        self.conn_max_age(0)
+        self.assertEqual(self.query_thread(), threading.get_ident())
+
+    def test_queries_run_on_worker_threads_with_persistent_connections(self):
+        self.conn_max_age(60)
+        self.assertNotEqual(self.query_thread(), threading.get_ident())
+
+        response = self.client.get(reverse('product_detail_async', args=[self.product.pk]))
+        self.assertEqual(response.status_code, 200)
+
+
+@override_settings(DATABASE_REPLICAS=['replica'], DATABASE_ROUTERS=['apps.main.routers.ReplicaRouter'])
+class ReplicaRouterTests(TransactionTestCase):
+    # outside the test transaction, so reads are not kept on the primary
+
+    def handle(self, request, write=False):
+        reads = []
+
+        def view(request):
+            reads.append(router.db_for_read(Product))
+            if write:
+                Product.objects.filter(pk=0).update(name='Ledger')
+                reads.append(router.db_for_read(Product))
+            return HttpResponse()
+
+        return ReplicaPinMiddleware(view)(request), reads
+
+    def test_reads_outside_a_request_use_the_primary(self):
+        self.assertEqual(router.db_for_read(Product), 'default')
+        self.assertEqual(router.db_for_write(Product), 'default')
+
+    def test_write_pins_the_client_to_the_primary(self):
+        response, reads = self.handle(RequestFactory().get('/'), write=True)
+
+        self.assertEqual(reads, ['replica', 'default'])
+        self.assertIn(REPLICA_PIN_COOKIE, response.cookies)
+
+        request = RequestFactory().get('/')
+        request.COOKIES[REPLICA_PIN_COOKIE] = response.cookies[REPLICA_PIN_COOKIE].value
+        self.assertEqual(self.handle(request)[1], ['default'])
+
+    def test_expired_pin_and_unsafe_requests(self):
+        request = RequestFactory().get('/')
+        request.COOKIES[REPLICA_PIN_COOKIE] = '1'
+        response, reads = self.handle(request)
+
+        self.assertEqual(reads, ['replica'])
+        self.assertNotIn(REPLICA_PIN_COOKIE, response.cookies)
+        self.assertEqual(self.handle(RequestFactory().post('/'))[1], ['default'])
+
+    def test_reads_in_a_transaction_use_the_primary(self):
+        def view(request):
+            with transaction.atomic():
+                return HttpResponse(router.db_for_read(Product))
+
+        self.assertEqual(ReplicaPinMiddleware(view)(RequestFactory().get('/')).content, b'default')
+
+    @override_settings(DATABASE_REPLICAS=['replica', 'replica_2'])
+    def test_request_reads_from_one_replica(self):
+        def view(request):
+            return HttpResponse(','.join(router.db_for_read(Product) for _ in range(20)))
+
+        reads = ReplicaPinMiddleware(view)(RequestFactory().get('/')).content.decode().split(',')
+        self.assertEqual(len(set(reads)), 1)
+        self.assertIn(reads[0], ['replica', 'replica_2'])
+
+
+# a replica alias with a test database of its own, which never receives the
+# rows written to the primary, like a replica that has not caught up yet
+LAGGING_REPLICA = 'replica' in settings.DATABASES and not settings.DATABASES['replica'].get('TEST', {}).get('MIRROR')
+
+
+@skipUnless(LAGGING_REPLICA, 'needs a "replica" alias with its own test database')
+@override_settings(DATABASE_REPLICAS=['replica'], DATABASE_ROUTERS=['apps.main.routers.ReplicaRouter'])
+class LaggingReplicaTests(TransactionTestCase):
+    databases = {'default', 'replica'} if LAGGING_REPLICA else {'default'}
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            username='acme', email='acme@example.com', password='x', user_type=UserTypes.VENDOR
+        )
+        self.vendor = Vendor.objects.create(user=self.user, vendor_name='Acme', company_established_on=2001)
+        self.product = Product.objects.create(
+            vendor=self.vendor, name='Ledger', software_type='ERP', module='Finance',
+            client_type='Enterprise', business_area='Accounting', cloud_status=CloudStatus.NATIVE
+        )
+        self.permission = Permissions.objects.create(
+            codename='approve_vendor', name='Can approve vendor',
+            content_type=ContentType.objects.get_for_model(Vendor)
+        )
+        self.user.user_permissions.add(self.permission)
+
+    def read(self, func):
+        token = start_routing(pinned=False)
+        try:
+            return func()
+        finally:
+            finish_routing(token)
+
+    def test_cache_fills_read_from_the_primary(self):
+        self.assertFalse(self.read(Product.objects.exists))
+
+        stats = self.read(get_dashboard_stats)
+        self.assertEqual((stats['users'], stats['companies'], stats['applications']), (1, 1, 1))
+        self.assertEqual(stats['latest_applications'], [self.product])
+
+        direct, _ = self.read(lambda: get_user_permission_codenames(self.user.pk))
+        self.assertEqual(direct, {'main.approve_vendor'})
+        self.assertEqual(self.read(get_managed_permissions), [self.permission])
+
+        fragment = self.read(lambda: get_or_render('products', ['all'], lambda: str(Product.objects.count())))
+        self.assertEqual(fragment, '1')
+
+
+class ProvisionUsersTests(TestCase):
+    def setUp(self):
+        User.objects.create_user(
+            username='jane', email='jane@example.com', password='x', user_type=UserTypes.NORMAL_USER
+        )
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        self.path = os.path.join(directory, 'users.csv')
+
+    def provision(self, content, **options):
+        with open(self.path, 'w') as fileobj:
+            fileobj.write(content)
+        out = io.StringIO()
+        call_command('provision_users', self.path, stdout=out, **options)
+        return out.getvalue()
+
+    def test_users_are_created_with_profiles(self):
+        out = self.provision(
+            'Username,Email,Password,User Type\n'
+            'ann,ann@example.com,secret-1,Vendor\n'
+            'bob,bob@example.com,,\n'
+            'jane,other@example.com,secret-2,\n'
+            'cat,ann@example.com,secret-3,\n'
+            'dan,not-an-email,secret-4,\n',
+            workers=2
+        )
+
+        ann, bob = User.objects.get(username='ann'), User.objects.get(username='bob')
+        self.assertTrue(ann.check_password('secret-1'))
+        self.assertEqual(ann.user_type, UserTypes.VENDOR.value)
+        self.assertFalse(bob.has_usable_password())
+        self.assertEqual(Profile.objects.filter(user__in=[ann, bob]).count(), 2)
+        self.assertFalse(User.objects.filter(username__in=['cat', 'dan']).exists())
+        self.assertIn('Provisioned 2 of 5 users (3 failed)', out)
+
+    def test_failed_insert_only_rejects_the_offending_rows(self):
+        class RacingImporter(UserImporter):
+            # another writer added the taken accounts after they were checked
+            def resolve(self, rows):
+                return {'usernames': set(), 'emails': set()}
+
+        rows = [
+            {'username': 'ann', 'email': 'ann@example.com', 'password': 'secret'},
+            {'username': 'jane', 'email': 'jane@example.com', 'password': 'secret'},
+            {'username': 'bob', 'email': 'bob@example.com', 'password': 'secret'},
+        ]
+        result = RacingImporter(workers=0).run(enumerate(rows, start=2))
+
+        self.assertEqual(result.created, 2)
+        self.assertEqual([error['row'] for error in result.errors], [3])
+        self.assertEqual(Profile.objects.filter(user__username__in=['ann', 'bob']).count(), 2)
+
+    def test_json_file_is_hashed_inline(self):
+        self.path = self.path.replace('.csv', '.json')
+        self.provision(json.dumps([{'username': 'eve', 'email': 'eve@example.com', 'password': 'secret'}]), workers=0)
+
+        self.assertTrue(User.objects.get(username='eve').check_password('secret'))
+
+
+class RatingSummaryTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='jane', email='jane@example.com', password='x', user_type=UserTypes.NORMAL_USER
+        )
+        self.vendor = Vendor.objects.create(user=self.user, vendor_name='Acme', company_established_on=2001)
+        self.product = Product.objects.create(vendor=self.vendor, name='Ledger', cloud_status=CloudStatus.NATIVE)
+        self.comment = Comment.objects.create(commented_by=self.user, product=self.product, rating=2)
+
+    def test_edited_rating_moves_the_summary(self):
+        comment = Comment.objects.get(pk=self.comment.pk)
+        comment.rating = 5
+        comment.save()
+
+        self.product.refresh_from_db()
+        self.assertEqual((self.product.rating_sum, self.product.rating_count), (5, 1))
+        self.assertEqual((self.product.rating_2_count, self.product.rating_5_count), (0, 1))
+
+    def test_comment_moved_without_loading_its_rating(self):
+        comment = Comment.objects.defer('rating', 'vendor', 'product').get(pk=self.comment.pk)
+        comment.product, comment.vendor = None, self.vendor
+        comment.save()
+
+        self.product.refresh_from_db()
+        self.vendor.refresh_from_db()
+        self.assertEqual((self.product.rating_sum, self.product.rating_count), (0, 0))
+        self.assertEqual((self.vendor.rating_sum, self.vendor.rating_2_count), (2, 1))
+
+
+class ReportJobTests(TestCase):
+    def job(self, **fields):
+        job = ReportJob.objects.create(report=SOFTWARE_REPORT, data_version=software_report_version())
+        ReportJob.objects.filter(pk=job.pk).update(**fields)
+        return job
+
+    def requested(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            job = request_software_report()
+        return job, len(callbacks)
+
+    def test_queued_job_is_not_submitted_again(self):
+        self.job()
+
+        self.assertEqual(self.requested()[1], 0)
+
+    def test_lost_pending_job_is_submitted_again(self):
+        self.job(created_at=timezone.now() - timedelta(hours=1))
+
+        self.assertEqual(self.requested()[1], 1)
+
+    def test_stale_running_job_is_requeued(self):
+        self.job(status=JobStatus.RUNNING, started_at=timezone.now() - timedelta(hours=1))
+
+        job, submitted = self.requested()
+        self.assertEqual(submitted, 1)
+        self.assertEqual(ReportJob.objects.get(pk=job.pk).status, JobStatus.PENDING)
+
+
+class PermissionAssignmentTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='jane', email='jane@example.com', password='x', user_type=UserTypes.NORMAL_USER
+        )
+        self.permission = Permissions.objects.create(
+            codename='approve_vendor', name='Can approve vendor',
+            content_type=ContentType.objects.get_for_model(Vendor)
+        )
+
+    def post_batch(self):
+        return self.client.post(
+            reverse('assign_permissions_batch'),
+            json.dumps({'operations': [
+                {'user_id': self.user.pk, 'permission_id': self.permission.pk, 'action': 'grant'}
+            ]}),
+            content_type='application/json'
+        )
+
+    def test_anonymous_and_non_admin_callers_are_refused(self):
+        self.assertEqual(self.post_batch().status_code, 302)
+
+        self.client.force_login(self.user)
+        self.assertEqual(self.post_batch().status_code, 403)
+        self.assertFalse(User.user_permissions.through.objects.exists())
+
+    def test_admin_can_grant(self):
+        self.client.force_login(User.objects.create_user(
+            username='root', email='root@example.com', password='x', user_type=UserTypes.ADMIN
+        ))
+
+        self.assertEqual(self.post_batch().status_code, 200)
+        self.assertTrue(self.user.user_permissions.filter(pk=self.permission.pk).exists())
+
+
+class CreatePermissionsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def sync(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('create_permissions', stdout=io.StringIO())
+
+    def test_synced_names_reach_the_cached_catalog(self):
+        self.sync()
+        permission = Permissions.objects.order_by('pk').first()
+        Permissions.objects.filter(pk=permission.pk).update(name='Outdated name')
+        self.assertIn('Outdated name', [entry.name for entry in get_managed_permissions()])
+
+        self.sync()
+
+        names = [entry.name for entry in get_managed_permissions()]
+        self.assertNotIn('Outdated name', names)
+        self.assertIn(permission.name, names)
+
+
+class DocumentFileTestCase(TestCase):
+    content = b'%PDF-1.4 specification'
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.user = User.objects.create_user(
+            username='acme', email='acme@example.com', password='x', user_type=UserTypes.VENDOR
+        )
+        vendor = Vendor.objects.create(user=self.user, vendor_name='Acme', company_established_on=2001)
+        self.products = [
+            Product.objects.create(vendor=vendor, name=f'Product {i}', cloud_status=CloudStatus.NATIVE)
+            for i in range(2)
+        ]
+        self.client.force_login(self.user)
+
+
+class DocumentUploadTests(DocumentFileTestCase):
+    def upload(self):
+        session = start_upload(self.user, 'spec.pdf', len(self.content))
+        append_chunk(session.pk, 0, io.BytesIO(self.content), len(self.content))
+        return session
+
+    def complete(self, session, product_ids):
+        return self.client.post(
+            reverse('complete_upload', args=[session.pk]),
+            json.dumps({'product_ids': product_ids}),
+            content_type='application/json'
+        )
+
+    def test_identical_content_shares_one_blob(self):
+        first = self.complete(self.upload(), [self.products[0].pk]).json()
+        second = self.complete(self.upload(), [self.products[1].pk]).json()
+
+        self.assertFalse(first['deduplicated'])
+        self.assertTrue(second['deduplicated'])
+        blob = Blob.objects.get()
+        self.assertEqual(blob.ref_count, 2)
+        self.assertEqual(set(Document.objects.values_list('blob', flat=True)), {blob.pk})
+
+    def test_blob_is_deleted_with_its_last_document(self):
+        self.complete(self.upload(), [product.pk for product in self.products])
+        blob = Blob.objects.get()
+        first, second = Document.objects.all()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            first.delete()
+        self.assertEqual(Blob.objects.get().ref_count, 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            second.delete()
+        self.assertFalse(Blob.objects.exists())
+        self.assertFalse(default_storage.exists(blob.file.name))
+
+    def test_retried_completion_attaches_once(self):
+        session = self.upload()
+        first = self.complete(session, [self.products[0].pk])
+        retry = self.complete(session, [self.products[0].pk])
+
+        self.assertEqual(retry.status_code, 200)
+        self.assertEqual(retry.json()['documents'], first.json()['documents'])
+        self.assertEqual(Document.objects.count(), 1)
+        self.assertEqual(Blob.objects.get().ref_count, 1)
+
+    def test_completed_upload_without_blob_is_gone(self):
+        session = self.upload()
+        self.complete(session, [])
+        Blob.objects.all().delete()
+
+        self.assertEqual(self.complete(session, [self.products[0].pk]).status_code, 409)
+        self.assertFalse(Document.objects.exists())
+
+    def test_chunk_is_received_before_the_session_is_locked(self):
+        session = start_upload(self.user, 'spec.pdf', len(self.content))
+        depth = len(connection.atomic_blocks)
+        depths = []
+
+        class Client(io.BytesIO):
+            def read(stream, size=-1):
+                depths.append(len(connection.atomic_blocks))
+                return super().read(size)
+
+        append_chunk(session.pk, 0, Client(self.content), len(self.content))
+        self.assertEqual(set(depths), {depth})
+
+    def test_chunk_sent_twice_at_once_is_appended_once(self):
+        session = start_upload(self.user, 'spec.pdf', len(self.content))
+        content = self.content
+
+        class Client(io.BytesIO):
+            def read(stream, size=-1):
+                if not stream.tell():
+                    # the retry of a request that looked lost finishes first
+                    append_chunk(session.pk, 0, io.BytesIO(content), len(content))
+                return super().read(size)
+
+        with self.assertRaises(UploadOffsetMismatch):
+            append_chunk(session.pk, 0, Client(self.content), len(self.content))
+        with open(partial_path(session), 'rb') as partial:
+            self.assertEqual(partial.read(), self.content)
+        self.assertEqual(os.listdir(upload_temp_dir()), [f'{session.pk}.part'])
+
+    def test_abandoned_uploads_expire(self):
+        abandoned = start_upload(self.user, 'old.pdf', len(self.content))
+        append_chunk(abandoned.pk, 0, io.BytesIO(self.content[:4]), 4)
+        UploadSession.objects.filter(pk=abandoned.pk).update(
+            updated_at=timezone.now() - timedelta(seconds=UPLOAD_EXPIRY + 1)
+        )
+        active = start_upload(self.user, 'new.pdf', len(self.content))
+        stray = os.path.join(upload_temp_dir(), 'f00.part')
+        open(stray, 'wb').close()
+
+        out = io.StringIO()
+        call_command('expire_uploads', stdout=out)
+
+        self.assertIn('Deleted 1 uploads', out.getvalue())
+        self.assertEqual(list(UploadSession.objects.values_list('pk', flat=True)), [active.pk])
+        self.assertEqual(os.listdir(upload_temp_dir()), [f'{active.pk}.part'])
+
+    def test_failed_document_save_discards_the_new_blob(self):
+        upload = SimpleUploadedFile('spec.pdf', self.content)
+
+        with self.assertRaises(IntegrityError):
+            # a document without a product cannot be saved
+            save_uploaded_document(Document(), upload)
+
+        self.assertFalse(Blob.objects.exists())
+        self.assertFalse(default_storage.exists(blob_name(hashlib.sha256(self.content).hexdigest(), 'spec.pdf')))
+
+
+class DocumentDownloadTests(DocumentFileTestCase):
+    def setUp(self):
+        super().setUp()
+        self.document = save_uploaded_document(
+            Document(product=self.products[0]), SimpleUploadedFile('spec.pdf', self.content)
+        )
+        self.url = reverse('download_document', args=[self.document.pk])
+
+    def download(self, **headers):
+        response = self.client.get(self.url, headers=headers)
+        if response.streaming:
+            return response, b''.join(response.streaming_content)
+        return response, response.content
+
+    def test_range_request_returns_partial_content(self):
+        response, content = self.download(Range='bytes=0-3')
+
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(content, self.content[:4])
+        self.assertEqual(response['Content-Range'], f'bytes 0-3/{len(self.content)}')
+
+    def test_unsatisfiable_range(self):
+        response, _ = self.download(Range=f'bytes={len(self.content)}-')
+
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], f'bytes */{len(self.content)}')
+
+    def test_if_range_sends_the_whole_file_once_it_changed(self):
+        etag = self.download()[0]['ETag']
+
+        self.assertEqual(self.download(Range='bytes=0-3', If_Range=etag)[0].status_code, 206)
+        response, content = self.download(Range='bytes=0-3', If_Range='"outdated"')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(content, self.content)
+
+    def test_missing_legacy_file_is_not_found(self):
+        document = Document.objects.create(product=self.products[0], document='products/documents/missing.pdf')
+
+        self.assertEqual(self.client.get(reverse('download_document', args=[document.pk])).status_code, 404)
+
+    def test_unsluggable_product_name_falls_back_to_the_blob_name(self):
+        self.products[0].name = '***'
+        stem = hashlib.sha256(self.content).hexdigest()
+
+        self.assertEqual(download_filename(self.document), f'{stem}.pdf')
+
+
+class FailingEmailBackend(BaseEmailBackend):
+    def send_messages(self, email_messages):
+        raise SMTPException('Connection refused')
+
+
+class RefusingEmailBackend(locmem.EmailBackend):
+    """
+    Delivers to the locmem outbox but refuses any batch addressed to globex.
+    """
+    def send_messages(self, email_messages):
+        if any('globex@example.com' in message.to for message in email_messages):
+            raise SMTPException('Recipient refused')
+        return super().send_messages(email_messages)
+
+
+class ReviewReminderTests(TestCase):
+    def setUp(self):
+        for name in ('acme', 'globex'):
+            vendor = Vendor.objects.create(
+                user=User.objects.create_user(
+                    username=name, email=f'{name}@example.com', password='x', user_type=UserTypes.VENDOR
+                ),
+                vendor_name=name.title(),
+                company_established_on=2001
+            )
+            Product.objects.create(
+                vendor=vendor, name=f'{name} ledger', cloud_status=CloudStatus.NATIVE,
+                next_review_date=timezone.now() + timedelta(days=2)
+            )
+        # after the products were saved, so later runs do not take them for edited
+        self.now = timezone.now()
+
+    def test_digests_are_sent_once(self):
+        self.assertEqual(send_review_reminders(now=self.now, batch_size=1), (2, 2))
+        self.assertEqual(len(mail.outbox), 2)
+        self.assertEqual(ReminderCheckpoint.objects.get().last_notified, 2)
+
+        self.assertEqual(send_review_reminders(now=self.now + timedelta(hours=1)), (0, 0))
+        self.assertEqual(len(mail.outbox), 2)
+
+    def test_failed_send_is_resumed_on_the_next_run(self):
+        with override_settings(EMAIL_BACKEND='apps.main.tests.FailingEmailBackend'):
+            with self.assertRaises(SMTPException):
+                send_review_reminders(now=self.now)
+
+        self.assertEqual(send_review_reminders(now=self.now + timedelta(hours=1)), (2, 2))
+        self.assertEqual(len(mail.outbox), 2)
+
+    def test_failed_batch_resumes_after_the_last_sent_user(self):
+        with override_settings(EMAIL_BACKEND='apps.main.tests.RefusingEmailBackend'):
+            with self.assertRaises(SMTPException):
+                send_review_reminders(now=self.now, batch_size=1)
+        self.assertEqual([message.to for message in mail.outbox], [['acme@example.com']])
+        checkpoint = ReminderCheckpoint.objects.get()
+        self.assertIsNone(checkpoint.due_until)
+        self.assertIsNone(checkpoint.claimed_until)
+        self.assertEqual(checkpoint.last_notified, 1)
+
+        self.assertEqual(send_review_reminders(now=self.now + timedelta(hours=1), batch_size=1), (1, 1))
+        self.assertEqual([message.to for message in mail.outbox], [['acme@example.com'], ['globex@example.com']])
+        checkpoint.refresh_from_db()
+        self.assertIsNotNone(checkpoint.due_until)
+        self.assertIsNone(checkpoint.pending_due_until)
+        self.assertEqual(checkpoint.last_run_at, self.now)
+        self.assertEqual(checkpoint.last_notified, 2)
+
+        self.assertEqual(send_review_reminders(now=self.now + timedelta(hours=2)), (0, 0))
+
+    def test_claimed_checkpoint_is_left_to_its_run(self):
+        ReminderCheckpoint.objects.create(
+            name='review_reminders', claimed_until=timezone.now() + timedelta(minutes=5)
+        )
+        self.assertEqual(send_review_reminders(now=self.now), (0, 0))
+        self.assertEqual(mail.outbox, [])
+
+    def test_dry_run_keeps_the_checkpoint(self):
+        self.assertEqual(send_review_reminders(now=self.now, dry_run=True), (2, 2))
+
+        self.assertEqual(mail.outbox, [])
+        self.assertEqual(send_review_reminders(now=self.now), (2, 2))
+
+
+class ActivityLogTests(TransactionTestCase):
+    def setUp(self):
+        self.admin = User.objects.create_user(
+            username='root', email='root@example.com', password='x', user_type=UserTypes.ADMIN
+        )
+        self.user = User.objects.create_user(
+            username='jane', email='jane@example.com', password='x', user_type=UserTypes.NORMAL_USER
+        )
+        self.content_type = ContentType.objects.get_for_model(Vendor)
+
+    def test_rolled_back_changes_are_not_logged(self):
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            log_activity(None, ActivityVerb.UPDATED, self.user)
+            User.objects.create_user(username='jane', email='jane@example.com', password='x')
+        self.assertFalse(ActivityEvent.objects.exists())
+
+    @modify_settings(MIDDLEWARE={'append': 'apps.main.middleware.ActivityLogMiddleware'})
+    def test_request_events_are_written_in_one_insert(self):
+        permissions = [
+            Permissions.objects.create(codename=codename, name=codename, content_type=self.content_type)
+            for codename in ('approve_vendor', 'reject_vendor')
+        ]
+        self.client.force_login(self.admin)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(
+                reverse('assign_permissions_batch'),
+                json.dumps({'operations': [
+                    {'user_id': self.user.pk, 'permission_id': permission.pk, 'action': 'grant'}
+                    for permission in permissions
+                ]}),
+                content_type='application/json'
+            )
+
+        self.assertEqual(response.status_code, 200)
+        inserts = [query['sql'] for query in queries if query['sql'].startswith('INSERT INTO "activity_events"')]
+        self.assertEqual(len(inserts), 1)
+        self.assertEqual(ActivityEvent.objects.filter(verb=ActivityVerb.GRANTED).count(), 2)
+
+    def test_events_cannot_be_changed(self):
+        event = ActivityEvent.objects.create(
+            verb=ActivityVerb.CREATED, content_type=self.content_type, object_id='1', object_repr='Acme'
+        )
+        event.object_repr = 'Globex'
+        with self.assertRaises(ValueError):
+            event.save()
+        with self.assertRaises(ValueError):
+            event.delete()
+        self.assertEqual(ActivityEvent.objects.get().object_repr, 'Acme')
+
+    def test_feed_is_for_admins(self):
+        self.assertEqual(self.client.get(reverse('activity_feed')).status_code, 302)
+
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.get(reverse('activity_feed')).status_code, 403)
+
+        self.client.force_login(self.admin)
+        self.assertEqual(self.client.get(reverse('activity_feed')).status_code, 200)
+
+    def test_permission_events_share_one_object_type(self):
+        self.client.force_login(self.admin)
+        self.client.post(reverse('create_permission'), {
+            'name': 'Can approve vendor', 'content_type': self.content_type.pk, 'codename': 'approve_vendor',
+        })
+        permission = Permissions.objects.get(codename='approve_vendor')
+        self.client.post(reverse('update_permission', args=[permission.pk]), {
+            'name': 'Can approve vendors', 'content_type': self.content_type.pk, 'codename': 'approve_vendor',
+        })
+        self.client.post(reverse('delete_permission', args=[permission.pk]))
+
+        events = ActivityEvent.objects.filter(object_id=str(permission.pk))
+        self.assertEqual(
+            sorted(events.values_list('verb', flat=True)),
+            [ActivityVerb.CREATED, ActivityVerb.DELETED, ActivityVerb.UPDATED]
+        )
+        self.assertEqual({event.content_type.model for event in events}, {'permissions'})
+
+        response = self.client.get(reverse('activity_feed'), {'object_type': 'permissions', 'object_id': permission.pk})
+        self.assertEqual(len(response.context['events']), 3)
+        self.assertEqual(self.client.get(reverse('activity_feed'), {'object_type': 'permission'}).status_code, 200)
+        self.assertEqual(self.client.get(reverse('activity_feed'), {'object_type': 'nothing'}).status_code, 404)
+
+
+class SoftwareExportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        vendors = {
+            name: Vendor.objects.create(
+                user=User.objects.create_user(
+                    username=name.lower(), email=f'{name.lower()}@example.com', password='x',
+                    user_type=UserTypes.VENDOR
+                ),
+                vendor_name=name,
+                company_established_on=2001
+            )
+            for name in ('Acme', 'Globex')
+        }
+        for i, (vendor_name, cloud_status) in enumerate([
+            ('Acme', CloudStatus.NATIVE), ('Acme', CloudStatus.BASED), ('Globex', CloudStatus.NATIVE),
+        ]):
+            Product.objects.create(
+                vendor=vendors[vendor_name],
+                name=f'Product {i}',
+                software_type='ERP',
+                module='Finance',
+                client_type='Enterprise',
+                business_area='Accounting',
+                cloud_status=cloud_status
+            )
+
+    def export(self, params=None):
+        response = self.client.get(reverse('export_data_to_csv'), params or {})
+        self.assertTrue(response.streaming)
+        return list(csv.reader(io.StringIO(b''.join(response.streaming_content).decode())))
+
+    def test_header_and_vendor_column(self):
+        rows = self.export()
+
+        self.assertEqual(rows[0], [header for header, _ in PRODUCT_EXPORT_COLUMNS])
+        self.assertEqual(rows[0][0], 'Vendor')
+        self.assertEqual(
+            sorted((row[0], row[1]) for row in rows[1:]),
+            [('Acme', 'Product 0'), ('Acme', 'Product 1'), ('Globex', 'Product 2')]
+        )
+
+    def test_filters_narrow_the_export(self):
+        rows = self.export({'vendor': 'acme', 'cloud_status': 'Native'})
+        self.assertEqual([row[1] for row in rows[1:]], ['Product 0'])
+        self.assertEqual(len(self.export({'cloud_status': ['Native', 'Based']})), 4)
+        self.assertEqual(self.export({'vendor': 'Initech'}), [[header for header, _ in PRODUCT_EXPORT_COLUMNS]])
+
+    def test_rows_are_sent_in_chunks(self):
+        chunks = list(stream_csv(Product.objects.order_by('pk'), PRODUCT_EXPORT_COLUMNS, chunk_rows=2))
+
+        # the header, a full chunk of two rows and the remaining row
+        self.assertEqual(len(chunks), 3)
+        self.assertEqual(sum(chunk.count('\n') for chunk in chunks), 4)
+
+
+class KeysetPaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.vendors = [
+            Vendor.objects.create(
+                user=User.objects.create_user(
+                    username=f'vendor{i}', email=f'vendor{i}@example.com', password='x',
+                    user_type=UserTypes.VENDOR
+                ),
+                vendor_name=f'Vendor {i}',
+                company_established_on=2001
+            )
+            for i in range(5)
+        ]
+        # equal timestamps are ordered by primary key
+        Vendor.objects.update(created_at=timezone.make_aware(datetime(2026, 1, 1)))
+
+    def page(self, **params):
+        return paginate_keyset(Vendor.objects.all(), RequestFactory().get('/', params), page_size=2)
+
+    def test_cursor_round_trip(self):
+        created_at = timezone.make_aware(datetime(2026, 1, 1, 12, 30))
+        self.assertEqual(decode_cursor(encode_cursor(created_at, 42)), (created_at, 42))
+        for token in ('', 'not-a-cursor', encode_cursor(created_at, 1)[:-3]):
+            with self.assertRaises(InvalidCursor):
+                decode_cursor(token)
+
+    def test_pages_follow_each_other_on_equal_timestamps(self):
+        pks = sorted((vendor.pk for vendor in self.vendors), reverse=True)
+
+        first = self.page()
+        second = self.page(after=first.next_cursor)
+        last = self.page(after=second.next_cursor)
+        self.assertEqual([vendor.pk for vendor in first], pks[:2])
+        self.assertEqual([vendor.pk for vendor in second], pks[2:4])
+        self.assertEqual([vendor.pk for vendor in last], pks[4:])
+        self.assertFalse(first.has_previous)
+        self.assertFalse(last.has_next)
+
+        back = self.page(before=second.previous_cursor)
+        self.assertEqual([vendor.pk for vendor in back], pks[:2])
+        self.assertFalse(back.has_previous)
+        self.assertEqual(back.next_cursor, first.next_cursor)
+
+    def test_count_is_only_taken_on_request(self):
+        self.assertIsNone(self.page().count)
+        self.assertEqual(self.page(count='1').count, 5)
+
+    def test_invalid_cursor_is_not_found(self):
+        self.assertEqual(self.client.get(reverse('vendors'), {'after': 'not-a-cursor'}).status_code, 404)
+        self.assertEqual(self.client.get(reverse('vendors'), {'before': 'W10'}).status_code, 404)
+
+
+class SearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.vendor = Vendor.objects.create(
+            user=User.objects.create_user(
+                username='acme', email='acme@example.com', password='x', user_type=UserTypes.VENDOR
+            ),
+            vendor_name='Acme <Systems>',
+            description='Payroll and ledger software',
+            company_established_on=2001
+        )
+        cls.product = Product.objects.create(
+            vendor=cls.vendor,
+            name='Ledger Pro',
+            software_type='ERP',
+            module='Finance',
+            client_type='Enterprise',
+            business_area='Accounting',
+            cloud_status=CloudStatus.NATIVE
+        )
+
+    def hits(self, query, **kwargs):
+        return [(result.object_type, result.object_id) for result in search_catalog(query, **kwargs)]
+
+    def test_ranked_prefix_search(self):
+        results = search_catalog('ledg')
+
+        # a title match ranks above a description match
+        self.assertEqual(self.hits('ledg'), [('product', self.product.pk), ('vendor', self.vendor.pk)])
+        self.assertEqual(results[0].title, '<mark>Ledger</mark> Pro')
+        self.assertEqual(results[0].url, reverse('product_detail', args=[self.product.pk]))
+        self.assertEqual(self.hits('ledger payroll'), [('vendor', self.vendor.pk)])
+
+    def test_titles_are_escaped(self):
+        result = search_catalog('systems')[0]
+        self.assertEqual(result.title, 'Acme &lt;<mark>Systems</mark>&gt;')
+
+    def test_index_follows_saves_and_deletes(self):
+        self.product.name = 'Payslip Cloud'
+        self.product.save()
+        self.assertEqual(self.hits('payslip'), [('product', self.product.pk)])
+        self.assertNotIn(('product', self.product.pk), self.hits('ledger'))
+
+        self.product.delete()
+        self.assertEqual(self.hits('payslip'), [])
+
+    def test_fixture_loads_are_not_indexed(self):
+        self.product.name = 'Payslip Cloud'
+        self.product.save_base(raw=True)
+        self.assertEqual(self.hits('payslip'), [])
+
+        call_command('rebuild_search_index', stdout=io.StringIO())
+        self.assertEqual(self.hits('payslip'), [('product', self.product.pk)])
+
+    def test_databases_without_full_text_search_fall_back_to_icontains(self):
+        # get_backend only looks at the vendor of the connection
+        unsupported = SimpleNamespace(vendor='oracle')
+        results = search_catalog('ledger pro', connection=unsupported)
+
+        self.assertEqual(len(results), 1)
+        self.assertEqual(results[0].object_id, self.product.pk)
+        self.assertEqual(results[0].title, '<mark>Ledger</mark> <mark>Pro</mark>')
+
+
+class DashboardCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.vendor = Vendor.objects.create(
+            user=User.objects.create_user(
+                username='acme', email='acme@example.com', password='x', user_type=UserTypes.VENDOR
+            ),
+            vendor_name='Acme',
+            company_established_on=2001
+        )
+
+    def create_product(self, name):
+        return Product.objects.create(
+            vendor=self.vendor,
+            name=name,
+            software_type='ERP',
+            module='Finance',
+            client_type='Enterprise',
+            business_area='Accounting',
+            cloud_status=CloudStatus.NATIVE
+        )
+
+    def test_cached_stats_need_no_queries(self):
+        self.create_product('Ledger')
+        stats = get_dashboard_stats()
+        self.assertEqual((stats['users'], stats['companies'], stats['applications']), (1, 1, 1))
+
+        with self.assertNumQueries(0):
+            self.assertEqual(get_dashboard_stats(), stats)
+
+    def test_counters_follow_creates_and_deletes(self):
+        get_dashboard_counters()
+        with self.captureOnCommitCallbacks(execute=True):
+            product = self.create_product('Ledger')
+        with self.assertNumQueries(0):
+            self.assertEqual(get_dashboard_counters()['applications'], 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            product.delete()
+        with self.assertNumQueries(0):
+            self.assertEqual(get_dashboard_counters()['applications'], 0)
+
+    def test_counter_that_is_not_cached_is_recomputed(self):
+        adjust_counter(Product, 1)
+        self.assertEqual(get_dashboard_counters()['applications'], 0)
+
+    def test_latest_applications_follow_saves(self):
+        self.create_product('Ledger')
+        self.assertEqual([product.name for product in get_latest_applications()], ['Ledger'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.create_product('Payroll')
+        self.assertEqual([product.name for product in get_latest_applications()], ['Payroll', 'Ledger'])
+
+    def test_writes_that_bypass_signals_need_an_invalidation(self):
+        get_dashboard_stats()
+        Product.objects.bulk_create([Product(
+            vendor=self.vendor, name='Imported', software_type='ERP', module='Finance',
+            client_type='Enterprise', business_area='Accounting', cloud_status=CloudStatus.NATIVE
+        )])
+        self.assertEqual(get_dashboard_counters()['applications'], 0)
+
+        invalidate_dashboard()
+        self.assertEqual(get_dashboard_counters()['applications'], 1)
+        self.assertEqual([product.name for product in get_latest_applications()], ['Imported'])
+
+
+class InventoryImportTests(TestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user(
+            username='acme', email='acme@example.com', password='x', user_type=UserTypes.VENDOR
+        )
+        self.admin = User.objects.create_user(
+            username='root', email='root@example.com', password='x', user_type=UserTypes.ADMIN
+        )
+
+    def vendor_row(self, username, name):
+        return {'username': username, 'vendor_name': name, 'company_established_on': '2001'}
+
+    def product_row(self, vendor, name):
+        return {
+            'vendor': vendor, 'name': name, 'software_type': 'ERP', 'module': 'Finance',
+            'client_type': 'Enterprise', 'business_area': 'Accounting', 'cloud_status': CloudStatus.NATIVE.value,
+        }
+
+    def test_vendors_are_attached_to_their_owners(self):
+        User.objects.create_user(
+            username='globex', email='globex@example.com', password='x', user_type=UserTypes.VENDOR
+        )
+        rows = [
+            self.vendor_row('acme', 'Acme'),
+            self.vendor_row('acme', 'Acme Again'),
+            self.vendor_row('nobody', 'Initech'),
+            self.vendor_row('', 'Hooli'),
+            self.vendor_row('globex', ''),
+        ]
+        result = VendorImporter(created_by='root').run(enumerate(rows, start=2))
+
+        self.assertEqual((result.rows, result.created), (5, 1))
+        self.assertEqual({error['row']: list(error['errors']) for error in result.errors}, {
+            3: ['username'], 4: ['username'], 5: ['username'], 6: ['vendor_name'],
+        })
+        vendor = Vendor.objects.get()
+        self.assertEqual((vendor.user, vendor.vendor_name, vendor.created_by), (self.owner, 'Acme', 'root'))
+
+        # a user who already owns a vendor cannot be given another one
+        result = VendorImporter().run([(2, self.vendor_row('acme', 'Acme Two'))])
+        self.assertEqual(result.as_dict()['failed'], 1)
+
+    def test_products_are_matched_to_vendors_by_name(self):
+        acme = Vendor.objects.create(user=self.owner, vendor_name='Acme', company_established_on=2001)
+        for username in ('dup1', 'dup2'):
+            Vendor.objects.create(
+                user=User.objects.create_user(
+                    username=username, email=f'{username}@example.com', password='x', user_type=UserTypes.VENDOR
+                ),
+                vendor_name='Duplicate',
+                company_established_on=2001
+            )
+        rows = [
+            self.product_row('Acme', 'Ledger'),
+            self.product_row('Initech', 'Payroll'),
+            self.product_row('Duplicate', 'Payroll'),
+            {**self.product_row('Acme', 'Payroll'), 'cloud_status': 'Mainframe'},
+        ]
+        result = ProductImporter(batch_size=10).run(enumerate(rows, start=2))
+
+        self.assertEqual(result.created, 1)
+        self.assertEqual({error['row']: list(error['errors']) for error in result.errors}, {
+            3: ['vendor'], 4: ['vendor'], 5: ['cloud_status'],
+        })
+        self.assertEqual(list(acme.products.values_list('name', flat=True)), ['Ledger'])
+
+    def test_only_admins_can_import(self):
+        upload = SimpleUploadedFile('vendors.csv', b'username,vendor_name,company_established_on\nacme,Acme,2001\n')
+        self.client.force_login(self.owner)
+        response = self.client.post(reverse('import_data') + '?format=json', {'kind': 'vendors', 'file': upload})
+        self.assertEqual(response.status_code, 403)
+        self.assertFalse(Vendor.objects.exists())
+
+        upload.seek(0)
+        self.client.force_login(self.admin)
+        response = self.client.post(reverse('import_data') + '?format=json', {'kind': 'vendors', 'file': upload})
+        self.assertEqual(response.json()['created'], 1)
+        self.assertEqual(Vendor.objects.get().user, self.owner)
+
+
+@override_settings(AUTHENTICATION_BACKENDS=['apps.main.backends.CachedPermissionBackend'])
+class CachedPermissionBackendTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            username='jane', email='jane@example.com', password='x', user_type=UserTypes.NORMAL_USER
+        )
+        self.permission = Permissions.objects.create(
+            codename='approve_vendor', name='Can approve vendor',
+            content_type=ContentType.objects.get_for_model(Vendor)
+        )
+
+    def has_perm(self):
+        # a fresh instance, as every request loads the user again
+        return User.objects.get(pk=self.user.pk).has_perm('main.approve_vendor')
+
+    def test_grant_and_revoke_invalidate_the_cache(self):
+        self.assertFalse(self.has_perm())
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.user_permissions.add(self.permission)
+        self.assertTrue(self.has_perm())
+        user = User.objects.get(pk=self.user.pk)
+        with self.assertNumQueries(0):
+            self.assertTrue(user.has_perm('main.approve_vendor'))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.user_permissions.remove(self.permission)
+        self.assertFalse(self.has_perm())
+
+    def test_group_changes_invalidate_the_cache(self):
+        group = Group.objects.create(name='Reviewers')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.groups.add(group)
+        self.assertFalse(self.has_perm())
+
+        with self.captureOnCommitCallbacks(execute=True):
+            group.permissions.add(self.permission)
+        self.assertTrue(self.has_perm())
+        self.assertEqual(
+            get_user_permission_codenames(self.user.pk), (frozenset(), frozenset({'main.approve_vendor'}))
+        )
+
+        with self.captureOnCommitCallbacks(execute=True):
+            group.user_set.remove(self.user)
+        self.assertFalse(self.has_perm())
+
+    def test_renamed_permission_invalidates_the_catalog(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.user_permissions.add(self.permission)
+        self.assertTrue(self.has_perm())
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.permission.codename = 'approve_vendors'
+            self.permission.save()
+        self.assertFalse(self.has_perm())
+        self.assertTrue(User.objects.get(pk=self.user.pk).has_perm('main.approve_vendors'))
+
+    def test_inactive_users_and_superusers(self):
+        superuser = User.objects.create_superuser(
+            username='root', email='root@example.com', password='x', user_type=UserTypes.ADMIN
+        )
+        self.assertTrue(superuser.has_perm('main.approve_vendor'))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.user_permissions.add(self.permission)
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+        self.assertFalse(self.has_perm())
+
+
+class ProfileImageTests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.user = User.objects.create_user(
+            username='jane', email='jane@example.com', password='x', user_type=UserTypes.NORMAL_USER
+        )
+        self.client.force_login(self.user)
+
+    def picture(self, name='jane.png', color='red'):
+        output = io.BytesIO()
+        Image.new('RGB', (200, 100), color).save(output, 'PNG')
+        return SimpleUploadedFile(name, output.getvalue(), content_type='image/png')
+
+    def update(self, picture):
+        return self.client.post(reverse('update_profile'), {
+            'username': 'janet', 'name': 'Janet Doe', 'email': 'janet@example.com', 'profile_picture': picture,
+        })
+
+    def set_picture(self, picture):
+        profile = Profile.objects.get(user=self.user)
+        profile.image = picture
+        profile.save()
+        return profile
+
+    def test_rejected_picture_leaves_the_profile_unchanged(self):
+        for picture in (
+            SimpleUploadedFile('notes.png', b'not an image'),
+            SimpleUploadedFile('huge.png', b'\0' * (PROFILE_IMAGE_MAX_UPLOAD_SIZE + 1)),
+        ):
+            with self.subTest(picture.name):
+                self.update(picture)
+                user = User.objects.get(pk=self.user.pk)
+                self.assertEqual((user.username, user.email), ('jane', 'jane@example.com'))
+                self.assertEqual(user.profile.image.name, DEFAULT_PROFILE_IMAGE)
+
+    def test_picture_is_saved_and_thumbnailed_after_commit(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.update(self.picture())
+
+        user = User.objects.get(pk=self.user.pk)
+        self.assertEqual(user.username, 'janet')
+        self.assertNotEqual(user.profile.image.name, DEFAULT_PROFILE_IMAGE)
+        self.assertEqual(len(callbacks), 1)
+
+    def test_variants_cover_every_size_and_format(self):
+        profile = self.set_picture(self.picture())
+        self.assertEqual(profile_image_url(profile), default_storage.url(DEFAULT_PROFILE_IMAGE))
+
+        variants = generate_profile_variants(profile.pk)
+
+        self.assertEqual(variants['source'], profile.image.name)
+        for name, size in PROFILE_IMAGE_SIZES.items():
+            for extension in ('webp', 'jpeg'):
+                with default_storage.open(variants[name][extension]) as variant, Image.open(variant) as image:
+                    self.assertEqual(image.size, (size, size))
+        profile.refresh_from_db()
+        self.assertEqual(profile_image_url(profile, 'small', 'jpeg'), default_storage.url(variants['small']['jpeg']))
+
+    def test_new_picture_discards_the_old_variants(self):
+        old = generate_profile_variants(self.set_picture(self.picture('old.png')).pk)
+        new = generate_profile_variants(self.set_picture(self.picture('new.png', 'blue')).pk)
+
+        self.assertFalse(default_storage.exists(old['medium']['webp']))
+        self.assertTrue(default_storage.exists(new['medium']['webp']))
+        self.assertEqual(Profile.objects.get(user=self.user).image_variants, new)
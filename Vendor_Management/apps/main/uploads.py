@@ -0,0 +1,354 @@
+import hashlib
+import os
+import threading
+import time
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from apps.main.models import Blob, Document, Product, UploadSession
+
+MAX_UPLOAD_SIZE = getattr(settings, 'DOCUMENT_MAX_UPLOAD_SIZE', 512 * 1024 * 1024)
+MAX_CHUNK_SIZE = getattr(settings, 'DOCUMENT_MAX_CHUNK_SIZE', 8 * 1024 * 1024)
+# Uploads that receive no chunk for this many seconds are deleted by
+# expire_uploads
+UPLOAD_EXPIRY = getattr(settings, 'DOCUMENT_UPLOAD_EXPIRY', 24 * 60 * 60)
+
+READ_SIZE = 64 * 1024
+
+# Running SHA-256 state of in-progress uploads handled by this process,
+# keyed by session id as (offset hashed so far, hash object, last use). A
+# chunk that lands on another process rehashes the partial file once and
+# carries on.
+_hashers = {}
+_hashers_lock = threading.Lock()
+
+
+class UploadError(ValueError):
+    pass
+
+
+class UploadGone(UploadError):
+    pass
+
+
+class UploadOffsetMismatch(UploadError):
+    def __init__(self, expected):
+        super().__init__(f'Expected a chunk starting at byte {expected}')
+        self.expected = expected
+
+
+class _StoredFile(File):
+    """
+    A file already on local disk, which FileSystemStorage moves into place
+    instead of copying.
+    """
+
+    def temporary_file_path(self):
+        return self.file.name
+
+
+def blob_name(sha256, filename=''):
+    # keep the extension so served files get the right content type
+    extension = os.path.splitext(filename)[1].lower()
+    return f'blobs/{sha256[:2]}/{sha256[2:4]}/{sha256}{extension}'
+
+
+def upload_temp_dir():
+    """
+    Where partial uploads are written, DOCUMENT_UPLOAD_TEMP_DIR or a
+    directory under MEDIA_ROOT.
+    """
+    return getattr(settings, 'DOCUMENT_UPLOAD_TEMP_DIR', os.path.join(settings.MEDIA_ROOT, 'uploads', 'partial'))
+
+
+def partial_path(session):
+    return os.path.join(upload_temp_dir(), f'{session.pk}.part')
+
+
+def _chunk_path(session):
+    # one file per request, so retries of a chunk never share one
+    return os.path.join(upload_temp_dir(), f'{session.pk}.{uuid.uuid4().hex}.chunk')
+
+
+def _hash_file(path, limit):
+    hasher = hashlib.sha256()
+    with open(path, 'rb') as partial:
+        remaining = limit
+        while remaining:
+            block = partial.read(min(READ_SIZE, remaining))
+            if not block:
+                break
+            hasher.update(block)
+            remaining -= len(block)
+    return hasher
+
+
+def _get_hasher(session):
+    with _hashers_lock:
+        offset, hasher, _ = _hashers.pop(session.pk, (None, None, None))
+    if offset != session.received:
+        hasher = _hash_file(partial_path(session), session.received) if session.received else hashlib.sha256()
+    return hasher
+
+
+def _keep_hasher(session, hasher):
+    now = time.monotonic()
+    with _hashers_lock:
+        _hashers[session.pk] = (session.received, hasher, now)
+        # forget uploads that stopped sending chunks to this process
+        for pk in [pk for pk, (_, _, used) in _hashers.items() if now - used > UPLOAD_EXPIRY]:
+            del _hashers[pk]
+
+
+def start_upload(user, filename, size):
+    if size <= 0:
+        raise UploadError('The file is empty')
+    if size > MAX_UPLOAD_SIZE:
+        raise UploadError(f'Files are limited to {MAX_UPLOAD_SIZE} bytes')
+    os.makedirs(upload_temp_dir(), exist_ok=True)
+    session = UploadSession.objects.create(user=user, filename=os.path.basename(filename), size=size)
+    open(partial_path(session), 'wb').close()
+    return session
+
+
+def _check_chunk(session, offset, length):
+    if session.completed_at:
+        raise UploadError('The upload is already complete')
+    if offset != session.received:
+        raise UploadOffsetMismatch(session.received)
+    if length <= 0 or length > MAX_CHUNK_SIZE:
+        raise UploadError(f'Chunks must be between 1 and {MAX_CHUNK_SIZE} bytes')
+    if session.received + length > session.size:
+        raise UploadError('The chunk goes past the declared file size')
+
+
+def append_chunk(session_id, offset, stream, length):
+    """
+    Append ``length`` bytes read from ``stream`` at ``offset``, hashing them
+    as they are written. A chunk that does not start where the previous one
+    ended is rejected with the offset to resume from, so retrying a chunk is
+    safe.
+
+    The chunk is read from the client into a file of its own first, outside
+    any transaction, so a slow client does not keep the session row locked.
+    The lock is only held to check the offset again, append the staged bytes
+    from local disk and record the new offset.
+    """
+    session = UploadSession.objects.get(pk=session_id)
+    _check_chunk(session, offset, length)
+
+    staged = _chunk_path(session)
+    try:
+        with open(staged, 'wb') as chunk:
+            remaining = length
+            while remaining:
+                block = stream.read(min(READ_SIZE, remaining))
+                if not block:
+                    break
+                chunk.write(block)
+                remaining -= len(block)
+        if remaining:
+            raise UploadError('The chunk is shorter than its Content-Length')
+
+        with transaction.atomic():
+            session = UploadSession.objects.select_for_update().get(pk=session_id)
+            # another request may have sent this chunk in the meantime
+            _check_chunk(session, offset, length)
+
+            hasher = _get_hasher(session)
+            with open(staged, 'rb') as chunk, open(partial_path(session), 'r+b') as partial:
+                # drop whatever a previously interrupted chunk left behind
+                partial.truncate(session.received)
+                partial.seek(session.received)
+                for block in iter(lambda: chunk.read(READ_SIZE), b''):
+                    partial.write(block)
+                    hasher.update(block)
+
+            session.received += length
+            session.save(update_fields=['received', 'updated_at'])
+    finally:
+        if os.path.exists(staged):
+            os.remove(staged)
+
+    _keep_hasher(session, hasher)
+    return session
+
+
+def expire_uploads(now=None):
+    """
+    Delete the uploads that received no chunk for ``UPLOAD_EXPIRY`` seconds
+    and were never completed, along with their partial files, and remove any
+    file in ``upload_temp_dir()`` that no longer belongs to a live upload.
+    Returns the number of uploads deleted.
+    """
+    cutoff = (now or timezone.now()) - timedelta(seconds=UPLOAD_EXPIRY)
+    pending = UploadSession.objects.filter(completed_at__isnull=True)
+    expired = list(pending.filter(updated_at__lt=cutoff).values_list('pk', flat=True))
+    UploadSession.objects.filter(pk__in=expired).delete()
+    with _hashers_lock:
+        for pk in expired:
+            _hashers.pop(pk, None)
+
+    directory = upload_temp_dir()
+    if not os.path.isdir(directory):
+        return len(expired)
+    live = {str(pk) for pk in pending.values_list('pk', flat=True)}
+    for name in os.listdir(directory):
+        path = os.path.join(directory, name)
+        stale = name.endswith('.chunk') and os.path.getmtime(path) < cutoff.timestamp()
+        if name.split('.', 1)[0] not in live or stale:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+    return len(expired)
+
+
+def _get_or_store_blob(sha256, size, save, filename=''):
+    blob = Blob.objects.filter(sha256=sha256).first()
+    if blob is not None:
+        return blob, True
+
+    name = save(blob_name(sha256, filename))
+    try:
+        with transaction.atomic():
+            return Blob.objects.create(sha256=sha256, file=name, size=size), False
+    except IntegrityError:
+        # the same content was stored concurrently; keep the first copy
+        default_storage.delete(name)
+        return Blob.objects.get(sha256=sha256), True
+
+
+def store_blob(path, sha256, size, filename=''):
+    """
+    Return the blob for ``sha256``, moving the file at ``path`` into storage
+    if the content is new and discarding it otherwise. The second value tells
+    whether an existing blob was reused.
+    """
+    def save(name):
+        with open(path, 'rb') as content:
+            return default_storage.save(name, _StoredFile(content))
+
+    try:
+        return _get_or_store_blob(sha256, size, save, filename)
+    finally:
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def store_uploaded_file(upload):
+    """
+    Store a regular form upload as a blob, hashing it in chunks.
+    """
+    hasher = hashlib.sha256()
+    for chunk in upload.chunks():
+        hasher.update(chunk)
+
+    def save(name):
+        upload.seek(0)
+        return default_storage.save(name, upload)
+
+    blob, _ = _get_or_store_blob(hasher.hexdigest(), upload.size, save, upload.name)
+    return blob
+
+
+def complete_upload(session_id, user, product_ids=(), created_by=None):
+    """
+    Finish an upload whose bytes have all been received and attach it to
+    ``product_ids``. Returns the blob, whether identical content was already
+    stored, and the upload's documents.
+
+    Completing an upload again, such as a client retrying after a timeout,
+    returns the documents attached the first time instead of attaching the
+    blob twice.
+    """
+    with transaction.atomic():
+        session = UploadSession.objects.select_for_update().get(pk=session_id, user=user)
+        if not session.completed_at:
+            if session.received != session.size:
+                raise UploadError(f'Only {session.received} of {session.size} bytes were received')
+
+            sha256 = _get_hasher(session).hexdigest()
+            blob, deduplicated = store_blob(partial_path(session), sha256, session.size, session.filename)
+            session.blob = blob
+            session.completed_at = timezone.now()
+            session.save(update_fields=['blob', 'completed_at', 'updated_at'])
+        elif session.blob is None:
+            raise UploadGone('The uploaded file no longer exists')
+        else:
+            deduplicated = True
+
+    # attached in a transaction of its own, so an upload whose attaching
+    # failed stays complete and a retry attaches it
+    with transaction.atomic():
+        session = UploadSession.objects.select_for_update().select_related('blob').get(pk=session.pk)
+        documents = list(session.documents.all())
+        if product_ids and not documents:
+            documents = attach_blob(session.blob, product_ids, created_by=created_by, upload=session)
+    return session.blob, deduplicated, documents
+
+
+def attach_blob(blob, product_ids, created_by=None, upload=None):
+    """
+    Attach one stored blob to several products without copying it.
+    """
+    products = list(Product.objects.filter(pk__in=product_ids).values_list('pk', flat=True))
+    with transaction.atomic():
+        documents = Document.objects.bulk_create([
+            Document(product_id=pk, document=blob.file.name, blob=blob, upload=upload, created_by=created_by)
+            for pk in products
+        ])
+        Blob.objects.filter(pk=blob.pk).update(ref_count=F('ref_count') + len(documents))
+        Product.objects.filter(pk__in=products, document_attached=False).update(document_attached=True)
+    return documents
+
+
+def save_uploaded_document(document, upload):
+    """
+    Save a form ``Document`` pointing at the blob for ``upload``. A blob
+    stored for a document that then fails to save is deleted again, rather
+    than left behind without references.
+    """
+    blob = store_uploaded_file(upload)
+    document.blob = blob
+    document.document = blob.file.name
+    try:
+        with transaction.atomic():
+            document.save()
+    except Exception:
+        discard_unreferenced_blob(blob.pk)
+        raise
+    return document
+
+
+def retain_blob(blob_id):
+    Blob.objects.filter(pk=blob_id).update(ref_count=F('ref_count') + 1)
+
+
+def release_blob(blob_id):
+    """
+    Drop one reference to a blob and delete it once nothing refers to it.
+    """
+    with transaction.atomic():
+        Blob.objects.filter(pk=blob_id, ref_count__gt=0).update(ref_count=F('ref_count') - 1)
+        discard_unreferenced_blob(blob_id)
+
+
+def discard_unreferenced_blob(blob_id):
+    """
+    Delete a blob and its file if no document refers to it.
+    """
+    with transaction.atomic():
+        blob = Blob.objects.select_for_update().filter(pk=blob_id, ref_count=0).first()
+        if blob is None or Document.objects.filter(blob_id=blob_id).exists():
+            return
+        name = blob.file.name
+        blob.delete()
+    default_storage.delete(name)
@@ -3,6 +3,8 @@ from django.contrib.auth.views import (
     PasswordChangeDoneView
 )
 from django.urls import path
+from . import async_views
+from .api import API_VERSION
 from .views import (
     home,
     SignUpView,
@@ -23,17 +25,29 @@ from .views import (
     add_comment,
     permissions,
     generate_softwares_pdf,
+    report_status,
     export_data_to_csv,
     update_profile_view,
     create_permission,
     update_permission,
     delete_permission,
     user_details,
-    assign_permission_to_user
+    assign_permission_to_user,
+    assign_permissions_batch,
+    search,
+    import_data,
+    create_upload,
+    upload_detail,
+    complete_document_upload,
+    download_document,
+    activity_feed,
+    api_list,
+    api_detail
 )
 
 urlpatterns = [
     path('', home, name='home'),
+    path('async/', async_views.home, name='home_async'),
     path('signup/', SignUpView.as_view(), name='signup'),
     path('login/', user_login, name='login'),
     path('logout/', user_logout, name='logout'),
@@ -46,21 +60,35 @@ urlpatterns = [
     path('vendors/', vendors, name='vendors'),
     path('create_vendor/', create_vendor, name='create_vendor'),
     path('vendor/<int:vendor_id>/', vendor_detail, name='vendor_detail'),
+    path('async/vendor/<int:vendor_id>/', async_views.vendor_detail, name='vendor_detail_async'),
     path('edit/<int:vendor_id>/', edit_vendor, name='edit_vendor'),
     path('delete/<int:vendor_id>/', delete_vendor, name='delete_vendor'),
     path('create_product/', create_product, name='create_product'),
     path('update/<int:product_id>/', update_product, name='update_product'),
     path('product/<int:product_id>/', product_detail, name='product_detail'),
+    path('async/product/<int:product_id>/', async_views.product_detail, name='product_detail_async'),
     path('delete/product/<int:product_id>/', delete_product, name='delete_product'),
     path('applications/', applications, name='applications'),
     path('add-comment/vendor/<int:vendor_id>/', add_comment, name='add_vendor_comment'),
     path('add-comment/product/<int:product_id>/', add_comment, name='add_product_comment'),
     path('update-profile/', update_profile_view, name='update_profile'),
     path('generate_softwares_pdf/', generate_softwares_pdf, name='generate_softwares_pdf'),
+    path('reports/<int:job_id>/', report_status, name='report_status'),
     path('export-csv/', export_data_to_csv, name='export_data_to_csv'),
     path('create_permission/', create_permission, name='create_permission'),
     path('permissions/', permissions, name='permissions'),
     path('update_permission/<int:permission_id>/', update_permission, name='update_permission'),
     path('permissions/delete/<int:permission_id>/', delete_permission, name='delete_permission'),
     path('assign_permission/', assign_permission_to_user, name='assign_permission'),
+    path('assign_permissions/batch/', assign_permissions_batch, name='assign_permissions_batch'),
+    path('search/', search, name='search'),
+    path('activity/', activity_feed, name='activity_feed'),
+    path('import/', import_data, name='import_data'),
+    path('uploads/', create_upload, name='create_upload'),
+    path('uploads/<uuid:upload_id>/', upload_detail, name='upload_detail'),
+    path('uploads/<uuid:upload_id>/complete/', complete_document_upload, name='complete_upload'),
+    path('documents/<int:document_id>/download/', download_document, name='download_document'),
+
+    path(f'api/{API_VERSION}/<slug:resource>/', api_list, name='api_list'),
+    path(f'api/{API_VERSION}/<slug:resource>/<int:pk>/', api_detail, name='api_detail'),
 ]
@@ -1,45 +1,78 @@
-import csv
+import json
 from typing import Dict, Any
 
+from django.conf import settings
 from django.contrib import messages
 from django.contrib.auth import login, authenticate, logout
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.models import Permission
-from django.db.models import Avg
-from django.http import HttpResponse, JsonResponse
+from django.contrib.contenttypes.models import ContentType
+from django.core.exceptions import PermissionDenied
+from django.db import transaction
+from django.http import FileResponse, Http404, JsonResponse, StreamingHttpResponse
 from django.shortcuts import render, redirect, get_object_or_404
 from django.urls import reverse, reverse_lazy
 from django.views import View
-from utils.views import render_to_pdf
-from .enums import UserTypes
+from django.views.decorators.csrf import csrf_exempt, csrf_protect
+from . import api
+from .activity import form_changes, log_activity
+from .conditional import conditional_page, product_page_version, vendor_page_version
+from .dashboard import get_dashboard_stats
+from .downloads import can_download, serve_document
+from .enums import ActivityVerb, JobStatus, UserTypes
+from .exports import PRODUCT_EXPORT_COLUMNS, stream_csv
+from .filters import PRODUCT_RANGE_FILTERS, facet_counts, filter_products
 from .forms import (
     VendorForm,
     ProductForm,
     CommentForm,
     UserForm,
     DocumentFormSet,
+    ImportForm,
     PermissionForm
 )
+from .images import ProfileImageError, ProfileImageUploadHandler, validate_profile_image
+from .importers import IMPORTERS, ImportFileError, read_rows
 from .models import (
     User,
     Vendor,
     Product,
-    Comment, Permissions
+    Comment,
+    Permissions,
+    ReportJob,
+    UploadSession,
+    Document,
+    ActivityEvent
+)
+from .pagination import InvalidCursor, paginate_keyset
+from .permission_assignments import MAX_OPERATIONS, apply_permission_operations
+from .permission_cache import get_managed_permissions, get_user_permission_ids
+from .reports import request_software_report
+from .routers import read_alias
+from .search import search as search_catalog
+from .uploads import (
+    MAX_CHUNK_SIZE,
+    UploadError,
+    UploadGone,
+    UploadOffsetMismatch,
+    append_chunk,
+    complete_upload,
+    save_uploaded_document,
+    start_upload
 )
 
 
 @login_required
 def home(request):
-    users = User.objects.all().count()
-    companies = Vendor.objects.all().count()
-    applications = Product.objects.all().count()
-    latest_applications = Product.objects.order_by('-created_at')[:5]
+    # counters and latest applications are served from the cache and kept
+    # current by the signals in apps.main.signals
+    stats = get_dashboard_stats()
 
     context: dict[str, Any] = {
-        'users': users,
-        'companies': companies,
-        'applications': applications,
-        'latest_applications': latest_applications
+        'users': stats['users'],
+        'companies': stats['companies'],
+        'applications': stats['applications'],
+        'latest_applications': stats['latest_applications']
     }
     return render(request, 'home.html', context)
 
@@ -78,16 +111,12 @@ class SignUpView(View):
             )
 
             messages.success(request, f"{user.username} account has been created successfully")
+            # the password was just set, so checking it again through
+            # authenticate() would only pay for a second hash
+            login(request, user, backend=settings.AUTHENTICATION_BACKENDS[0])
             if user.user_type == UserTypes.VENDOR:
-                user = authenticate(request, username=username, password=password1)
-                if user is not None:
-                    login(request, user)
-                    return redirect(reverse('create_vendor'))
-            else:
-                user = authenticate(request, username=username, password=password1)
-                if user is not None:
-                    login(request, user)
-                    return redirect(self.success_url)
+                return redirect(reverse('create_vendor'))
+            return redirect(self.success_url)
 
         # If form is not valid, re-render the form with errors
         return render(request, self.template_name, {'form': form})
@@ -108,7 +137,17 @@ def user_login(request):
         return render(request, 'authentication/login.html')
 
 
+@csrf_exempt
 def update_profile_view(request):
+    # the size limit has to be installed before the body is parsed, which the
+    # CSRF middleware would otherwise do, so CSRF is checked below instead
+    upload_handler = ProfileImageUploadHandler(request)
+    request.upload_handlers.insert(0, upload_handler)
+    return _update_profile(request, upload_handler)
+
+
+@csrf_protect
+def _update_profile(request, upload_handler):
     if request.method == "POST":
         user = request.user
         user_profile = user.profile
@@ -117,6 +156,17 @@ def update_profile_view(request):
         name = request.POST.get("name")
         email = request.POST.get("email")
 
+        # a rejected picture rejects the whole form
+        if upload_handler.too_large:
+            messages.error(request, "The profile picture is too large")
+            return redirect(reverse('profile'))
+        if profile_picture:
+            try:
+                validate_profile_image(profile_picture)
+            except ProfileImageError as error:
+                messages.error(request, str(error))
+                return redirect(reverse('profile'))
+
         # Split name if necessary
         if ' ' in name:
             first_name, last_name = name.split(' ', 1)
@@ -127,9 +177,12 @@ def update_profile_view(request):
         user.username = username
         user.email = email
 
-        user.save()
+        changed_fields = user.get_dirty_fields()
+        if changed_fields:
+            user.save(update_fields=changed_fields)
 
         if profile_picture:
+            # thumbnails are generated in the background by the profile signals
             user_profile.image = profile_picture
             user_profile.save()
         messages.success(request, "Your profile has been updated successfully")
@@ -144,24 +197,28 @@ def user_logout(request):
 
 
 def users_list(request):
-    users = User.objects.all()
+    try:
+        page = paginate_keyset(User.objects.all(), request, field='date_joined')
+    except InvalidCursor:
+        raise Http404('Invalid page')
+
     context: dict[str, Any] = {
-        'users': users,
+        'users': page.object_list,
+        'page': page,
     }
     return render(request, 'users/users_list.html', context)
 
 
 def user_details(request, user_id):
     user = get_object_or_404(User, id=user_id)
-    all_permissions = Permissions.objects.all()
-    result = []
-    for permission in user.user_permissions.all():
-        result.append(permission.id)
+    # the catalog and the user's permission ids come from the permission cache
+    all_permissions = get_managed_permissions()
+    user_permissions, _ = get_user_permission_ids(user.pk)
 
     context: dict[str, Any] = {
         'user': user,
         'all_permissions': all_permissions,
-        'user_permissions': result
+        'user_permissions': user_permissions
     }
     return render(request, 'users/user_detail.html', context)
 
@@ -171,9 +228,14 @@ def profile(request):
 
 
 def vendors(request):
-    companies = Vendor.objects.all()
+    try:
+        page = paginate_keyset(Vendor.objects.all(), request)
+    except InvalidCursor:
+        raise Http404('Invalid page')
+
     context: dict[str, Any] = {
-        'vendors': companies
+        'vendors': page.object_list,
+        'page': page,
     }
     return render(request, 'vendors/vendors.html', context)
 
@@ -186,6 +248,7 @@ def create_vendor(request):
             vendor.user = request.user
             vendor.created_by = request.user.username
             vendor.save()
+            log_activity(request, ActivityVerb.CREATED, vendor)
             messages.success(
                 request,
                 f'Vendor {vendor.vendor_name} was created successfully.')
@@ -199,17 +262,20 @@ def create_vendor(request):
         {'vendor_form': vendor_form})
 
 
+@conditional_page(vendor_page_version)
 def vendor_detail(request, vendor_id):
     vendor = get_object_or_404(Vendor, id=vendor_id)
 
-    applications = Product.objects.filter(vendor=vendor)
-    comments = Comment.objects.filter(vendor=vendor).order_by('-timestamp')
+    # the reverse manager hands each product its vendor without a query
+    applications = vendor.products.all()
+    comments = Comment.objects.filter(vendor=vendor).select_related(
+        'commented_by__profile', 'vendor'
+    ).order_by('-timestamp')
 
-    avg_rating = comments.aggregate(rating=Avg('rating'))['rating']
+    # ratings are maintained on the vendor by the comment signals
+    avg_rating = vendor.average_rating
     average_rating = round(avg_rating) if avg_rating else None
-
-    # count reviews
-    review_count = comments.count()
+    review_count = vendor.rating_count
 
     review_form = CommentForm()
 
@@ -233,6 +299,8 @@ def edit_vendor(request, vendor_id):
 
         if vendor_form.is_valid():
             vendor_form.save()
+            if vendor_form.has_changed():
+                log_activity(request, ActivityVerb.UPDATED, vendor, form_changes(vendor_form))
             messages.success(
                 request,
                 f'Vendor {vendor.vendor_name} was updated successfully.')
@@ -253,7 +321,9 @@ def edit_vendor(request, vendor_id):
 def delete_vendor(request, vendor_id):
     vendor = get_object_or_404(Vendor, id=vendor_id)
     if request.method == 'POST':
-        vendor.delete()
+        with transaction.atomic():
+            log_activity(request, ActivityVerb.DELETED, vendor)
+            vendor.delete()
 
         messages.success(request, f'Company {vendor.vendor_name} was deleted successfully.')
         return redirect('vendors')
@@ -268,12 +338,17 @@ def create_product(request):
 
         if product_form.is_valid() and document_formset.is_valid():
             product = product_form.save()
+            log_activity(request, ActivityVerb.CREATED, product)
 
             for form in document_formset:
                 if form.cleaned_data.get('document'):
                     document = form.save(commit=False)
                     document.product = product
-                    document.save()
+                    if 'document' in form.changed_data:
+                        # identical files share one stored blob
+                        save_uploaded_document(document, form.cleaned_data['document'])
+                    else:
+                        document.save()
 
                     if document.document:
                         product.document_attached = True
@@ -303,12 +378,18 @@ def update_product(request, product_id):
 
         if product_form.is_valid() and document_formset.is_valid():
             product = product_form.save()
+            if product_form.has_changed():
+                log_activity(request, ActivityVerb.UPDATED, product, form_changes(product_form))
 
             for form in document_formset:
                 if form.cleaned_data.get('document'):
                     document = form.save(commit=False)
                     document.product = product
-                    document.save()
+                    if 'document' in form.changed_data:
+                        # identical files share one stored blob
+                        save_uploaded_document(document, form.cleaned_data['document'])
+                    else:
+                        document.save()
                     if document.document:
                         product.document_attached = True
                         product.save()
@@ -331,9 +412,34 @@ def update_product(request, product_id):
 
 
 def applications(request):
-    applications = Product.objects.all()
+    products = filter_products(Product.objects.select_related('vendor'), request.GET)
+    try:
+        page = paginate_keyset(products, request)
+    except InvalidCursor:
+        raise Http404('Invalid page')
+    facets = facet_counts(Product.objects.all(), request.GET)
+
+    if request.GET.get('format') == 'json':
+        return JsonResponse({
+            'results': [
+                {
+                    'id': product.pk,
+                    'name': product.name,
+                    'vendor': product.vendor.vendor_name,
+                    'url': reverse('product_detail', args=[product.pk]),
+                }
+                for product in page.object_list
+            ],
+            'next': page.next_cursor,
+            'previous': page.previous_cursor,
+            'facets': facets,
+        })
+
     context: dict[str, Any] = {
-        'applications': applications
+        'applications': page.object_list,
+        'page': page,
+        'facets': facets,
+        'range_filters': {param: request.GET.get(param, '') for param in PRODUCT_RANGE_FILTERS},
     }
     return render(request, 'vendor_products/applications.html', context)
 
@@ -371,7 +477,8 @@ def add_comment(request, vendor_id=None, product_id=None):
             vendor=instance if vendor_id else None,
             product=instance if product_id else None
         )
-        comment.save()
+        with transaction.atomic():
+            comment.save()
 
         messages.success(request, 'Comment added successfully.')
         return redirect(redirect_path)
@@ -380,84 +487,63 @@ def add_comment(request, vendor_id=None, product_id=None):
     return redirect('home')
 
 
-def generate_pdf(request, context, template, filename):
-    pdf = render_to_pdf(template, context)
-    if pdf:
-        response = HttpResponse(pdf, content_type='application/pdf')
-        content = f"inline; filename={filename}"
-        download = request.GET.get("download")
-        if download:
-            content = f"attachment; filename={filename}"
-        response['Content-Disposition'] = content
-        return response
-    return HttpResponse("Not found")
-
-
 def generate_softwares_pdf(request):
-    template = 'vendor_products/software_pdf.html'
-    softwares = Product.objects.all()
-    context = {"applications": softwares}
-    file_name = 'softwares.pdf'
-    return generate_pdf(request, context, template, file_name)
+    # The PDF is built in the background once per version of the data and
+    # served from storage until the inventory changes.
+    job = request_software_report(requested_by=request.user.get_username() or None)
+    if job.status == JobStatus.DONE and job.file:
+        return FileResponse(
+            job.file.open('rb'),
+            content_type='application/pdf',
+            as_attachment=bool(request.GET.get('download')),
+            filename='softwares.pdf'
+        )
+    return report_status_response(job, status=202)
 
 
-def export_data_to_csv(request):
-    response = HttpResponse(content_type='text/csv')
-    response['Content-Disposition'] = 'attachment; filename="software_data.csv"'
+def report_status_response(job, status=200):
+    data = {
+        'job_id': job.pk,
+        'status': job.status,
+        'status_url': reverse('report_status', args=[job.pk]),
+    }
+    if job.status == JobStatus.DONE:
+        data['url'] = reverse('generate_softwares_pdf')
+    elif job.status == JobStatus.FAILED:
+        data['error'] = job.error
+    return JsonResponse(data, status=status)
 
-    writer = csv.writer(response)
-
-    # Write header row for Software
-    writer.writerow(
-        [
-            'Name',
-            'Software Type',
-            'Module',
-            'Client Type',
-            'Last Demo Date',
-            'Last Review Date',
-            'Next Review Date',
-            'Document Attached',
-            'Cloud Status',
-            'Additional Information',
-            'Internal Professional Services',
-            'Business Area',
-        ]
-    )
 
-    softwares = Product.objects.all()
-
-    # Write data rows for Software
-    for software in softwares:
-        writer.writerow(
-            [
-                software.name,
-                software.software_type,
-                software.module,
-                software.client_type,
-                software.last_demo_date,
-                software.last_review_date,
-                software.next_review_date,
-                software.document_attached,
-                software.cloud_status,
-                software.additional_information,
-                software.internal_professional_services,
-                software.business_area,
-            ]
-        )
+def report_status(request, job_id):
+    job = get_object_or_404(ReportJob, pk=job_id)
+    return report_status_response(job)
 
+
+def export_data_to_csv(request):
+    # Rows are streamed in chunks straight from the cursor, so large
+    # inventories neither build up in memory nor delay the first byte. The
+    # stream is read after the request is routed, so pick its database now.
+    softwares = filter_products(Product.objects.using(read_alias()), request.GET)
+
+    response = StreamingHttpResponse(
+        stream_csv(softwares, PRODUCT_EXPORT_COLUMNS),
+        content_type='text/csv'
+    )
+    response['Content-Disposition'] = 'attachment; filename="software_data.csv"'
     return response
 
 
+@conditional_page(product_page_version)
 def product_detail(request, product_id):
-    software = get_object_or_404(Product, pk=product_id)
-    comments = Comment.objects.filter(product=software).order_by('-timestamp')
+    software = get_object_or_404(Product.objects.select_related('vendor'), pk=product_id)
+    comments = Comment.objects.filter(product=software).select_related(
+        'commented_by__profile', 'product'
+    ).order_by('-timestamp')
 
-    avg_rating = comments.aggregate(rating=Avg('rating'))['rating']
+    # ratings are maintained on the product by the comment signals
+    avg_rating = software.average_rating
     average_rating = round(avg_rating) if avg_rating else None
-
-    # count reviews
-    review_count = comments.count()
+    review_count = software.rating_count
 
     review_form = CommentForm()
 
@@ -475,7 +561,9 @@ def product_detail(request, product_id):
 def delete_product(request, product_id):
     software = get_object_or_404(Product, pk=product_id)
     if request.method == 'POST':
-        software.delete()
+        with transaction.atomic():
+            log_activity(request, ActivityVerb.DELETED, software)
+            software.delete()
         messages.success(request, f'{software.name} was deleted successfully.')
         return redirect('applications')
     else:
@@ -487,6 +575,7 @@ def create_permission(request):
         permission_form = PermissionForm(request.POST)
         if permission_form.is_valid():
             permission = permission_form.save()
+            log_activity(request, ActivityVerb.CREATED, permission)
             messages.success(request, f'{permission.name} created successfully.')
             return redirect('permissions')
     else:
@@ -502,7 +591,8 @@ def create_permission(request):
 
 
 def permissions(request):
-    permissions = Permissions.objects.all()
+    # Permission.__str__ reads the content type
+    permissions = Permissions.objects.select_related('content_type')
     context: dict[str, Any] = {
         'permissions': permissions
     }
@@ -511,12 +601,14 @@ def permissions(request):
 
 def update_permission(request, permission_id):
     try:
-        permission = get_object_or_404(Permission, pk=permission_id)
+        permission = get_object_or_404(Permissions, pk=permission_id)
 
         if request.method == 'POST':
             permission_form = PermissionForm(request.POST, instance=permission)
             if permission_form.is_valid():
                 permission = permission_form.save()
+                if permission_form.has_changed():
+                    log_activity(request, ActivityVerb.UPDATED, permission, form_changes(permission_form))
                 messages.success(request, f'{permission.name} updated successfully.')
                 return redirect('permissions')
         else:
@@ -552,6 +644,12 @@ def assign_permission_to_user(request):
             else:
                 user.user_permissions.remove(permission)
                 message = f'{permission.name} removed from {user.username} successfully.'
+            log_activity(
+                request,
+                ActivityVerb.GRANTED if checked else ActivityVerb.REVOKED,
+                user,
+                {'permission': [None, permission.codename] if checked else [permission.codename, None]}
+            )
 
             return JsonResponse({'message': message})
 
@@ -561,14 +659,282 @@ def assign_permission_to_user(request):
         return JsonResponse({'error': str(e)}, status=500)
 
 
+@login_required
+def assign_permissions_batch(request):
+    if not (request.user.is_staff or request.user.user_type == UserTypes.ADMIN):
+        raise PermissionDenied
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Invalid request'}, status=400)
+
+    try:
+        payload = json.loads(request.body)
+        operations = payload['operations']
+    except (ValueError, KeyError, TypeError):
+        return JsonResponse({'error': 'Expected a JSON object with an "operations" list'}, status=400)
+
+    if not isinstance(operations, list):
+        return JsonResponse({'error': '"operations" must be a list'}, status=400)
+    if len(operations) > MAX_OPERATIONS:
+        return JsonResponse({'error': f'At most {MAX_OPERATIONS} operations per request'}, status=400)
+
+    result = apply_permission_operations(operations)
+    changed = [
+        operation for operation in result['results']
+        if operation['status'] in ('granted', 'revoked')
+    ]
+    if changed:
+        users = User.objects.in_bulk({operation['user_id'] for operation in changed})
+        codenames = dict(Permission.objects.filter(
+            pk__in={operation['permission_id'] for operation in changed}
+        ).values_list('pk', 'codename'))
+        for operation in changed:
+            granted = operation['status'] == 'granted'
+            codename = codenames[operation['permission_id']]
+            log_activity(
+                request,
+                ActivityVerb.GRANTED if granted else ActivityVerb.REVOKED,
+                users[operation['user_id']],
+                {'permission': [None, codename] if granted else [codename, None]}
+            )
+    return JsonResponse(result)
+
+
 def delete_permission(request, permission_id):
     try:
-        permission = get_object_or_404(Permission, pk=permission_id)
+        permission = get_object_or_404(Permissions, pk=permission_id)
         if request.method == 'POST':
-            permission.delete()
+            with transaction.atomic():
+                log_activity(request, ActivityVerb.DELETED, permission)
+                permission.delete()
             messages.success(request, f'{permission.name} was deleted successfully.')
             return redirect('permissions')
         else:
             return redirect('permissions')
     except Exception as e:
         return JsonResponse({'error': str(e)}, status=500)
+
+
+@login_required
+def search(request):
+    query = request.GET.get('q', '').strip()
+    try:
+        limit = int(request.GET.get('limit', 20))
+    except ValueError:
+        limit = 20
+    results = search_catalog(query, limit=limit) if query else []
+
+    if request.GET.get('format') == 'json':
+        return JsonResponse({
+            'query': query,
+            'results': [
+                {
+                    'type': result.object_type,
+                    'id': result.object_id,
+                    'title': result.title,
+                    'snippet': result.snippet,
+                    'rank': result.rank,
+                    'url': result.url,
+                }
+                for result in results
+            ]
+        })
+
+    context: dict[str, Any] = {
+        'query': query,
+        'results': results,
+    }
+    return render(request, 'search/search_results.html', context)
+
+
+@login_required
+def import_data(request):
+    if not (request.user.is_staff or request.user.user_type == UserTypes.ADMIN):
+        raise PermissionDenied
+    result = None
+    if request.method == 'POST':
+        import_form = ImportForm(request.POST, request.FILES)
+        if import_form.is_valid():
+            upload = import_form.cleaned_data['file']
+            importer = IMPORTERS[import_form.cleaned_data['kind']](created_by=request.user.username)
+            try:
+                result = importer.run(read_rows(upload, upload.name)).as_dict()
+            except ImportFileError as error:
+                import_form.add_error('file', str(error))
+            else:
+                messages.success(request, f"Imported {result['created']} of {result['rows']} rows.")
+        if request.GET.get('format') == 'json':
+            if result is None:
+                return JsonResponse({'errors': import_form.errors}, status=400)
+            return JsonResponse(result)
+    else:
+        import_form = ImportForm()
+
+    return render(
+        request,
+        'imports/import_data.html',
+        {
+            'import_form': import_form,
+            'result': result
+        }
+    )
+
+
+@login_required
+def create_upload(request):
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Invalid request'}, status=400)
+
+    try:
+        payload = json.loads(request.body)
+        filename = str(payload['filename'])
+        size = int(payload['size'])
+        upload = start_upload(request.user, filename, size)
+    except (ValueError, KeyError, TypeError) as error:
+        return JsonResponse({'error': str(error)}, status=400)
+
+    return JsonResponse(upload_status(upload), status=201)
+
+
+def upload_status(upload):
+    return {
+        'upload_id': str(upload.pk),
+        'filename': upload.filename,
+        'size': upload.size,
+        'offset': upload.received,
+        'max_chunk_size': MAX_CHUNK_SIZE,
+        'upload_url': reverse('upload_detail', args=[upload.pk]),
+        'complete_url': reverse('complete_upload', args=[upload.pk]),
+    }
+
+
+@login_required
+def upload_detail(request, upload_id):
+    upload = get_object_or_404(UploadSession, pk=upload_id, user=request.user)
+    if request.method == 'GET':
+        return JsonResponse(upload_status(upload))
+    if request.method not in ('PUT', 'PATCH', 'POST'):
+        return JsonResponse({'error': 'Invalid request'}, status=400)
+
+    # chunks are raw request bodies; Upload-Offset says where they start
+    try:
+        offset = int(request.headers.get('Upload-Offset', request.GET.get('offset', '')))
+        length = int(request.headers.get('Content-Length', ''))
+    except ValueError:
+        return JsonResponse({'error': 'Upload-Offset and Content-Length are required'}, status=400)
+
+    try:
+        upload = append_chunk(upload.pk, offset, request, length)
+    except UploadOffsetMismatch as error:
+        return JsonResponse({'error': str(error), 'offset': error.expected}, status=409)
+    except UploadError as error:
+        return JsonResponse({'error': str(error)}, status=400)
+
+    return JsonResponse(upload_status(upload))
+
+
+@login_required
+def complete_document_upload(request, upload_id):
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Invalid request'}, status=400)
+
+    try:
+        payload = json.loads(request.body or '{}')
+        product_ids = [int(pk) for pk in payload.get('product_ids', [])]
+    except (ValueError, TypeError, AttributeError):
+        return JsonResponse({'error': 'product_ids must be a list of ids'}, status=400)
+
+    try:
+        blob, deduplicated, documents = complete_upload(
+            upload_id, request.user, product_ids, created_by=request.user.username
+        )
+    except UploadSession.DoesNotExist:
+        raise Http404('Upload not found')
+    except UploadGone as error:
+        return JsonResponse({'error': str(error)}, status=409)
+    except UploadError as error:
+        return JsonResponse({'error': str(error)}, status=400)
+
+    return JsonResponse({
+        'sha256': blob.sha256,
+        'size': blob.size,
+        'deduplicated': deduplicated,
+        'documents': [
+            {'id': document.pk, 'product_id': document.product_id}
+            for document in documents
+        ],
+    })
+
+
+@login_required
+def download_document(request, document_id):
+    document = get_object_or_404(
+        Document.objects.select_related('blob', 'product__vendor'),
+        pk=document_id
+    )
+    if not can_download(request.user, document):
+        raise PermissionDenied
+    if not document.document:
+        raise Http404('Document has no file')
+
+    return serve_document(request, document, as_attachment='download' in request.GET)
+
+
+@login_required
+def activity_feed(request):
+    if not (request.user.is_staff or request.user.user_type == UserTypes.ADMIN):
+        raise PermissionDenied
+
+    events = ActivityEvent.objects.select_related('content_type')
+    actor = request.GET.get('actor')
+    object_type = request.GET.get('object_type')
+    object_id = request.GET.get('object_id')
+    try:
+        if actor:
+            events = events.filter(actor_id=int(actor))
+        if object_type:
+            # the model name alone, as the feed links it, whichever app it is in
+            content_types = list(ContentType.objects.filter(model=object_type.lower()).values_list('pk', flat=True))
+            if not content_types:
+                raise Http404('Invalid filter or page')
+            events = events.filter(content_type__in=content_types)
+            if object_id:
+                events = events.filter(object_id=object_id)
+        page = paginate_keyset(events, request)
+    except (ValueError, InvalidCursor):
+        raise Http404('Invalid filter or page')
+
+    context: dict[str, Any] = {
+        'events': page.object_list,
+        'page': page,
+        'actor': actor or '',
+        'object_type': object_type or '',
+        'object_id': object_id or '',
+    }
+    return render(request, 'activity/activity_feed.html', context)
+
+
+@login_required
+def api_list(request, resource):
+    if request.method not in ('GET', 'HEAD'):
+        return JsonResponse({'error': 'Method not allowed'}, status=405)
+    if resource not in api.RESOURCES:
+        raise Http404('Unknown resource')
+    try:
+        return api.list_response(request, resource, JsonResponse)
+    except (api.ApiError, InvalidCursor) as error:
+        return JsonResponse({'error': str(error)}, status=400)
+
+
+@login_required
+def api_detail(request, resource, pk):
+    if request.method not in ('GET', 'HEAD'):
+        return JsonResponse({'error': 'Method not allowed'}, status=405)
+    if resource not in api.RESOURCES:
+        raise Http404('Unknown resource')
+    try:
+        response = api.detail_response(request, resource, pk, JsonResponse)
+    except api.ApiError as error:
+        return JsonResponse({'error': str(error)}, status=400)
+    if response is None:
+        return JsonResponse({'error': 'Not found'}, status=404)
+    return response
@@ -0,0 +1,15 @@
+"""
+ASGI config for vendor_application_inventory project.
+
+It exposes the ASGI callable as a module-level variable named ``application``.
+Serve it with an ASGI server, e.g. ``uvicorn vendor_application_inventory.asgi:application``,
+to run the async views in apps.main.async_views without a thread per request.
+"""
+
+import os
+
+from django.core.asgi import get_asgi_application
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'vendor_application_inventory.settings')
+
+application = get_asgi_application()